@@ -1,13 +1,20 @@
 # app/cleaners/images.py
 """
 Image metadata cleaning:
+0) JPEGs, PNGs and WebPs take a native streaming pass that drops metadata
+   segments/chunks without ExifTool or pixel decoding (app/cleaners/jpeg.py,
+   app/cleaners/png.py, app/cleaners/riff.py).
+   Only files those walkers reject fall through to ExifTool.
 1) Use ExifTool to remove ALL metadata (-all=).
-2) For PNGs, also ensure textual chunks (tEXt, zTXt, iTXt) are gone by re-saving via Pillow.
-   (ExifTool usually handles this, but the extra step is a belt-and-suspenders approach.)
+clean_image_bytes() does the same for a small upload held in memory; its
+ExifTool fallback pipes the bytes through stdin/stdout.
 """
-import subprocess
+from io import BytesIO
 from pathlib import Path
-from PIL import Image
+from app.utils.exiftool import pipe_exiftool, run_exiftool
+from app.cleaners.jpeg import clean_jpeg, strip_jpeg, JpegFormatError
+from app.cleaners.png import clean_png, strip_png, PngFormatError
+from app.cleaners.riff import clean_webp, strip_webp, RiffFormatError
 
 def _run_exiftool_strip(src: Path, dst: Path) -> None:
     # ExifTool command:
@@ -15,24 +22,45 @@ def _run_exiftool_strip(src: Path, dst: Path) -> None:
     # -overwrite_original_in_place would change the file; here we write to a new file instead:
     # We copy bytes, then run exiftool to strip in-place on the copy.
     dst.write_bytes(src.read_bytes())
-    subprocess.run(
-        ["exiftool", "-all=", "-overwrite_original_in_place", str(dst)],
-        check=True,
-        capture_output=True
-    )
+    run_exiftool(["-all=", "-overwrite_original_in_place", str(dst)])
+
+def _is_jpeg(path: Path) -> bool:
+    return path.suffix.lower() in {".jpg", ".jpeg"}
 
 def _is_png(path: Path) -> bool:
     return path.suffix.lower() == ".png"
 
-def _reencode_png_remove_text_chunks(path: Path) -> None:
-    # Open with Pillow and re-save, which drops non-essential chunks by default
-    with Image.open(path) as im:
-        # Convert to same mode to preserve pixels; save without text chunks
-        # Pillow ignores/strips textual chunks unless explicitly provided
-        im.save(path)
+def _is_webp(path: Path) -> bool:
+    return path.suffix.lower() == ".webp"
 
 def clean_image(src: Path, dst: Path) -> None:
+    if _is_jpeg(src):
+        try:
+            clean_jpeg(src, dst)
+            return
+        except JpegFormatError:
+            pass  # Malformed or unusual JPEG: let ExifTool deal with it
+    if _is_png(src):
+        try:
+            clean_png(src, dst)
+            return
+        except PngFormatError:
+            pass
+    if _is_webp(src):
+        try:
+            clean_webp(src, dst)
+            return
+        except RiffFormatError:
+            pass
     _run_exiftool_strip(src, dst)
-    if _is_png(dst):
-        # Double-ensure textual chunks are gone
-        _reencode_png_remove_text_chunks(dst)
+
+def clean_image_bytes(data: bytes, ext: str) -> bytes:
+    strip = {".jpg": strip_jpeg, ".jpeg": strip_jpeg, ".png": strip_png, ".webp": strip_webp}.get(ext)
+    if strip is not None:
+        out = BytesIO()
+        try:
+            strip(BytesIO(data), out)
+            return out.getvalue()
+        except (JpegFormatError, PngFormatError, RiffFormatError):
+            pass
+    return pipe_exiftool(["-all="], data)
@@ -0,0 +1,231 @@
+# app/cleaners/isobmff.py
+"""
+Native ISO-BMFF (MP4/MOV/M4V) metadata stripper: rewrites moov, copies mdat once.
+
+- Top level: ftyp, moov and mdat are kept; free/skip/wide padding, udta, meta,
+  uuid (XMP) and pnot (QuickTime preview) boxes are dropped.
+- Inside moov: every udta, meta (with its keys/ilst items, incl. Apple
+  location atoms) and uuid box is dropped, and the creation/modification
+  times in mvhd, tkhd and mdhd are zeroed.
+- stco/co64 chunk offsets are shifted to wherever their mdat lands in the
+  new layout; offsets only ever move down, so 32-bit tables stay valid.
+- Media data is never parsed: each mdat payload is copied once, with
+  os.copy_file_range where the OS has it (in-kernel, no user-space buffers).
+Fragmented files (moof/mvex), compressed moov (cmov), external data
+references and any top-level box we don't recognise raise IsoBmffFormatError,
+and the caller falls back to ffmpeg.
+"""
+from __future__ import annotations
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO
+
+_KEEP_TOP = {b"ftyp", b"moov", b"mdat"}
+_DROP_TOP = {b"free", b"skip", b"wide", b"udta", b"meta", b"uuid", b"pnot"}
+_DROP_IN_MOOV = {b"udta", b"meta", b"uuid", b"free", b"skip", b"wide"}
+# Boxes whose payload is just more boxes (the path down to the sample tables)
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf", b"tref"}
+_UNSUPPORTED = {b"moof", b"mvex", b"mfra", b"sidx", b"cmov"}
+_TIMED = {b"mvhd", b"tkhd", b"mdhd"}
+_MAX_MOOV = 256 * 1024 * 1024
+_COPY_BUFFER = 1 << 20
+
+
+class IsoBmffFormatError(ValueError):
+    """The input is not an ISO-BMFF file this walker can rewrite safely."""
+
+
+def _box_headers(f: BinaryIO, file_size: int) -> list[tuple[bytes, int, int, int]]:
+    """Top-level boxes as (type, offset, header size, total size); payloads are not read."""
+    boxes, pos = [], 0
+    while pos < file_size:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            raise IsoBmffFormatError("truncated box header")
+        size, btype = struct.unpack(">I4s", header)
+        hsize = 8
+        if size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                raise IsoBmffFormatError("truncated box header")
+            size, hsize = struct.unpack(">Q", large)[0], 16
+        elif size == 0:
+            size = file_size - pos  # extends to end of file
+        if size < hsize or pos + size > file_size:
+            raise IsoBmffFormatError(f"bad size for top-level box {btype!r}")
+        boxes.append((btype, pos, hsize, size))
+        pos += size
+    return boxes
+
+
+def _children(data: bytes, start: int = 0, end: int | None = None):
+    """Iterate (type, payload start, box end) over the boxes packed in data[start:end]."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos < end:
+        if end - pos < 8:
+            raise IsoBmffFormatError("truncated box in moov")
+        size, btype = struct.unpack_from(">I4s", data, pos)
+        hsize = 8
+        if size == 1:
+            if end - pos < 16:
+                raise IsoBmffFormatError("truncated box in moov")
+            size, hsize = struct.unpack_from(">Q", data, pos + 8)[0], 16
+        elif size == 0:
+            size = end - pos
+        if size < hsize or pos + size > end:
+            raise IsoBmffFormatError(f"bad size for box {btype!r}")
+        yield btype, pos + hsize, pos + size
+        pos += size
+
+
+def _box(btype: bytes, payload: bytes) -> bytes:
+    if len(payload) + 8 > 0xFFFFFFFF:
+        return struct.pack(">I4sQ", 1, btype, len(payload) + 16) + payload
+    return struct.pack(">I4s", len(payload) + 8, btype) + payload
+
+
+def _zero_times(btype: bytes, payload: bytearray) -> None:
+    # FullBox: version(1) flags(3), then creation + modification time (32 or 64 bit each)
+    if not payload:
+        raise IsoBmffFormatError(f"empty {btype.decode()} box")
+    width = 8 if payload[0] == 1 else 4
+    if len(payload) < 4 + 2 * width:
+        raise IsoBmffFormatError(f"truncated {btype.decode()} box")
+    payload[4:4 + 2 * width] = bytes(2 * width)
+
+
+def _check_dref(payload: bytes) -> None:
+    # Every data reference must be self-contained (flag 1): media lives in this file
+    if len(payload) < 8:
+        raise IsoBmffFormatError("truncated dref box")
+    for _, start, _ in _children(payload, 8):
+        if len(payload) < start + 4 or not payload[start + 3] & 1:
+            raise IsoBmffFormatError("external data reference")
+
+
+def _filter(data: bytes, start: int, end: int, tables: list[tuple[bytearray, bool]]) -> list:
+    """
+    The boxes in data[start:end] minus metadata, as (type, payload) nodes where a
+    container's payload is a list of nodes. stco/co64 payloads are also appended
+    to `tables` so their offsets can be patched before serializing.
+    """
+    nodes = []
+    for btype, pstart, bend in _children(data, start, end):
+        if btype in _UNSUPPORTED:
+            raise IsoBmffFormatError(f"unsupported box {btype!r}")
+        if btype in _DROP_IN_MOOV:
+            continue
+        if btype in _CONTAINERS:
+            nodes.append((btype, _filter(data, pstart, bend, tables)))
+            continue
+        payload = bytearray(data[pstart:bend])
+        if btype in _TIMED:
+            _zero_times(btype, payload)
+        elif btype == b"dref":
+            _check_dref(payload)
+        elif btype in (b"stco", b"co64"):
+            if len(payload) < 8:
+                raise IsoBmffFormatError(f"truncated {btype.decode()} box")
+            count = struct.unpack_from(">I", payload, 4)[0]
+            width = 8 if btype == b"co64" else 4
+            if len(payload) < 8 + count * width:
+                raise IsoBmffFormatError(f"truncated {btype.decode()} box")
+            tables.append((payload, btype == b"co64"))
+        nodes.append((btype, payload))
+    return nodes
+
+
+def _serialize(nodes: list) -> bytes:
+    return b"".join(_box(btype, _serialize(payload) if isinstance(payload, list) else bytes(payload))
+                    for btype, payload in nodes)
+
+
+def _shift_offsets(offsets: list[tuple[bytearray, bool]], moves: list[tuple[int, int, int]]) -> None:
+    """moves: (old data start, old data end, new data start) per mdat."""
+    for payload, wide in offsets:
+        fmt = ">Q" if wide else ">I"
+        width = 8 if wide else 4
+        count = struct.unpack_from(">I", payload, 4)[0]
+        for i in range(count):
+            at = 8 + i * width
+            old = struct.unpack_from(fmt, payload, at)[0]
+            for old_start, old_end, new_start in moves:
+                if old_start <= old < old_end:
+                    struct.pack_into(fmt, payload, at, old - old_start + new_start)
+                    break
+            else:
+                raise IsoBmffFormatError("chunk offset outside any mdat")
+
+
+def _copy_range(fin: BinaryIO, fout: BinaryIO, offset: int, n: int) -> None:
+    fout.flush()
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        try:
+            while n:
+                copied = copy_file_range(fin.fileno(), fout.fileno(), n, offset)
+                if not copied:
+                    raise IsoBmffFormatError("truncated mdat")
+                offset += copied
+                n -= copied
+            fout.seek(0, os.SEEK_END)  # resync the buffered writer with the fd
+            return
+        except OSError:
+            fout.seek(0, os.SEEK_END)  # e.g. EXDEV/ENOSYS: finish with plain reads
+    fin.seek(offset)
+    while n:
+        chunk = fin.read(min(n, _COPY_BUFFER))
+        if not chunk:
+            raise IsoBmffFormatError("truncated mdat")
+        fout.write(chunk)
+        n -= len(chunk)
+
+
+def strip_isobmff(fin: BinaryIO, fout: BinaryIO) -> None:
+    """Write fin to fout without metadata boxes. Both must be real files (seekable, with fileno)."""
+    fin.seek(0, os.SEEK_END)
+    boxes = _box_headers(fin, fin.tell())
+    types = [b[0] for b in boxes]
+    if not types or types[0] != b"ftyp" or types.count(b"moov") != 1 or b"mdat" not in types:
+        raise IsoBmffFormatError("expected ftyp, one moov and mdat")
+    for btype in types:
+        if btype not in _KEEP_TOP and btype not in _DROP_TOP:
+            raise IsoBmffFormatError(f"unsupported top-level box {btype!r}")
+
+    _, moov_at, moov_hsize, moov_size = boxes[types.index(b"moov")]
+    if moov_size > _MAX_MOOV:
+        raise IsoBmffFormatError("moov too large")
+    fin.seek(moov_at + moov_hsize)
+    moov_data = fin.read(moov_size - moov_hsize)
+    tables: list[tuple[bytearray, bool]] = []
+    moov_nodes = _filter(moov_data, 0, len(moov_data), tables)
+    # Patching offsets never changes a table's size, so the new moov size is known up front
+    new_moov_size = len(_box(b"moov", _serialize(moov_nodes)))
+
+    # Lay out the kept boxes and note where each mdat's payload moves to
+    moves, pos = [], 0
+    for btype, at, hsize, size in boxes:
+        if btype == b"moov":
+            pos += new_moov_size
+        elif btype in _KEEP_TOP:
+            if btype == b"mdat":
+                moves.append((at + hsize, at + size, pos + hsize))
+            pos += size
+    _shift_offsets(tables, moves)
+    moov = _box(b"moov", _serialize(moov_nodes))
+
+    for btype, at, hsize, size in boxes:
+        if btype == b"moov":
+            fout.write(moov)
+        elif btype in _KEEP_TOP:
+            fin.seek(at)
+            fout.write(fin.read(hsize))
+            _copy_range(fin, fout, at + hsize, size - hsize)
+
+
+def clean_isobmff(src: Path, dst: Path) -> None:
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        strip_isobmff(fin, fout)
@@ -0,0 +1,133 @@
+# app/cleaners/jpeg.py
+"""
+Streaming JPEG marker walker (no ExifTool, no pixel decoding).
+
+Copies src to dst in a single pass and leaves out the segments that carry metadata:
+- APP1..APP15: EXIF, XMP, IPTC/Photoshop, MPF, maker blocks, ...
+  Two exceptions: ICC profiles (APP2 "ICC_PROFILE") are kept when KEEP_ICC_PROFILE=1,
+  and the Adobe APP14 segment is always kept because it defines the colour
+  transform of CMYK/YCCK images (ExifTool's -all= keeps it for the same reason).
+- COM comments
+- anything after EOI (trailing data, MPF secondary images)
+APP0 (JFIF), quantization/Huffman tables, frame and scan headers and the
+entropy-coded data are copied byte for byte.
+
+Anything unexpected raises JpegFormatError so the caller can fall back to ExifTool.
+"""
+from __future__ import annotations
+import re
+from pathlib import Path
+from typing import BinaryIO
+
+from app.settings import KEEP_ICC_PROFILE
+
+_CHUNK = 1 << 20
+
+_SOI, _EOI, _SOS, _COM = 0xD8, 0xD9, 0xDA, 0xFE
+_APP0, _APP2, _APP14, _APP15 = 0xE0, 0xE2, 0xEE, 0xEF
+# Markers without a length field
+_STANDALONE = {0x01, *range(0xD0, 0xD8)}
+# Inside entropy-coded data 0xFF is followed by 0x00 (stuffing) or RSTn; anything else ends the scan
+_SCAN_END = re.compile(rb"\xff[^\x00\xd0-\xd7]")
+
+
+class JpegFormatError(ValueError):
+    """The input is not a JPEG this walker can copy safely."""
+
+
+class _Reader:
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self.buf = b""
+        self.pos = 0
+
+    def _fill(self, n: int) -> bool:
+        while len(self.buf) - self.pos < n:
+            chunk = self._f.read(max(_CHUNK, n))
+            if not chunk:
+                return False
+            self.buf = self.buf[self.pos:] + chunk
+            self.pos = 0
+        return True
+
+    def read(self, n: int) -> bytes:
+        if not self._fill(n):
+            raise JpegFormatError("truncated JPEG")
+        out = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return out
+
+    def copy_scan(self, out: BinaryIO) -> None:
+        """Copy entropy-coded data up to (not including) the next real marker."""
+        while True:
+            m = _SCAN_END.search(self.buf, self.pos)
+            if m:
+                out.write(memoryview(self.buf)[self.pos:m.start()])
+                self.pos = m.start()
+                return
+            end = len(self.buf)
+            # A trailing 0xFF needs the next byte to tell stuffing from a marker
+            if end > self.pos and self.buf[-1] == 0xFF:
+                end -= 1
+            out.write(memoryview(self.buf)[self.pos:end])
+            self.pos = end
+            chunk = self._f.read(_CHUNK)
+            if not chunk:
+                raise JpegFormatError("truncated scan data")
+            self.buf = self.buf[self.pos:] + chunk
+            self.pos = 0
+
+
+def _keep_segment(code: int, payload: bytes, keep_icc: bool) -> bool:
+    if code == _COM:
+        return False
+    if _APP0 < code <= _APP15:
+        if code == _APP2 and keep_icc and payload.startswith(b"ICC_PROFILE\x00"):
+            return True
+        if code == _APP14 and payload.startswith(b"Adobe"):
+            return True
+        return False
+    return True
+
+
+def strip_jpeg(fin: BinaryIO, fout: BinaryIO, keep_icc: bool = KEEP_ICC_PROFILE) -> None:
+    r = _Reader(fin)
+    if r.read(2) != b"\xff\xd8":
+        raise JpegFormatError("missing SOI marker")
+    fout.write(b"\xff\xd8")
+    seen_scan = False
+    while True:
+        if r.read(1) != b"\xff":
+            raise JpegFormatError("expected a marker")
+        code = r.read(1)[0]
+        while code == 0xFF:  # fill bytes
+            code = r.read(1)[0]
+        if code == _EOI:
+            if not seen_scan:
+                raise JpegFormatError("no image data before EOI")
+            fout.write(b"\xff\xd9")
+            return  # trailing data is dropped
+        if code in _STANDALONE:
+            fout.write(bytes((0xFF, code)))
+            continue
+        if code in (0x00, _SOI):
+            raise JpegFormatError(f"unexpected marker 0x{code:02X}")
+
+        length_bytes = r.read(2)
+        length = int.from_bytes(length_bytes, "big")
+        if length < 2:
+            raise JpegFormatError("bad segment length")
+        payload = r.read(length - 2)
+        if not _keep_segment(code, payload, keep_icc):
+            continue
+        fout.write(bytes((0xFF, code)))
+        fout.write(length_bytes)
+        fout.write(payload)
+        if code == _SOS:
+            seen_scan = True
+            r.copy_scan(fout)
+
+
+def clean_jpeg(src: Path, dst: Path) -> None:
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        strip_jpeg(fin, fout)
@@ -1,20 +1,35 @@
 # app/cleaners/office.py
 """
 DOCX/XLSX cleaning:
-- Use ExifTool to strip XMP/core properties reliably.
-- Additionally, remove OOXML 'docProps' and known comments/revisions parts for safety,
-  without altering document content. We operate on a copy (dst).
+- Remove OOXML 'docProps' and known comments/revisions parts for safety,
+  without altering document content.
+- Single streaming pass from src to dst: members we keep are copied with their
+  already-compressed bytes as-is (no inflate/deflate). Only [Content_Types].xml
+  and the *.rels parts that point at removed parts are read into memory and
+  rewritten, so the package stays consistent.
+- zipfile can read a package but has no way to write already-compressed bytes,
+  so the output is written by _RawZipWriter: local headers, central directory
+  and ZIP64 records where sizes, offsets or the member count need them.
+- ExifTool is not involved: it can read OOXML but cannot write it.
 NOTE: Fully "accepting tracked changes" is complex; we *remove* revision markup files
       and comments parts so that personal notes aren't retained. The visible text is not altered.
 """
-import subprocess
+from __future__ import annotations
+from io import BytesIO
 from pathlib import Path
+import posixpath
+import struct
 import zipfile
-from io import BytesIO
+import zlib
+from typing import BinaryIO
+from defusedxml import ElementTree as SafeET
+from xml.etree import ElementTree as ET
+from xml.sax.saxutils import quoteattr
 
+# Document properties: the whole folder (core.xml, app.xml, custom.xml and thumbnail.*)
 _OOXML_PROP_PATHS = {
-    "docx": ["docProps/core.xml", "docProps/app.xml"],
-    "xlsx": ["docProps/core.xml", "docProps/app.xml"]
+    "docx": ["docProps"],
+    "xlsx": ["docProps"]
 }
 
 # Known comment parts (remove if present)
@@ -29,50 +44,245 @@ _REVISION_PARTS = {
     "xlsx": ["xl/revisions", "xl/commentsExt.xml"]
 }
 
-def _ooxtype(path: Path) -> str | None:
-    ext = path.suffix.lower()
+_CONTENT_TYPES = "[Content_Types].xml"
+_CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_COPY_BUFFER = 1 << 20
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+_END_RECORD = struct.Struct("<4sHHHHIIH")
+_ZIP64_END_RECORD = struct.Struct("<4sQHHIIQQQQ")
+_ZIP64_LOCATOR = struct.Struct("<4sIQI")
+# Values from these up go in ZIP64 records; the classic field then holds all ones
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_COUNT_LIMIT = 0xFFFF
+
+def _ooxtype(ext: str) -> str | None:
+    ext = ext.lower()
     if ext == ".docx":
         return "docx"
     if ext == ".xlsx":
         return "xlsx"
     return None
 
-def _strip_with_exiftool(path: Path) -> None:
-    subprocess.run(
-        ["exiftool", "-all=", "-overwrite_original_in_place", str(path)],
-        check=True,
-        capture_output=True
-    )
-
-def _zip_remove_members(src_path: Path, to_remove: list[str], dst_path: Path) -> None:
-    with zipfile.ZipFile(src_path, "r") as zin:
-        with zipfile.ZipFile(dst_path, "w", compression=zipfile.ZIP_DEFLATED) as zout:
-            for item in zin.infolist():
-                if item.filename in to_remove or any(item.filename.startswith(prefix + "/") for prefix in to_remove):
-                    # Skip writing this member = effectively delete
-                    continue
-                data = zin.read(item.filename)
-                zout.writestr(item, data)
+def _is_removed(name: str, to_remove: set[str]) -> bool:
+    return name in to_remove or any(name.startswith(prefix + "/") for prefix in to_remove)
+
+def _rels_owner(rels_name: str) -> tuple[str, str]:
+    """'word/_rels/document.xml.rels' -> ('word', 'word/document.xml'); '_rels/.rels' -> ('', '')"""
+    folder, base = posixpath.split(rels_name)
+    src_dir = posixpath.dirname(folder)
+    src_part = posixpath.join(src_dir, base[:-len(".rels")]) if base != ".rels" else ""
+    return src_dir, src_part
+
+def _serialize_flat(root, ns: str) -> bytes:
+    """
+    Serialize <Types>/<Relationships> (a root with empty children) keeping the
+    default namespace; ElementTree would rename it to ns0:, which Office dislikes.
+    """
+    elements = [root, *root]
+    if any(k.startswith("{") for el in elements for k in el.attrib):
+        return ET.tostring(root, encoding="UTF-8", xml_declaration=True)
+
+    def tag(el):
+        return el.tag.split("}", 1)[-1]
+
+    def attrs(el):
+        return "".join(f" {k}={quoteattr(v)}" for k, v in el.attrib.items())
+
+    body = "".join(f"<{tag(el)}{attrs(el)}/>" for el in root)
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\r\n'
+            f'<{tag(root)} xmlns="{ns}"{attrs(root)}>{body}</{tag(root)}>').encode("utf-8")
+
+def _fix_rels(xml: bytes, src_dir: str, removed: set[str]) -> bytes | None:
+    """Drop relationships that target removed parts; None if nothing changed."""
+    root = SafeET.fromstring(xml)
+    dropped = False
+    for rel in list(root):
+        target = rel.get("Target", "")
+        if rel.get("TargetMode") == "External" or not target:
+            continue
+        if target.startswith("/"):
+            resolved = target.lstrip("/")
+        else:
+            resolved = posixpath.normpath(posixpath.join(src_dir, target))
+        if _is_removed(resolved, removed):
+            root.remove(rel)
+            dropped = True
+    if not dropped:
+        return None
+    return _serialize_flat(root, _RELS_NS)
+
+def _fix_content_types(xml: bytes, removed: set[str]) -> bytes | None:
+    """Drop <Override> entries for removed parts; None if nothing changed."""
+    root = SafeET.fromstring(xml)
+    dropped = False
+    for el in list(root):
+        if el.tag == f"{{{_CT_NS}}}Override" and _is_removed(el.get("PartName", "").lstrip("/"), removed):
+            root.remove(el)
+            dropped = True
+    if not dropped:
+        return None
+    return _serialize_flat(root, _CT_NS)
+
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    # The writer adds its own ZIP64 record where needed, so drop any we read from the source
+    out, i = b"", 0
+    while i + 4 <= len(extra):
+        tag, size = struct.unpack("<HH", extra[i:i + 4])
+        if tag != 1:
+            out += extra[i:i + 4 + size]
+        i += 4 + size
+    return out
+
+def _dos_time(date_time: tuple) -> tuple[int, int]:
+    y, mo, d, h, mi, s = date_time[:6]
+    return h << 11 | mi << 5 | s // 2, max(y - 1980, 0) << 9 | mo << 5 | d
+
+class _RawZipWriter:
+    """
+    Minimal ZIP writer for a package rewrite: members are appended as
+    compressed bytes (copied from another archive or deflated here) and
+    close() writes the central directory. Writes sequentially, so dst need
+    not be seekable.
+    """
+
+    def __init__(self, fp: BinaryIO):
+        self.fp = fp
+        self.offset = 0
+        self.entries: list[tuple[zipfile.ZipInfo, int]] = []
+
+    def _write(self, data: bytes) -> None:
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def _start(self, info: zipfile.ZipInfo) -> None:
+        """Write the local header of a member whose CRC and sizes are already set on info."""
+        self.entries.append((info, self.offset))
+        name, flags = self._name(info)
+        extra = _strip_zip64_extra(info.extra)
+        csize, usize = info.compress_size, info.file_size
+        zip64 = csize >= _ZIP64_LIMIT or usize >= _ZIP64_LIMIT
+        if zip64:
+            extra = struct.pack("<HHQQ", 1, 16, usize, csize) + extra
+            csize = usize = 0xFFFFFFFF
+        dostime, dosdate = _dos_time(info.date_time)
+        self._write(_LOCAL_HEADER.pack(b"PK\x03\x04", 45 if zip64 else 20, flags, info.compress_type,
+                                       dostime, dosdate, info.CRC, csize, usize, len(name), len(extra)))
+        self._write(name + extra)
+
+    @staticmethod
+    def _name(info: zipfile.ZipInfo) -> tuple[bytes, int]:
+        # Sizes and CRC sit in the headers, so never a data descriptor (bit 3)
+        flags = info.flag_bits & ~0x08
+        try:
+            return info.filename.encode("ascii"), flags & ~0x800
+        except UnicodeEncodeError:
+            return info.filename.encode("utf-8"), flags | 0x800
+
+    def copy(self, src: BinaryIO, info: zipfile.ZipInfo) -> None:
+        """Append a member of the archive in src by copying its compressed bytes as-is."""
+        if info.flag_bits & 0x01:
+            raise ValueError(f"Encrypted member {info.filename!r} is not supported")
+        src.seek(info.header_offset)
+        header = src.read(_LOCAL_HEADER.size)
+        if len(header) != _LOCAL_HEADER.size or header[:4] != b"PK\x03\x04":
+            raise zipfile.BadZipFile(f"Bad local header for {info.filename!r}")
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        src.seek(name_len + extra_len, 1)
+
+        self._start(info)
+        remaining = info.compress_size
+        while remaining:
+            chunk = src.read(min(remaining, _COPY_BUFFER))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated member {info.filename!r}")
+            self._write(chunk)
+            remaining -= len(chunk)
+
+    def writestr(self, info: zipfile.ZipInfo, data: bytes) -> None:
+        """Append a member with the given bytes, deflated."""
+        packed = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        body = packed.compress(data) + packed.flush()
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.CRC, info.file_size, info.compress_size = zlib.crc32(data), len(data), len(body)
+        self._start(info)
+        self._write(body)
+
+    def close(self) -> None:
+        """Write the central directory (and its ZIP64 records if needed) after the last member."""
+        start = self.offset
+        for info, header_offset in self.entries:
+            name, flags = self._name(info)
+            extra = _strip_zip64_extra(info.extra)
+            fields, csize, usize, offset = [], info.compress_size, info.file_size, header_offset
+            if usize >= _ZIP64_LIMIT:
+                fields.append(usize)
+                usize = 0xFFFFFFFF
+            if csize >= _ZIP64_LIMIT:
+                fields.append(csize)
+                csize = 0xFFFFFFFF
+            if offset >= _ZIP64_LIMIT:
+                fields.append(offset)
+                offset = 0xFFFFFFFF
+            if fields:
+                extra = struct.pack(f"<HH{len(fields)}Q", 1, 8 * len(fields), *fields) + extra
+            needed = 45 if fields else 20
+            dostime, dosdate = _dos_time(info.date_time)
+            self._write(_CENTRAL_HEADER.pack(
+                b"PK\x01\x02", info.create_system << 8 | max(info.create_version, needed), needed, flags,
+                info.compress_type, dostime, dosdate, info.CRC, csize, usize, len(name), len(extra),
+                len(info.comment), 0, info.internal_attr, info.external_attr, offset))
+            self._write(name + extra + info.comment)
+
+        count, size = len(self.entries), self.offset - start
+        if count >= _ZIP64_COUNT_LIMIT or size >= _ZIP64_LIMIT or start >= _ZIP64_LIMIT:
+            end64 = self.offset
+            self._write(_ZIP64_END_RECORD.pack(b"PK\x06\x06", _ZIP64_END_RECORD.size - 12, 45, 45, 0, 0,
+                                               count, count, size, start))
+            self._write(_ZIP64_LOCATOR.pack(b"PK\x06\x07", 0, end64, 1))
+            count, size, start = min(count, 0xFFFF), min(size, 0xFFFFFFFF), min(start, 0xFFFFFFFF)
+        self._write(_END_RECORD.pack(b"PK\x05\x06", 0, 0, count, count, size, start, 0))
+
+def rewrite_ooxml(src: BinaryIO, dst: BinaryIO, kind: str) -> None:
+    """Stream an OOXML package from src to dst without the metadata/comment/revision parts."""
+    to_remove = set(_OOXML_PROP_PATHS[kind]) | set(_COMMENT_PARTS[kind]) | set(_REVISION_PARTS[kind])
+    with zipfile.ZipFile(src, "r") as zin:
+        infos = zin.infolist()
+        removed = {i.filename for i in infos if _is_removed(i.filename, to_remove)}
+        # The .rels of a removed part goes with it
+        removed |= {i.filename for i in infos
+                    if i.filename.endswith(".rels") and _rels_owner(i.filename)[1] in removed}
+
+        zout = _RawZipWriter(dst)
+        for info in infos:
+            if info.filename in removed:
+                continue
+            fixed = None
+            if removed and info.filename == _CONTENT_TYPES:
+                fixed = _fix_content_types(zin.read(info), removed)
+            elif removed and info.filename.endswith(".rels"):
+                fixed = _fix_rels(zin.read(info), _rels_owner(info.filename)[0], removed)
+            if fixed is not None:
+                new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                new_info.external_attr = info.external_attr
+                zout.writestr(new_info, fixed)
+            else:
+                zout.copy(src, info)
+        zout.close()
 
 def clean_office(src: Path, dst: Path) -> None:
-    # Work on a copy
-    dst.write_bytes(src.read_bytes())
-    kind = _ooxtype(dst)
+    kind = _ooxtype(dst.suffix)
     if not kind:
         raise ValueError("Unsupported OOXML type")
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        rewrite_ooxml(fin, fout, kind)
 
-    # 1) ExifTool strip XMP, core/app properties, etc.
-    _strip_with_exiftool(dst)
-
-    # 2) Remove OOXML parts that could still hold properties/comments/revisions
-    to_remove = set(_OOXML_PROP_PATHS[kind]) | set(_COMMENT_PARTS[kind]) | set(_REVISION_PARTS[kind])
-    # Re-pack zip without those entries
-    # Use an in-memory temp to avoid partially written files on error
-    tmp_bytes = BytesIO()
-    with zipfile.ZipFile(dst, "r") as zin:
-        with zipfile.ZipFile(tmp_bytes, "w", compression=zipfile.ZIP_DEFLATED) as zout:
-            for item in zin.infolist():
-                if item.filename in to_remove or any(item.filename.startswith(prefix + "/") for prefix in to_remove):
-                    continue
-                zout.writestr(item, zin.read(item.filename))
-    dst.write_bytes(tmp_bytes.getvalue())
+def clean_office_bytes(data: bytes, ext: str) -> bytes:
+    kind = _ooxtype(ext)
+    if not kind:
+        raise ValueError("Unsupported OOXML type")
+    out = BytesIO()
+    rewrite_ooxml(BytesIO(data), out, kind)
+    return out.getvalue()
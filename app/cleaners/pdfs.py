@@ -1,17 +1,30 @@
 # app/cleaners/pdfs.py
 """
-PDF cleaning using pypdf (pure Python, Windows-friendly):
+PDF cleaning. Every engine does the same job:
 - Remove /Info and XMP (/Metadata)
 - Remove JavaScript entries from the Names tree
 - Remove all page annotations (/Annots)
-- Then run ExifTool to strip any lingering tags (defense-in-depth)
+
+Engines (PDF_ENGINE=auto|pikepdf|pypdf; auto = pikepdf when installed):
+- pikepdf: qpdf edits the object graph in place and writes the file once, with
+  object streams. The rewrite is complete, so no ExifTool pass is needed (its
+  PDF edits are incremental updates that keep the old objects in the file anyway).
+- pypdf (pure Python, Windows-friendly): copies every page into a new document,
+  then runs ExifTool to strip any lingering tags (defense-in-depth).
+
+clean_pdf_bytes() runs the same engine on a small upload held in memory (pypdf's
+ExifTool pass then pipes through stdin/stdout).
 
 We do not alter visible text/pixels—only metadata/annotations/scripts.
 """
+from io import BytesIO
 from pathlib import Path
-import subprocess
+from typing import BinaryIO, Callable
 from pypdf import PdfReader, PdfWriter
 from pypdf.generic import NameObject
+from app.settings import PDF_ENGINE
+from app.utils.exiftool import pipe_exiftool, run_exiftool
+from app.utils.metrics import STAGE_SECONDS
 
 def _strip_root_metadata(writer: PdfWriter) -> None:
     # Delete XMP metadata (/Metadata) if present
@@ -38,8 +51,7 @@ def _remove_page_annotations(page) -> None:
     if ann_key in page:
         del page[ann_key]
 
-def _pypdf_sanitize(src: Path, dst: Path) -> None:
-    reader = PdfReader(str(src))
+def _pypdf_document(reader: PdfReader) -> PdfWriter:
     writer = PdfWriter()
 
     # Copy pages while stripping page-level annotations
@@ -50,19 +62,74 @@ def _pypdf_sanitize(src: Path, dst: Path) -> None:
     # Remove document-level XMP, Info, and JavaScript
     _strip_root_metadata(writer)
     _remove_names_javascript(writer)
+    return writer
 
+def _pypdf_sanitize(src: Path, dst: Path) -> None:
+    writer = _pypdf_document(PdfReader(str(src)))
     with open(dst, "wb") as f:
         writer.write(f)
 
 def _exiftool_strip_all(path: Path) -> None:
-    subprocess.run(
-        ["exiftool", "-all=", "-overwrite_original_in_place", str(path)],
-        check=True,
-        capture_output=True
-    )
+    run_exiftool(["-all=", "-overwrite_original_in_place", str(path)])
 
-def clean_pdf(src: Path, dst: Path) -> None:
+def _pypdf_engine(src: Path, dst: Path) -> None:
     # First pass: structural sanitize with pypdf
     _pypdf_sanitize(src, dst)
     # Second pass: exiftool to strip any lingering metadata tags
     _exiftool_strip_all(dst)
+
+def _pikepdf_engine(src: Path | BinaryIO, dst: Path | BinaryIO) -> None:
+    import pikepdf  # optional dependency, only needed for this engine
+
+    with pikepdf.open(src) as pdf:
+        if "/Info" in pdf.trailer:
+            del pdf.trailer["/Info"]
+        if "/Metadata" in pdf.Root:
+            del pdf.Root["/Metadata"]
+        names = pdf.Root.get("/Names")
+        if isinstance(names, pikepdf.Dictionary) and "/JavaScript" in names:
+            del names["/JavaScript"]
+        for page in pdf.pages:
+            if "/Annots" in page.obj:
+                del page.obj["/Annots"]
+        # Objects no longer referenced (old Info/XMP, annotations) are not written out
+        pdf.save(dst, object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                 fix_metadata_version=False)
+
+PDF_ENGINES: dict[str, Callable[[Path, Path], None]] = {
+    "pikepdf": _pikepdf_engine,
+    "pypdf": _pypdf_engine,
+}
+
+def _pikepdf_available() -> bool:
+    try:
+        import pikepdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _engine_name(name: str) -> str:
+    if name == "auto":
+        name = "pikepdf" if _pikepdf_available() else "pypdf"
+    if name not in PDF_ENGINES:
+        raise ValueError(f"Unknown PDF engine {name!r}; choose auto, {', '.join(PDF_ENGINES)}")
+    return name
+
+def pdf_engine(name: str = PDF_ENGINE) -> Callable[[Path, Path], None]:
+    """Resolve an engine name (or 'auto') to its clean(src, dst) function."""
+    return PDF_ENGINES[_engine_name(name)]
+
+def clean_pdf(src: Path, dst: Path) -> None:
+    name = _engine_name(PDF_ENGINE)
+    with STAGE_SECONDS.time(stage=name):
+        PDF_ENGINES[name](src, dst)
+
+def clean_pdf_bytes(data: bytes, ext: str = ".pdf") -> bytes:
+    name = _engine_name(PDF_ENGINE)
+    out = BytesIO()
+    with STAGE_SECONDS.time(stage=name):
+        if name == "pikepdf":
+            _pikepdf_engine(BytesIO(data), out)
+            return out.getvalue()
+        _pypdf_document(PdfReader(BytesIO(data))).write(out)
+        return pipe_exiftool(["-all="], out.getvalue())
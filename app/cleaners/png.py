@@ -0,0 +1,96 @@
+# app/cleaners/png.py
+"""
+Streaming PNG chunk filter (no decode, no re-deflate).
+
+Walks the chunk list once and copies every chunk we keep byte for byte,
+CRC included, so the compressed image data is never touched:
+- critical chunks: IHDR, PLTE, IDAT, IEND
+- ancillary chunks that change how pixels render: transparency, gamma,
+  chromaticity, sRGB/cICP/HDR info, significant bits, background, pixel size,
+  and the APNG animation chunks
+- iCCP only when KEEP_ICC_PROFILE=1
+Everything else (tEXt, zTXt, iTXt, eXIf, tIME, private chunks) is dropped,
+as is any data after IEND. Unknown critical chunks raise PngFormatError.
+"""
+from __future__ import annotations
+import struct
+from pathlib import Path
+from typing import BinaryIO
+
+from app.settings import KEEP_ICC_PROFILE
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+_CRITICAL = {b"IHDR", b"PLTE", b"IDAT", b"IEND"}
+_RENDERING = {
+    b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"cICP", b"mDCV", b"cLLI",
+    b"sBIT", b"bKGD", b"hIST", b"pHYs",
+    b"acTL", b"fcTL", b"fdAT",  # APNG
+}
+_MAX_CHUNK = 2**31 - 1
+_COPY_BUFFER = 1 << 20
+
+
+class PngFormatError(ValueError):
+    """The input is not a PNG this filter can copy safely."""
+
+
+def _keep_chunk(ctype: bytes, keep_icc: bool) -> bool:
+    if ctype in _CRITICAL or ctype in _RENDERING:
+        return True
+    if ctype == b"iCCP":
+        return keep_icc
+    if not ctype[0] & 0x20:
+        # Uppercase first letter = critical: a decoder can't skip it, and neither can we
+        raise PngFormatError(f"unknown critical chunk {ctype!r}")
+    return False
+
+
+def _copy_exact(fin: BinaryIO, fout: BinaryIO, n: int) -> None:
+    while n:
+        chunk = fin.read(min(n, _COPY_BUFFER))
+        if not chunk:
+            raise PngFormatError("truncated chunk")
+        fout.write(chunk)
+        n -= len(chunk)
+
+
+def _skip(fin: BinaryIO, n: int) -> None:
+    if fin.seekable():
+        fin.seek(n, 1)
+        return
+    while n:
+        chunk = fin.read(min(n, _COPY_BUFFER))
+        if not chunk:
+            raise PngFormatError("truncated chunk")
+        n -= len(chunk)
+
+
+def strip_png(fin: BinaryIO, fout: BinaryIO, keep_icc: bool = KEEP_ICC_PROFILE) -> None:
+    if fin.read(8) != PNG_SIGNATURE:
+        raise PngFormatError("missing PNG signature")
+    fout.write(PNG_SIGNATURE)
+    first = True
+    while True:
+        header = fin.read(8)
+        if len(header) < 8:
+            raise PngFormatError("missing IEND chunk")
+        length, ctype = struct.unpack(">I4s", header)
+        if length > _MAX_CHUNK or not ctype.isalpha():
+            raise PngFormatError("corrupt chunk header")
+        if first and ctype != b"IHDR":
+            raise PngFormatError("IHDR must come first")
+        first = False
+
+        if _keep_chunk(ctype, keep_icc):
+            fout.write(header)
+            _copy_exact(fin, fout, length + 4)  # data + CRC, untouched
+        else:
+            _skip(fin, length + 4)
+        if ctype == b"IEND":
+            return  # trailing data is dropped
+
+
+def clean_png(src: Path, dst: Path) -> None:
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        strip_png(fin, fout)
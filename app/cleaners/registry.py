@@ -0,0 +1,143 @@
+# app/cleaners/registry.py
+"""
+The one list of formats we clean; the server, background jobs and the CLI all
+read it instead of keeping their own extension sets.
+- Each Format declares its extensions, the signature type its content must
+  match (app/utils/signature.py), its cleaner entry points as "module:function"
+  strings, and the external tools it cannot work without.
+- Cleaner modules (and pypdf, pikepdf, defusedxml behind them) are imported on
+  first use, not when a worker starts.
+- probe() looks for exiftool and ffmpeg on PATH once, at startup. Formats whose
+  tools are missing are switched off and left out of allowed_extensions(), so
+  those uploads are refused up front instead of failing in the cleaner.
+  JPEG, PNG, WebP, MP4/MOV/M4V and AVI are cleaned natively and only fall
+  back to ExifTool/ffmpeg for unusual files, so they don't require them.
+  The same goes for cleaning in memory (Format.cleans_in_memory): formats
+  that need a tool are always cleaned from a file.
+"""
+from __future__ import annotations
+import importlib
+import importlib.util
+import shutil
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+from app.settings import PDF_ENGINE
+from app.utils import signature
+from app.utils.signature import FileType
+
+TOOLS = ("exiftool", "ffmpeg")
+
+
+@dataclass(frozen=True)
+class Format:
+    name: str
+    extensions: tuple[str, ...]
+    signature: FileType
+    cleaner: str                       # "module:function", called as clean(src, dst)
+    memory_cleaner: str | None = None  # "module:function", called as clean(data, ext) -> bytes
+    tools: tuple[str, ...] = ()
+
+    @property
+    def kind(self) -> str:
+        """Cleaner family ("image", "office", "pdf", "video"): the unit of admission limits and metrics."""
+        return self.signature.kind
+
+    def load_cleaner(self) -> Callable:
+        return _load(self.cleaner)
+
+    @property
+    def cleans_in_memory(self) -> bool:
+        """
+        Whether small uploads are cleaned from a buffer. Only formats with a native stripper
+        qualify: ExifTool reads a buffer through a one-off process, the file path uses the pool.
+        """
+        return self.memory_cleaner is not None and not self.tools
+
+    def load_memory_cleaner(self) -> Callable | None:
+        return _load(self.memory_cleaner) if self.memory_cleaner else None
+
+
+def pdf_engine_name() -> str:
+    """PDF_ENGINE with 'auto' resolved, without importing either engine."""
+    if PDF_ENGINE == "auto":
+        return "pikepdf" if importlib.util.find_spec("pikepdf") else "pypdf"
+    return PDF_ENGINE
+
+
+def _pdf_tools() -> tuple[str, ...]:
+    # The pikepdf engine rewrites the whole file itself; pypdf is followed by an ExifTool pass
+    return ("exiftool",) if pdf_engine_name() == "pypdf" else ()
+
+
+_IMAGE = "app.cleaners.images:clean_image"
+_IMAGE_BYTES = "app.cleaners.images:clean_image_bytes"
+_OFFICE = "app.cleaners.office:clean_office"
+_OFFICE_BYTES = "app.cleaners.office:clean_office_bytes"
+_VIDEO = "app.cleaners.videos:clean_video"
+
+FORMATS: tuple[Format, ...] = (
+    Format("jpeg", (".jpg", ".jpeg"), signature.JPEG, _IMAGE, _IMAGE_BYTES),
+    Format("png", (".png",), signature.PNG, _IMAGE, _IMAGE_BYTES),
+    Format("gif", (".gif",), signature.GIF, _IMAGE, _IMAGE_BYTES, ("exiftool",)),
+    Format("tiff", (".tif", ".tiff"), signature.TIFF, _IMAGE, _IMAGE_BYTES, ("exiftool",)),
+    Format("webp", (".webp",), signature.WEBP, _IMAGE, _IMAGE_BYTES),
+    Format("pdf", (".pdf",), signature.PDF, "app.cleaners.pdfs:clean_pdf", "app.cleaners.pdfs:clean_pdf_bytes",
+           _pdf_tools()),
+    Format("docx", (".docx",), signature.DOCX, _OFFICE, _OFFICE_BYTES),
+    Format("xlsx", (".xlsx",), signature.XLSX, _OFFICE, _OFFICE_BYTES),
+    Format("mp4", (".mp4",), signature.MP4, _VIDEO),
+    Format("mov", (".mov",), signature.MOV, _VIDEO),
+    Format("m4v", (".m4v",), signature.M4V, _VIDEO),
+    Format("avi", (".avi",), signature.AVI, _VIDEO),
+    Format("mkv", (".mkv",), signature.MKV, _VIDEO, tools=("ffmpeg", "exiftool")),
+    Format("webm", (".webm",), signature.WEBM, _VIDEO, tools=("ffmpeg", "exiftool")),
+)
+
+_BY_EXT = {ext: fmt for fmt in FORMATS for ext in fmt.extensions}
+
+_lock = threading.Lock()
+_available_tools: frozenset[str] | None = None
+_loaded: dict[str, Callable] = {}
+
+
+def _load(spec: str) -> Callable:
+    fn = _loaded.get(spec)
+    if fn is None:
+        module, _, name = spec.partition(":")
+        fn = _loaded[spec] = getattr(importlib.import_module(module), name)
+    return fn
+
+
+def probe(tools: tuple[str, ...] = TOOLS) -> frozenset[str]:
+    """Look the external tools up on PATH (again) and return the ones found."""
+    global _available_tools
+    found = frozenset(t for t in tools if shutil.which(t))
+    with _lock:
+        _available_tools = found
+    return found
+
+
+def available_tools() -> frozenset[str]:
+    return _available_tools if _available_tools is not None else probe()
+
+
+def is_available(fmt: Format) -> bool:
+    return set(fmt.tools) <= available_tools()
+
+
+def format_for(ext: str) -> Format | None:
+    """The format uploaded as `ext`, or None if it is unknown or switched off for a missing tool."""
+    fmt = _BY_EXT.get(ext.lower())
+    return fmt if fmt is not None and is_available(fmt) else None
+
+
+def allowed_extensions() -> frozenset[str]:
+    return frozenset(ext for fmt in FORMATS if is_available(fmt) for ext in fmt.extensions)
+
+
+def unavailable() -> dict[str, tuple[str, ...]]:
+    """Switched-off formats and the tools they are missing, for startup logs and the CLI."""
+    tools = available_tools()
+    return {fmt.name: tuple(t for t in fmt.tools if t not in tools) for fmt in FORMATS if not is_available(fmt)}
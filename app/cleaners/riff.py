@@ -0,0 +1,255 @@
+# app/cleaners/riff.py
+"""
+Native RIFF chunk filter for WebP and AVI: drops metadata chunks and copies
+everything else once, without decoding (no ExifTool, no ffmpeg).
+
+- Chunk headers are read first, seeking past the payloads, so the new RIFF
+  size is known before anything is written. Kept chunks are then copied
+  verbatim, with os.copy_file_range where the OS has it.
+- WebP: EXIF and "XMP " chunks are dropped, as are unknown chunks and ICCP
+  (kept when KEEP_ICC_PROFILE=1); the VP8X flags are cleared to match. Image
+  data (VP8/VP8L/ALPH/ANIM/ANMF) is untouched.
+- AVI: the hdrl list is rebuilt without LIST INFO, IDIT, strd and strn
+  (cameras hide their maker notes there) and JUNK padding is zero-filled.
+  Top-level INFO lists and unknown chunks are dropped. The movi list is
+  copied as is; idx1 offsets relative to movi stay valid, absolute ones are
+  shifted by however far movi moved.
+OpenDML AVIs (indx super-indexes, LIST odml, RIFF AVIX extensions) carry
+absolute offsets everywhere, so they raise RiffFormatError like anything
+malformed, and the caller falls back to ffmpeg.
+"""
+from __future__ import annotations
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from app.settings import KEEP_ICC_PROFILE
+
+_WEBP_KEEP = {b"VP8 ", b"VP8L", b"VP8X", b"ALPH", b"ANIM", b"ANMF"}
+_WEBP_FIRST = {b"VP8 ", b"VP8L", b"VP8X"}
+# VP8X flag bits for the chunks we may drop
+_ICC_FLAG, _EXIF_FLAG, _XMP_FLAG = 0x20, 0x08, 0x04
+
+_HDRL_KEEP = {b"avih"}
+_STRL_KEEP = {b"strh", b"strf", b"vprp"}
+_OPENDML = {b"indx", b"dmlh"}
+_MAX_HDRL = 16 * 1024 * 1024
+_MAX_IDX1 = 256 * 1024 * 1024
+_COPY_BUFFER = 1 << 20
+
+
+class RiffFormatError(ValueError):
+    """The input is not a RIFF file this filter can rewrite safely."""
+
+
+def _padded(size: int) -> int:
+    return size + (size & 1)
+
+
+def _chunk(cid: bytes, payload: bytes) -> bytes:
+    return struct.pack("<4sI", cid, len(payload)) + payload + b"\0" * (len(payload) & 1)
+
+
+def _riff_end(f: BinaryIO, form: bytes) -> int:
+    """Check the RIFF header against the file size; return where the RIFF data ends."""
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    f.seek(0)
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:] != form:
+        raise RiffFormatError(f"not a RIFF {form!r} file")
+    end = 8 + struct.unpack_from("<I", header, 4)[0]
+    if end > file_size:
+        raise RiffFormatError("truncated RIFF chunk")
+    return end
+
+
+def _chunks(f: BinaryIO, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """(id, header offset, payload size) for each chunk in f[start:end]; payloads are not read."""
+    pos = start
+    while pos < end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8 or end - pos < 8:
+            raise RiffFormatError("truncated chunk header")
+        cid, size = struct.unpack("<4sI", header)
+        if pos + 8 + size > end:
+            raise RiffFormatError(f"bad size for chunk {cid!r}")
+        yield cid, pos, size
+        pos += 8 + _padded(size)  # a missing pad byte after the last chunk is tolerated
+
+
+def _parse(data: bytes) -> Iterator[tuple[bytes, bytes]]:
+    """(id, payload) for each chunk packed in data."""
+    pos = 0
+    while pos < len(data):
+        if len(data) - pos < 8:
+            raise RiffFormatError("truncated chunk header")
+        cid, size = struct.unpack_from("<4sI", data, pos)
+        if pos + 8 + size > len(data):
+            raise RiffFormatError(f"bad size for chunk {cid!r}")
+        yield cid, data[pos + 8:pos + 8 + size]
+        pos += 8 + _padded(size)
+
+
+def _read(f: BinaryIO, offset: int, n: int) -> bytes:
+    f.seek(offset)
+    data = f.read(n)
+    if len(data) < n:
+        raise RiffFormatError("truncated chunk")
+    return data
+
+
+def _copy_range(fin: BinaryIO, fout: BinaryIO, offset: int, n: int) -> None:
+    fout.flush()
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        try:
+            while n:
+                copied = copy_file_range(fin.fileno(), fout.fileno(), n, offset)
+                if not copied:
+                    raise RiffFormatError("truncated chunk")
+                offset += copied
+                n -= copied
+            fout.seek(0, os.SEEK_END)  # resync the buffered writer with the fd
+            return
+        except OSError:
+            fout.seek(0, os.SEEK_END)  # in-memory streams, EXDEV/ENOSYS: finish with plain reads
+    fin.seek(offset)
+    while n:
+        chunk = fin.read(min(n, _COPY_BUFFER))
+        if not chunk:
+            raise RiffFormatError("truncated chunk")
+        fout.write(chunk)
+        n -= len(chunk)
+
+
+def _copy_chunk(fin: BinaryIO, fout: BinaryIO, at: int, size: int) -> None:
+    fout.write(_read(fin, at, 8))
+    _copy_range(fin, fout, at + 8, size)
+    if size & 1:
+        fout.write(b"\0")  # written rather than copied: some muxers omit the final pad byte
+
+
+def strip_webp(fin: BinaryIO, fout: BinaryIO, keep_icc: bool = KEEP_ICC_PROFILE) -> None:
+    """Write fin to fout without EXIF/XMP (and ICC) chunks. fin must be seekable."""
+    end = _riff_end(fin, b"WEBP")
+    chunks = list(_chunks(fin, 12, end))
+    if not chunks or chunks[0][0] not in _WEBP_FIRST:
+        raise RiffFormatError("WebP must start with a VP8, VP8L or VP8X chunk")
+    kept = [c for c in chunks if c[0] in _WEBP_KEEP or (keep_icc and c[0] == b"ICCP")]
+    dropped_flags = _EXIF_FLAG | _XMP_FLAG | (0 if keep_icc else _ICC_FLAG)
+
+    fout.write(b"RIFF" + struct.pack("<I", 4 + sum(8 + _padded(size) for _, _, size in kept)) + b"WEBP")
+    for cid, at, size in kept:
+        if cid == b"VP8X":
+            payload = bytearray(_read(fin, at + 8, size))
+            if len(payload) < 10:
+                raise RiffFormatError("truncated VP8X chunk")
+            payload[0] &= ~dropped_flags & 0xFF
+            fout.write(_chunk(cid, bytes(payload)))
+        else:
+            _copy_chunk(fin, fout, at, size)
+
+
+def _filter_avi_list(data: bytes, keep: set[bytes]) -> bytes:
+    """The chunks of an hdrl/strl payload minus metadata, re-serialized."""
+    out = bytearray()
+    for cid, payload in _parse(data):
+        if cid in _OPENDML:
+            raise RiffFormatError("OpenDML AVI")
+        if cid == b"LIST":
+            ltype = payload[:4]
+            if len(ltype) < 4 or ltype == b"odml":
+                raise RiffFormatError("OpenDML AVI" if ltype == b"odml" else "truncated LIST chunk")
+            if ltype == b"strl":
+                out += _chunk(b"LIST", b"strl" + _filter_avi_list(payload[4:], _STRL_KEEP))
+            # LIST INFO and anything else: dropped
+        elif cid == b"JUNK":
+            out += _chunk(cid, bytes(len(payload)))
+        elif cid in keep:
+            out += _chunk(cid, payload)
+        # IDIT, strd, strn, unknown: dropped
+    return bytes(out)
+
+
+def _shift_idx1(fin: BinaryIO, payload: bytearray, movi_at: int, delta: int) -> None:
+    """idx1 offsets point at chunk headers, from the "movi" fourcc or from the file start."""
+    if len(payload) % 16:
+        raise RiffFormatError("bad idx1 size")
+    if not payload or not delta:
+        return
+    ckid, _, first, _ = struct.unpack_from("<4sIII", payload, 0)
+    fin.seek(movi_at + 8 + first)
+    if fin.read(4) == ckid:
+        return  # relative to movi: still right
+    fin.seek(first)
+    if fin.read(4) != ckid:
+        raise RiffFormatError("idx1 offsets do not point into movi")
+    for at in range(8, len(payload), 16):
+        struct.pack_into("<I", payload, at, struct.unpack_from("<I", payload, at)[0] + delta)
+
+
+def strip_avi(fin: BinaryIO, fout: BinaryIO) -> None:
+    """Write fin to fout without INFO/IDIT/strd/strn chunks. Both must be real files (seekable, with fileno)."""
+    end = _riff_end(fin, b"AVI ")
+    fin.seek(_padded(end))
+    if fin.read(4) == b"RIFF":
+        raise RiffFormatError("OpenDML AVI")  # RIFF AVIX extension chunks follow
+
+    # Lay out the output first: bytes to write, or (offset, size) of a chunk to copy
+    parts: list[bytes | bytearray | tuple[int, int]] = []
+    pos = 12
+    movi = hdrl = idx1 = None
+    for cid, at, size in _chunks(fin, 12, end):
+        if cid in _OPENDML:
+            raise RiffFormatError("OpenDML AVI")
+        if cid == b"LIST":
+            ltype = _read(fin, at + 8, 4) if size >= 4 else b""
+            if ltype == b"movi" and movi is None:
+                movi = (at, pos)
+                parts.append((at, size))
+                pos += 8 + _padded(size)
+            elif ltype == b"hdrl" and hdrl is None:
+                if size > _MAX_HDRL:
+                    raise RiffFormatError("hdrl too large")
+                hdrl = _chunk(b"LIST", b"hdrl" + _filter_avi_list(_read(fin, at + 12, size - 4), _HDRL_KEEP))
+                parts.append(hdrl)
+                pos += len(hdrl)
+            elif ltype in (b"movi", b"hdrl", b"odml"):
+                raise RiffFormatError(f"unexpected LIST {ltype!r}")
+            # INFO and unknown lists: dropped
+        elif cid == b"idx1" and idx1 is None:
+            if size > _MAX_IDX1:
+                raise RiffFormatError("idx1 too large")
+            idx1 = bytearray(_read(fin, at + 8, size))
+            parts.append(idx1)
+            pos += 8 + _padded(size)
+        elif cid == b"JUNK":
+            parts.append(_chunk(cid, bytes(size)))
+            pos += 8 + _padded(size)
+        # IDIT and unknown chunks: dropped
+    if hdrl is None or movi is None:
+        raise RiffFormatError("expected hdrl and movi lists")
+    if idx1 is not None:
+        _shift_idx1(fin, idx1, movi[0], movi[1] - movi[0])
+
+    fout.write(b"RIFF" + struct.pack("<I", pos - 8) + b"AVI ")
+    for part in parts:
+        if isinstance(part, tuple):
+            _copy_chunk(fin, fout, *part)
+        elif part is idx1:
+            fout.write(_chunk(b"idx1", bytes(part)))
+        else:
+            fout.write(part)
+
+
+def clean_webp(src: Path, dst: Path) -> None:
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        strip_webp(fin, fout)
+
+
+def clean_avi(src: Path, dst: Path) -> None:
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        strip_avi(fin, fout)
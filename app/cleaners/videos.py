@@ -2,6 +2,11 @@
 """
 Video metadata cleaner (MP4/MOV/M4V/AVI/MKV/WebM).
 Strategy:
+  0) MP4/MOV/M4V take a native pass (app/cleaners/isobmff.py) that rewrites
+     only the moov box and copies the media data once; no ffmpeg, no ExifTool.
+     Files it can't handle (fragmented, unusual layouts) use the steps below.
+     AVI likewise takes a native RIFF pass (app/cleaners/riff.py) that drops
+     the INFO/IDIT/strd chunks and copies movi once; OpenDML files don't.
   1) FFmpeg remux with stream copy to strip container/global metadata:
        -map 0           (keep all streams)
        -c copy          (no re-encode)
@@ -12,13 +17,16 @@ This preserves audio/video bytes and removes identifying metadata.
 """
 from __future__ import annotations
 from pathlib import Path
+import os
 import subprocess
-import shutil
 import tempfile
+from app.utils.exiftool import run_exiftool
+from app.utils.metrics import STAGE_SECONDS, SUBPROCESS_SPAWNS, SUBPROCESS_FAILURES
+from app.cleaners.isobmff import clean_isobmff, IsoBmffFormatError
+from app.cleaners.riff import clean_avi, RiffFormatError
 
 _FFMPEG = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
-_EXIFTOOL = [
-    "exiftool",
+_EXIFTOOL_ARGS = [
     "-all=",                    # nuke everything it knows
     "-Keys:all=",               # iOS/QuickTime keys
     "-Time:all=",               # creation/mod times in atoms
@@ -40,16 +48,40 @@ def _ffmpeg_remux(src: Path, dst: Path) -> None:
         "-movflags", "+faststart",
         str(dst),
     ]
-    subprocess.run(cmd, check=True)
+    SUBPROCESS_SPAWNS.inc(tool="ffmpeg")
+    with STAGE_SECONDS.time(stage="ffmpeg"):
+        try:
+            subprocess.run(cmd, check=True)
+        except (subprocess.SubprocessError, FileNotFoundError):
+            SUBPROCESS_FAILURES.inc(tool="ffmpeg")
+            raise
 
 def _exiftool_strip(path: Path) -> None:
-    subprocess.run(_EXIFTOOL + [str(path)], check=True, capture_output=True)
+    run_exiftool(_EXIFTOOL_ARGS + [str(path)])
+
+def _is_isobmff(path: Path) -> bool:
+    return path.suffix.lower() in {".mp4", ".mov", ".m4v"}
+
+def _is_avi(path: Path) -> bool:
+    return path.suffix.lower() == ".avi"
 
 def clean_video(src: Path, dst: Path) -> None:
-    # Work in a temp file to avoid half-written outputs on error
-    with tempfile.TemporaryDirectory() as td:
+    if _is_isobmff(src):
+        try:
+            clean_isobmff(src, dst)
+            return
+        except IsoBmffFormatError:
+            pass  # Fragmented or unusual layout: let ffmpeg remux it
+    if _is_avi(src):
+        try:
+            clean_avi(src, dst)
+            return
+        except RiffFormatError:
+            pass  # OpenDML or malformed: let ffmpeg remux it
+    # Work in a temp file next to dst (avoids half-written outputs on error; the rename is free)
+    with tempfile.TemporaryDirectory(dir=dst.parent) as td:
         tmp = Path(td) / f"tmp{src.suffix}"
         _ffmpeg_remux(src, tmp)
-        shutil.copyfile(tmp, dst)
+        os.replace(tmp, dst)
     # Defense-in-depth: run exiftool on the result
     _exiftool_strip(dst)
@@ -0,0 +1,261 @@
+# app/jobs.py
+"""
+Background cleaning jobs: submit now, poll later.
+
+POST /jobs stores the uploads and returns a job id straight away; a local pool
+of JOB_WORKERS threads feeds each file to the cleaner executor and records
+per-file state and timings. Every state change is written to JOBS_DIR/<id>.json
+(atomically, via a temp file + rename), so after a restart resume_jobs() puts
+queued or interrupted files back on the queue instead of losing them.
+A job can outlast RETENTION many times over, so its record, the uploads still
+waiting and the outputs already made are held in the artifact index until the
+job is over; only then does RETENTION start for all of them. Finished jobs are
+dropped from memory and served from their record.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.settings import JOBS_DIR, JOB_WORKERS, UPLOAD_DIR, OUTPUT_DIR
+from app.utils.executor import submit_clean
+from app.utils.admission import admitted_wait
+from app.utils import cache, storage
+from app.utils.artifacts import hold, register, release
+from app.utils.metrics import BYTES_OUT, CLEANS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_TERMINAL = {"done", "failed"}
+_OWNERS_DIR = JOBS_DIR / "owners"
+_OWNER = uuid.uuid4().hex  # identifies this server process in job records
+_owner_fd: int | None = None
+
+_jobs: dict[str, dict] = {}
+_lock = threading.Lock()
+_pool: ThreadPoolExecutor | None = None
+
+def _workers() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        return _pool
+
+def _record_path(job_id: str) -> Path:
+    return JOBS_DIR / f"{job_id}.json"
+
+def _save(job: dict) -> None:
+    # Caller holds _lock
+    job["updated"] = time.time()
+    path = _record_path(job["id"])
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(job), encoding="utf-8")
+    os.replace(tmp, path)
+    if job["state"] in _TERMINAL:
+        register(path)  # a finished job's record expires RETENTION after it ended
+    else:
+        hold(path)
+
+def _job_state(files: list[dict]) -> str:
+    states = {f["state"] for f in files}
+    if states <= _TERMINAL:
+        return "failed" if states == {"failed"} else "done"
+    if states == {"queued"}:
+        return "queued"
+    return "running"
+
+def _set_file(job: dict, idx: int, **changes) -> None:
+    with _lock:
+        job["files"][idx].update(changes)
+        job["state"] = _job_state(job["files"])
+        _save(job)
+        over = job["state"] in _TERMINAL
+        if over:
+            _jobs.pop(job["id"], None)  # the record on disk answers from now on
+    if over:
+        _finish(job)
+
+def _outputs(job: dict) -> list[Path]:
+    return [OUTPUT_DIR / f["dst"] for f in job["files"] if f["state"] == "done"]
+
+def _finish(job: dict) -> None:
+    # The job is over: its outputs (and anything a failed file left behind) get RETENTION from now,
+    # like its record
+    release(*(OUTPUT_DIR / f["dst"] for f in job["files"]))
+
+def _clean_file(entry: dict, src: Path, dst: Path) -> bool:
+    """Clean one file of a job (or take it from the cache). Returns True on a cache hit."""
+    hold(dst)  # released with the rest of the job
+    key = entry.get("key")
+    try:
+        if key and cache.fetch(key, dst):
+            CLEANS.inc(cleaner=entry["cleaner"], outcome="cached")
+            BYTES_OUT.inc(dst.stat().st_size)
+            return True
+        with admitted_wait(entry["cleaner"], src.stat().st_size):
+            submit_clean(entry["cleaner"], src, dst).result()
+        if key:
+            cache.store(key, dst)
+        return False
+    except Exception:
+        dst.unlink(missing_ok=True)  # no half-written output
+        raise
+    finally:
+        release(src)  # the upload isn't needed any more
+
+def _run_file(job: dict, idx: int) -> None:
+    entry = job["files"][idx]
+    src = UPLOAD_DIR / entry["src"]
+    dst = OUTPUT_DIR / entry["dst"]
+    if not src.is_file():
+        _set_file(job, idx, state="failed", finished=time.time(),
+                  error="Upload expired before it could be processed.")
+        return
+
+    _set_file(job, idx, state="running", started=time.time())
+    try:
+        cached = _clean_file(entry, src, dst)
+        # Other nodes answer /download for this job too
+        storage.publish([dst])
+    except Exception as e:
+        print(f"Error cleaning {entry['orig']} (job {job['id']}): {e}") # Log error
+        _set_file(job, idx, state="failed", finished=time.time(), error=str(e) or type(e).__name__)
+    else:
+        _set_file(job, idx, state="done", finished=time.time(), **({"cached": True} if cached else {}))
+
+def _enqueue(job: dict) -> None:
+    for idx, entry in enumerate(job["files"]):
+        if entry["state"] not in _TERMINAL:
+            _workers().submit(_run_file, job, idx)
+
+def submit_job(entries: list[tuple[str, str, Path, Path, str | None]]) -> dict:
+    """
+    Queue already-saved uploads for cleaning.
+    entries: (original filename, cleaner type, src path in UPLOAD_DIR, dst path in OUTPUT_DIR,
+              cache key or None)
+    """
+    now = time.time()
+    job = {
+        "id": uuid.uuid4().hex,
+        "created": now,
+        "state": "queued",
+        "owner": _OWNER,
+        "files": [
+            {"orig": orig, "cleaner": cleaner, "src": src.name, "dst": dst.name, "key": key,
+             "state": "queued", "queued": now, "started": None, "finished": None, "error": None}
+            for orig, cleaner, src, dst, key in entries
+        ],
+    }
+    _hold_owner_lock()
+    # However long the queue ahead of them, the uploads stay until their turn
+    hold(*(src for _, _, src, _, _ in entries))
+    with _lock:
+        _jobs[job["id"]] = job
+        _save(job)
+    _enqueue(job)
+    return job
+
+def _load(job_id: str) -> dict | None:
+    try:
+        return json.loads(_record_path(job_id).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+def get_job(job_id: str) -> dict | None:
+    with _lock:
+        job = _jobs.get(job_id)
+        # Another worker process may own the job; its record on disk is authoritative
+        return json.loads(json.dumps(job)) if job is not None else _load(job_id)
+
+def public_view(job: dict) -> dict:
+    files = []
+    for f in job["files"]:
+        item = {
+            "orig": f["orig"],
+            "state": f["state"],
+            "queued_at": f["queued"],
+            "started_at": f["started"],
+            "finished_at": f["finished"],
+            "elapsed_seconds": round(f["finished"] - f["started"], 3) if f["started"] and f["finished"] else None,
+            "error": f["error"],
+            "cached": f.get("cached", False),
+        }
+        if f["state"] == "done":
+            item["cleaned_name"] = f["dst"]
+            item["download"] = f"/download/{f['dst']}"
+        files.append(item)
+    return {
+        "job_id": job["id"],
+        "state": job["state"],
+        "created_at": job["created"],
+        "updated_at": job.get("updated"),
+        "files": files,
+    }
+
+def _hold_owner_lock() -> None:
+    """Hold an flock for as long as this process lives; peers probe it to tell if we are gone."""
+    global _owner_fd
+    if fcntl is None or _owner_fd is not None:
+        return
+    _OWNERS_DIR.mkdir(parents=True, exist_ok=True)
+    _owner_fd = os.open(_OWNERS_DIR / f"{_OWNER}.lock", os.O_CREAT | os.O_RDWR)
+    fcntl.flock(_owner_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+def _owner_alive(owner: str | None) -> bool:
+    if owner == _OWNER:
+        return True
+    if fcntl is None or not owner:
+        # No way to probe peers (Windows): assume a single server process
+        return False
+    path = _OWNERS_DIR / f"{owner}.lock"
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+    path.unlink(missing_ok=True)
+    return False
+
+def resume_jobs() -> int:
+    """Re-queue unfinished files from jobs whose owning process is gone. Returns jobs resumed."""
+    _hold_owner_lock()
+    resumed = 0
+    with open(JOBS_DIR / ".resume.lock", "a") as guard:
+        # Serialize resumers so two workers starting together can't adopt the same job
+        if fcntl is not None:
+            fcntl.flock(guard, fcntl.LOCK_EX)
+        for path in JOBS_DIR.glob("*.json"):
+            job = _load(path.stem)
+            if job is None or job["state"] in _TERMINAL or _owner_alive(job.get("owner")):
+                continue
+            with _lock:
+                for entry in job["files"]:
+                    if entry["state"] == "running":
+                        entry.update(state="queued", started=None)
+                hold(*(UPLOAD_DIR / f["src"] for f in job["files"] if f["state"] not in _TERMINAL), *_outputs(job))
+                job["owner"] = _OWNER
+                job["state"] = _job_state(job["files"])
+                _jobs[job["id"]] = job
+                _save(job)
+            _enqueue(job)
+            resumed += 1
+    return resumed
+
+def shutdown_jobs() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -1,29 +1,114 @@
 # app/server.py
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, File, Form, Request, UploadFile, HTTPException
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from app.cleaners.videos import clean_video
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from pathlib import Path
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
 import shutil
 import uuid
 import os
-import zipfile
-import subprocess
+import re
+import time
 from typing import List
-from app.utils.signature import detect_extension, ext_equivalent
-from app.settings import UPLOAD_DIR, OUTPUT_DIR, ALLOWED_EXTENSIONS, MAX_FILE_SIZE
-from app.utils.cleanup import cleanup_once, start_background_cleanup
-from app.cleaners.images import clean_image
-from app.cleaners.office import clean_office
-from app.cleaners.pdfs import clean_pdf
+from app.utils.signature import HEADER_WINDOW, FileType, detect_type, is_zip_container
+from app.settings import (UPLOAD_DIR, OUTPUT_DIR, CACHE_DIR, BATCH_DIR, MAX_FILE_SIZE, UPLOAD_CHUNK_SIZE,
+                          INMEMORY_MAX_BYTES, MAX_RESUMABLE_SIZE)
+from app.cleaners import registry
+from app.utils.cleanup import start_background_cleanup
+from app.utils.artifacts import hold, register, release
+from app.utils import cache, reports, resumable, storage
+from app.utils.zipstream import stream_zip
+from app.utils.fileresponse import RangeFileResponse, RangeStorageResponse, content_disposition, content_type_for
+from app.utils.exiftool import shutdown_pool
+from app.utils.executor import run_clean, run_clean_bytes, shutdown_executors
+from app.utils.admission import Overloaded, admit_request, admitted
+from app.utils import metrics
+from app.utils.metrics import BYTES_IN, BYTES_OUT, CLEANS, INFLIGHT, REQUEST_SECONDS, STAGE_SECONDS
+from app.jobs import submit_job, get_job, public_view, resume_jobs, shutdown_jobs
 
 app = FastAPI(title="Aintivirus Metadata Remover (MVP)")
 
+_HEX_ID = re.compile(r"[0-9a-f]{32}")  # job and batch ids
+
 app.mount("/static", StaticFiles(directory=str(Path(__file__).resolve().parent.parent / "static")), name="static")
 
 @app.on_event("startup")
 def bootstrap():
+    registry.probe()
+    for name, missing in registry.unavailable().items():
+        print(f"{name} uploads disabled: {', '.join(missing)} not found on PATH") # Log error
     start_background_cleanup(interval_seconds=120)
+    resume_jobs()
+
+@app.on_event("shutdown")
+def teardown():
+    shutdown_jobs()
+    shutdown_executors()
+    shutdown_pool()
+
+class _TrackRequests:
+    """
+    In-flight requests and latency to the response start, per route. Plain ASGI, not
+    @app.middleware("http"): that one copies every body chunk through a memory stream and
+    only passes http.response.body on, so the zero-copy sends of RangeFileResponse would fail.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        INFLIGHT.inc(kind="requests")
+        start = time.perf_counter()
+        started = False
+
+        async def send_tracked(message: Message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start" and not started:
+                started = True
+                INFLIGHT.dec(kind="requests")
+                # Label by route template (/jobs/{job_id}), not the raw path, to keep the series count fixed
+                route = scope.get("route")
+                REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                        route=getattr(route, "path", "unmatched"), method=scope["method"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracked)
+        finally:
+            if not started:
+                INFLIGHT.dec(kind="requests")
+
+app.add_middleware(_TrackRequests)
+
+def _dir_usage() -> list[str]:
+    lines = ["# HELP scrubber_dir_bytes Bytes stored per working directory.", "# TYPE scrubber_dir_bytes gauge",
+             "# HELP scrubber_dir_files Files stored per working directory.", "# TYPE scrubber_dir_files gauge"]
+    for name, folder in (("uploads", UPLOAD_DIR), ("outputs", OUTPUT_DIR), ("cache", CACHE_DIR)):
+        size = count = 0
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file(follow_symlinks=False):
+                        size += entry.stat(follow_symlinks=False).st_size
+                        count += 1
+        except FileNotFoundError:
+            pass
+        lines += [f'scrubber_dir_bytes{{dir="{name}"}} {size}', f'scrubber_dir_files{{dir="{name}"}} {count}']
+    return lines
+
+metrics.add_collector(_dir_usage)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/", response_class=HTMLResponse)
 def home():
@@ -33,85 +118,304 @@ def home():
 def _secure_ext(filename: str) -> str:
     return Path(filename).suffix.lower()
 
-async def _validate_and_read(upload_file: UploadFile):
+async def _validate_and_save(upload_file: UploadFile, dst: Path, hasher=None) -> str | None:
     ext = _secure_ext(upload_file.filename)
-    if ext not in ALLOWED_EXTENSIONS:
-        return None, f"Extension {ext} not allowed."
-    
-    data = await upload_file.read()
-    
-    if len(data) > MAX_FILE_SIZE:
-        return None, f"File too large. Limit is {MAX_FILE_SIZE} bytes."
-        
-    _verify_signature(data, upload_file.filename)
-    return data, None
-
-def _verify_signature(data: bytes, filename: str) -> None:
+    if ext not in registry.allowed_extensions():
+        return f"Extension {ext} not allowed."
+    return await _save_upload(upload_file, dst, hasher=hasher)
+
+async def _save_upload(upload_file: UploadFile, dst: Path, verify: bool = True, hasher=None) -> str | None:
+    """
+    Stream an upload into dst in UPLOAD_CHUNK_SIZE pieces so memory stays flat
+    whatever the file size. Returns an error detail (and removes dst) once the
+    size limit is crossed; raises HTTPException on a signature mismatch.
+    If given, hasher (a hashlib object) is fed every chunk as it is written.
+    """
+    head = None
+    size = 0
+    too_large = False
+    hold(dst)  # a slow upload must not expire while it is still arriving
+    started = time.perf_counter()
+    try:
+        with open(dst, "wb") as f:
+            while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    too_large = True
+                    break
+                if head is None:
+                    head = chunk
+                    # ZIP-based formats need the central directory, checked once on disk
+                    if verify and not is_zip_container(head):
+                        _verify_signature(head, upload_file.filename)
+                f.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+        BYTES_IN.inc(size)
+        if too_large:
+            dst.unlink(missing_ok=True)
+            return f"File too large. Limit is {MAX_FILE_SIZE} bytes."
+        if verify and (head is None or is_zip_container(head)):
+            _verify_signature(head or b"", upload_file.filename, dst)
+        release(dst)  # RETENTION counts from the end of the upload
+    except BaseException:
+        dst.unlink(missing_ok=True)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="upload")
+    return None
+
+def _verify_signature(head: bytes, filename: str, path: Path | None = None) -> FileType:
     claimed = Path(filename).suffix.lower()
-    detected = detect_extension(data)
+    # ZIP containers are classified from the central directory of the file on disk
+    with STAGE_SECONDS.time(stage="verify_signature"):
+        detected = detect_type(path if path is not None and is_zip_container(head) else head)
     if detected is None:
         raise HTTPException(status_code=400, detail="Unsupported or unrecognized file signature.")
-    if not ext_equivalent(claimed, detected):
+    if not detected.accepts(claimed):
         raise HTTPException(
             status_code=400,
-            detail=f"Extension spoofing detected: file looks like {detected} but was uploaded as {claimed}."
+            detail=f"Extension spoofing detected: file looks like {detected.ext} but was uploaded as {claimed}."
         )
+    return detected
 
 def _choose_cleaner(ext: str):
-    if ext in {".jpg", ".jpeg", ".png", ".gif", ".tif", ".tiff", ".webp"}: # <-- .webp ADDED HERE
-        return "image"
-    if ext in {".docx", ".xlsx"}:
-        return "office"
-    if ext in {".pdf"}:
-        return "pdf"
-    if ext in {".mp4", ".mov", ".m4v", ".avi", ".mkv", ".webm"}:
-        return "video"
-    return None
+    fmt = registry.format_for(ext)
+    return fmt.kind if fmt else None
 
-@app.post("/clean-batch")
-async def clean_batch(uploads: List[UploadFile] = File(...)):
-    if not uploads:
-        raise HTTPException(status_code=400, detail="No files uploaded.")
+def _fits_in_memory(upload_file: UploadFile) -> bool:
+    fmt = registry.format_for(_secure_ext(upload_file.filename))
+    return (upload_file.size is not None and upload_file.size <= min(INMEMORY_MAX_BYTES, MAX_FILE_SIZE)
+            and fmt is not None and fmt.cleans_in_memory)
 
-    results = []
-    uid = uuid.uuid4().hex
+async def _read_upload(upload_file: UploadFile, hasher=None) -> bytes:
+    """Read a small upload (see _fits_in_memory) into memory; raises HTTPException on a signature mismatch."""
+    started = time.perf_counter()
+    try:
+        data = await upload_file.read()
+        BYTES_IN.inc(len(data))
+        # The whole file is at hand, ZIP central directory included
+        _verify_signature(data, upload_file.filename)
+        if hasher is not None:
+            hasher.update(data)
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="upload")
+    return data
+
+async def _save_batch(uploads: List[UploadFile], uid: str,
+                      in_memory: bool = False) -> list[tuple[str, str, Path | bytes, Path, str | None]]:
+    """
+    Validate and store each upload; returns (orig name, cleaner type, src, dst, cache key)
+    per accepted file. The cache key is None when the cache is off. With in_memory,
+    uploads up to INMEMORY_MAX_BYTES are not written to UPLOAD_DIR: src is their bytes.
+    """
+    pending = []
     for up in uploads:
-        data, error_detail = await _validate_and_read(up)
-        if error_detail:
+        entry = await _save_one(up, uid, in_memory)
+        if isinstance(entry, str):
             # For simplicity in a batch, we can skip failed files. 
             # In a real app, you might return specific errors per file.
             continue 
+        pending.append(entry)
+    return pending
+
+async def _save_one(up: UploadFile, uid: str, in_memory: bool = False) -> tuple[str, str, Path | bytes, Path, str | None] | str:
+    """One _save_batch entry, or the reason the file was skipped. Raises HTTPException on a signature mismatch."""
+    ext = _secure_ext(up.filename)
+    dst_path = OUTPUT_DIR / f"{uid}_{Path(up.filename).stem}_clean{ext}"
+    hasher = hashlib.sha256() if cache.enabled() else None
+    if in_memory and _fits_in_memory(up):
+        src = await _read_upload(up, hasher)
+    else:
+        src = UPLOAD_DIR / f"{uid}_{uuid.uuid4().hex}{ext}"
+        error_detail = await _validate_and_save(up, src, hasher)
+        if error_detail:
+            return error_detail
 
-        ext = _secure_ext(up.filename)
-        src_path = UPLOAD_DIR / f"{uid}_{uuid.uuid4().hex}{ext}"
-        dst_path = OUTPUT_DIR / f"{uid}_{Path(up.filename).stem}_clean{ext}"
-        src_path.write_bytes(data)
+    cleaner_type = _choose_cleaner(ext)
+    if cleaner_type is None:
+        return f"No cleaner for {ext} files." # Skip unsupported but allowed types
+    key = cache.cache_key(hasher.hexdigest(), ext) if hasher else None
+    return up.filename, cleaner_type, src, dst_path, key
 
+def _session(upload_id: str) -> resumable.Session:
+    session = resumable.load(upload_id) if _HEX_ID.fullmatch(upload_id) else None
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found (maybe it expired or was already used).")
+    return session
+
+Claim = tuple[tuple[str, str, Path, Path, str | None], resumable.Session]
+
+async def _claim_uploads(upload_ids: List[str], uid: str) -> list[Claim]:
+    """
+    (_save_batch entry, session) for each finished resumable upload: its data file is cleaned
+    in place. Every id is checked before any is claimed, so one bad id takes none of them.
+    The caller settles or unclaims each session (_settle) once it knows how cleaning went.
+    """
+    checked = [await _check_upload(upload_id) for upload_id in upload_ids]
+    claims = []
+    try:
+        for session, digest in checked:
+            claims.append(await _claim_checked(session, digest, uid))
+    except BaseException:
+        await _settle(claims, [False] * len(claims))
+        raise
+    return claims
+
+async def _claim_one(upload_id: str, uid: str) -> Claim:
+    return await _claim_checked(*await _check_upload(upload_id), uid)
+
+async def _check_upload(upload_id: str) -> tuple[resumable.Session, str | None]:
+    """A resumable upload ready to clean and its SHA-256 (None with the cache off); HTTPException if it isn't."""
+    session = _session(upload_id)
+    if not await asyncio.to_thread(resumable.complete, session):
+        raise HTTPException(status_code=409, detail=f"Upload {upload_id} is not complete yet.")
+    head = await asyncio.to_thread(resumable.read_head, session, HEADER_WINDOW)
+    try:
+        _verify_signature(head, session.filename, session.data_path)
+    except HTTPException:
+        await asyncio.to_thread(resumable.delete, session)
+        raise
+    digest = await asyncio.to_thread(resumable.sha256, session) if cache.enabled() else None
+    return session, digest
+
+async def _claim_checked(session: resumable.Session, digest: str | None, uid: str) -> Claim:
+    try:
+        src = await asyncio.to_thread(resumable.claim, session)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Upload {session.id} was already used.")
+    ext = session.ext
+    dst_path = OUTPUT_DIR / f"{uid}_{Path(session.filename).stem}_clean{ext}"
+    key = cache.cache_key(digest, ext) if digest else None
+    return (session.filename, _choose_cleaner(ext), src, dst_path, key), session
+
+async def _settle(claims: list[Claim], cleaned: list[bool]) -> None:
+    """End the sessions whose upload was cleaned; put the others back so the client can retry."""
+    for (_, session), ok in zip(claims, cleaned):
         try:
-            cleaner_type = _choose_cleaner(ext)
-            if cleaner_type == "image":
-                clean_image(src_path, dst_path)
-            elif cleaner_type == "office":
-                clean_office(src_path, dst_path)
-            elif cleaner_type == "pdf":
-                clean_pdf(src_path, dst_path)
-            elif cleaner_type == "video":
-                clean_video(src_path, dst_path)
+            await asyncio.to_thread(resumable.settle if ok else resumable.unclaim, session)
+        except OSError as e:
+            print(f"Could not settle upload {session.id}: {e}") # Log error
+
+async def _clean_cached(cleaner_type: str, src: Path | bytes, dst: Path, key: str | None) -> bool:
+    """
+    Serve dst from the cache if we can, else clean and cache it. Returns True on a cache hit.
+    The upload and the output are held while we wait for admission and clean, and both
+    expire RETENTION after we are done; a failed output is removed straight away.
+    """
+    in_memory = isinstance(src, bytes)
+    files = (dst,) if in_memory else (dst, src)
+    # The artifact index and the cache link/copy files and write SQLite: off the event loop
+    await asyncio.to_thread(hold, *files)
+    try:
+        if key and await asyncio.to_thread(cache.fetch, key, dst):
+            CLEANS.inc(cleaner=cleaner_type, outcome="cached")
+            BYTES_OUT.inc(dst.stat().st_size)
+            return True
+        async with admitted(cleaner_type, len(src) if in_memory else src.stat().st_size):
+            if in_memory:
+                # Only the cleaned output touches the disk
+                cleaned = await run_clean_bytes(cleaner_type, src, dst.suffix)
+                await asyncio.to_thread(dst.write_bytes, cleaned)
             else:
-                continue # Skip unsupported but allowed types
+                await run_clean(cleaner_type, src, dst)
+    except BaseException:
+        dst.unlink(missing_ok=True)
+        raise
+    finally:
+        await asyncio.to_thread(release, *files)
+    if key:
+        await asyncio.to_thread(cache.store, key, dst)
+    return False
 
-            results.append({
-                "orig": up.filename,
-                "cleaned_name": dst_path.name,
-                "download": f"/download/{dst_path.name}"
-            })
-        except Exception as e:
-            print(f"Error cleaning {up.filename}: {e}") # Log error
-        finally:
-            cleanup_once()
+def _batch_manifest(uid: str) -> Path:
+    return BATCH_DIR / f"{uid}.json"
+
+def _write_manifest(uid: str, results: list[dict]) -> None:
+    # Just the member names: GET /download-batch/{uid} zips the outputs on the fly from these
+    path = _batch_manifest(uid)
+    register(path)
+    path.write_text(json.dumps([item["cleaned_name"] for item in results]), encoding="utf-8")
+    storage.publish([path])
+
+def _stored_output(name: str) -> storage.ObjectInfo | None:
+    # An output this node doesn't have may have been cleaned (and published) by another one
+    try:
+        return storage.get_storage().stat(f"outputs/{name}")
+    except ValueError:
+        return None  # not a valid output name
+
+def _admit() -> None:
+    # Once per request: past this point its files wait for cleaner slots instead of being refused
+    try:
+        admit_request()
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def _clean_inline(upload_file: UploadFile) -> Response:
+    """Clean one small upload entirely in memory and return it as the response body; nothing is stored."""
+    if not _fits_in_memory(upload_file):
+        raise HTTPException(status_code=400,
+                            detail=f"inline=true takes one JPEG, PNG, WebP, DOCX or XLSX file (or PDF, "
+                                   f"with pikepdf installed) of at most "
+                                   f"{min(INMEMORY_MAX_BYTES, MAX_FILE_SIZE)} bytes.")
+    ext = _secure_ext(upload_file.filename)
+    cleaner_type = _choose_cleaner(ext)
+    data = await _read_upload(upload_file)
+    try:
+        async with admitted(cleaner_type, len(data)):
+            cleaned = await run_clean_bytes(cleaner_type, data, ext)
+    except Exception as e:
+        print(f"Error cleaning {upload_file.filename}: {e}") # Log error
+        raise HTTPException(status_code=400, detail="All uploaded files were invalid or failed to process.")
+    name = f"{Path(upload_file.filename).stem}_clean{ext}"
+    return Response(cleaned, media_type=content_type_for(name),
+                    headers={"Content-Disposition": content_disposition(name)})
+
+@app.post("/clean-batch")
+async def clean_batch(uploads: List[UploadFile] = File(None), upload_ids: List[str] = Form(None),
+                      inline: bool = False):
+    uploads, upload_ids = uploads or [], upload_ids or []
+    if not uploads and not upload_ids:
+        raise HTTPException(status_code=400, detail="No files uploaded.")
+    _admit()
+    if inline:
+        if len(uploads) != 1 or upload_ids:
+            raise HTTPException(status_code=400, detail="inline=true takes exactly one file.")
+        return await _clean_inline(uploads[0])
+
+    uid = uuid.uuid4().hex
+    claims = await _claim_uploads(upload_ids, uid)
+    try:
+        pending = [entry for entry, _ in claims] + await _save_batch(uploads, uid, in_memory=True)
+    except BaseException:
+        await _settle(claims, [False] * len(claims))
+        raise
+
+    # Clean the whole batch concurrently off the event loop; gather keeps input order
+    outcomes = await asyncio.gather(
+        *(_clean_cached(cleaner_type, src, dst, key) for _, cleaner_type, src, dst, key in pending),
+        return_exceptions=True,
+    )
+    # Resumable uploads that didn't make it stay claimable, so a retry needn't upload them again
+    await _settle(claims, [not isinstance(o, BaseException) for o in outcomes])
+    results = []
+    cleaned = []
+    for (orig, _, _, dst_path, _), outcome in zip(pending, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"Error cleaning {orig}: {outcome}") # Log error
+            continue
+        cleaned.append(dst_path)
+        results.append({
+            "orig": orig,
+            "cleaned_name": dst_path.name,
+            "download": f"/download/{dst_path.name}",
+            "cached": outcome,
+        })
 
     if not results:
         raise HTTPException(status_code=400, detail="All uploaded files were invalid or failed to process.")
+    await asyncio.to_thread(storage.publish, cleaned)
 
     if len(results) == 1:
         item = results[0]
@@ -121,49 +425,351 @@ async def clean_batch(uploads: List[UploadFile] = File(...)):
             "items": results
         }
 
-    zip_name = f"{uid}_cleaned_files.zip"
-    zip_path = OUTPUT_DIR / zip_name
-    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        for item in results:
-            file_path = OUTPUT_DIR / item["cleaned_name"]
-            if file_path.exists():
-                z.write(file_path, arcname=item["cleaned_name"])
-
+    await asyncio.to_thread(_write_manifest, uid, results)
     return {
-        "zip_download": f"/download/{zip_name}",
+        "zip_download": f"/download-batch/{uid}",
+        "zip_filename": f"{uid}_cleaned_files.zip",
         "items": results,
         "count": len(results)
     }
 
-@app.post("/inspect")
-async def inspect(upload: UploadFile = File(...)):
-    data = await upload.read()
-    ext = _secure_ext(upload.filename)
-    tmp = UPLOAD_DIR / f"inspect_{uuid.uuid4().hex}{ext}"
-    tmp.write_bytes(data)
+_CLAIM_ERRORS = {400: "signature", 404: "not_found", 409: "incomplete"}
+
+def _file_error(code: str, message: str, **extra) -> dict:
+    return {"status": "failed", "error": {"code": code, "message": message, **extra}}
+
+async def _file_event(entry: tuple, started: float) -> dict:
+    """Clean one accepted file and describe the outcome (never raises)."""
+    orig, cleaner_type, src, dst, key = entry
+    bytes_in = None
+    try:
+        bytes_in = len(src) if isinstance(src, bytes) else src.stat().st_size
+        cached = await _clean_cached(cleaner_type, src, dst, key)
+        # Publish now rather than with the batch, so the file can be downloaded (from any node) right away
+        await asyncio.to_thread(storage.publish, [dst])
+        event = {"status": "cached" if cached else "ok", "cleaned_name": dst.name,
+                 "download": f"/download/{dst.name}", "bytes_out": dst.stat().st_size}
+    except Exception as e:
+        print(f"Error cleaning {orig}: {e}") # Log error
+        event = _file_error("clean_failed", str(e) or type(e).__name__)
+    return {**event, "bytes_in": bytes_in, "elapsed": round(time.perf_counter() - started, 3)}
+
+async def _start_batch(uploads: List[UploadFile], upload_ids: List[str], uid: str,
+                       queue: asyncio.Queue) -> list[asyncio.Task]:
+    """
+    Save every form upload while the request's uploads are still open; each one starts
+    cleaning as soon as it is saved. Resumable uploads are already on disk, so checking,
+    hashing and claiming them happens in their own task and never delays the response.
+    Files that can't be taken are queued as failed events right away. Returns the tasks,
+    each of which queues exactly one event for its file.
+    """
+    tasks = []
+
+    async def _clean(index: int, orig: str, file_started: float, entry: tuple | None = None,
+                     upload_id: str | None = None) -> None:
+        claim = event = None
+        try:
+            if entry is None:
+                claim = await _claim_one(upload_id, uid)
+                entry = claim[0]
+                orig = entry[0]
+            event = await _file_event(entry, file_started)
+        except HTTPException as e:
+            event = _file_error(_CLAIM_ERRORS.get(e.status_code, "invalid"), e.detail)
+        except Exception as e:
+            print(f"Error claiming {orig}: {e}") # Log error
+            event = _file_error("upload_failed", str(e) or type(e).__name__)
+        finally:
+            if claim is not None:  # also when the client went away and we were cancelled
+                await _settle([claim], [event is not None and event["status"] != "failed"])
+        await queue.put({"event": "file", "index": index, "orig": orig, **event})
+
+    for index, upload_id in enumerate(upload_ids):
+        tasks.append(asyncio.create_task(_clean(index, upload_id, time.perf_counter(), upload_id=upload_id)))
+    for index, up in enumerate(uploads, start=len(upload_ids)):
+        file_started = time.perf_counter()
+        try:
+            entry = await _save_one(up, uid, in_memory=True)
+        except HTTPException as e:
+            entry = _file_error("signature", e.detail)
+        except Exception as e:
+            print(f"Error saving {up.filename}: {e}") # Log error
+            entry = _file_error("upload_failed", str(e) or type(e).__name__)
+        if isinstance(entry, str):
+            entry = _file_error("invalid", entry)
+        if isinstance(entry, dict):
+            queue.put_nowait({"event": "file", "index": index, "orig": up.filename, **entry})
+        else:
+            tasks.append(asyncio.create_task(_clean(index, up.filename, file_started, entry)))
+    return tasks
+
+async def _batch_events(queue: asyncio.Queue, tasks: list[asyncio.Task], total: int, uid: str, started: float):
+    """
+    One {"event": "file", ...} per file as it finishes (completion order; `index` is its place
+    in the request), then {"event": "done", ...} with the totals and the ZIP link.
+    """
+    cleaned: list[Path] = []
+    failed = 0
+    try:
+        for _ in range(total):
+            event = await queue.get()
+            if event["status"] == "failed":
+                failed += 1
+            else:
+                cleaned.append(OUTPUT_DIR / event["cleaned_name"])
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()  # only matters if the client went away mid-batch
+
+    done = {"event": "done", "count": len(cleaned), "failed": failed}
+    if len(cleaned) > 1:
+        await asyncio.to_thread(_write_manifest, uid, [{"cleaned_name": p.name} for p in cleaned])
+        done.update(zip_download=f"/download-batch/{uid}", zip_filename=f"{uid}_cleaned_files.zip")
+    yield {**done, "elapsed": round(time.perf_counter() - started, 3)}
+
+def _ndjson(events):
+    async def _lines():
+        async for event in events:
+            yield json.dumps(event) + "\n"
+    return _lines()
+
+def _sse(events):
+    async def _messages():
+        async for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    return _messages()
+
+@app.post("/clean-batch/stream")
+async def clean_batch_stream(request: Request, uploads: List[UploadFile] = File(None),
+                             upload_ids: List[str] = Form(None)):
+    """
+    /clean-batch with progress: the response is a stream of per-file events, NDJSON by
+    default or Server-Sent Events when the client accepts text/event-stream.
+    """
+    uploads, upload_ids = uploads or [], upload_ids or []
+    if not uploads and not upload_ids:
+        raise HTTPException(status_code=400, detail="No files uploaded.")
+    _admit()
+    uid, started, queue = uuid.uuid4().hex, time.perf_counter(), asyncio.Queue()
+    tasks = await _start_batch(uploads, upload_ids, uid, queue)
+    events = _batch_events(queue, tasks, len(uploads) + len(upload_ids), uid, started)
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    return StreamingResponse(
+        _sse(events) if sse else _ndjson(events),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        # Each event must reach the client when it happens, not when a proxy buffer fills
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/jobs", status_code=202)
+async def create_job(uploads: List[UploadFile] = File(None), upload_ids: List[str] = Form(None)):
+    uploads, upload_ids = uploads or [], upload_ids or []
+    if not uploads and not upload_ids:
+        raise HTTPException(status_code=400, detail="No files uploaded.")
+    uid = uuid.uuid4().hex
+    claims = await _claim_uploads(upload_ids, uid)
+    try:
+        pending = [entry for entry, _ in claims] + await _save_batch(uploads, uid)
+        if not pending:
+            raise HTTPException(status_code=400, detail="All uploaded files were invalid.")
+        job = submit_job(pending)
+    except BaseException:
+        await _settle(claims, [False] * len(claims))
+        raise
+    await _settle(claims, [True] * len(claims))  # the job has them now
+    return {"job_id": job["id"], "status": f"/jobs/{job['id']}", "count": len(pending)}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = get_job(job_id) if _HEX_ID.fullmatch(job_id) else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (maybe it expired and was deleted).")
+    return public_view(job)
+
+def _tus(**headers: str) -> dict[str, str]:
+    return {"Tus-Resumable": resumable.TUS_VERSION, **{k.replace("_", "-"): v for k, v in headers.items()}}
+
+def _int_header(request: Request, name: str) -> int:
+    try:
+        value = int(request.headers[name])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Missing or invalid {name} header.")
+    if value < 0:
+        raise HTTPException(status_code=400, detail=f"Missing or invalid {name} header.")
+    return value
+
+def _upload_filename(metadata: str) -> str | None:
+    # tus Upload-Metadata: "key base64value,key base64value"
+    for pair in metadata.split(","):
+        key, _, value = pair.strip().partition(" ")
+        if key == "filename":
+            try:
+                return base64.b64decode(value, validate=True).decode("utf-8")
+            except (binascii.Error, UnicodeDecodeError):
+                return None
+    return None
+
+@app.options("/uploads")
+def upload_capabilities():
+    return Response(status_code=204, headers=_tus(Tus_Version=resumable.TUS_VERSION,
+                                                  Tus_Extension="creation,termination",
+                                                  Tus_Max_Size=str(MAX_RESUMABLE_SIZE)))
+
+@app.post("/uploads", status_code=201)
+async def create_upload(request: Request):
+    length = _int_header(request, "Upload-Length")
+    filename = _upload_filename(request.headers.get("Upload-Metadata", ""))
+    if not filename:
+        raise HTTPException(status_code=400, detail="Upload-Metadata must carry the filename.")
+    ext = _secure_ext(filename)
+    if ext not in registry.allowed_extensions():
+        raise HTTPException(status_code=400, detail=f"Extension {ext} not allowed.")
+    if length > MAX_RESUMABLE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File too large. Limit is {MAX_RESUMABLE_SIZE} bytes.")
+    try:
+        session = await asyncio.to_thread(resumable.create, Path(filename).name, length)
+    except OSError as e:
+        print(f"Could not create upload for {filename}: {e}") # Log error
+        raise HTTPException(status_code=507, detail="Not enough space for this upload.")
+    return Response(status_code=201, headers=_tus(Location=f"/uploads/{session.id}", Upload_Offset="0"))
+
+@app.head("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    session = _session(upload_id)
+    ranges = await asyncio.to_thread(resumable.received, session)
+    return Response(status_code=200, headers=_tus(
+        Upload_Offset=str(resumable.offset(ranges)),
+        Upload_Length=str(session.length),
+        Upload_Ranges=",".join(f"{start}-{end - 1}" for start, end in ranges),
+        Cache_Control="no-store",
+    ))
+
+@app.patch("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    session = _session(upload_id)
+    start = _int_header(request, "Upload-Offset")
+    if start > session.length:
+        raise HTTPException(status_code=400, detail="Upload-Offset is past Upload-Length.")
+
+    def _check_head(head: bytes) -> None:
+        # Spoofed extensions are refused with the first chunk (once it holds a full header window),
+        # not after the whole upload
+        if not is_zip_container(head):
+            _verify_signature(head, session.filename)
+
+    started = time.perf_counter()
+    written = 0
+    try:
+        written = await resumable.receive(session, start, request.stream(), _check_head, HEADER_WINDOW)
+    except HTTPException:
+        await asyncio.to_thread(resumable.delete, session)  # spoofed: the rest of it is not wanted either
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found (maybe it expired or was already used).")
+    finally:
+        BYTES_IN.inc(written)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="upload")
+    ranges = await asyncio.to_thread(resumable.received, session)
+    return Response(status_code=204, headers=_tus(Upload_Offset=str(resumable.offset(ranges))))
+
+@app.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    await asyncio.to_thread(resumable.delete, _session(upload_id))
+    return Response(status_code=204, headers=_tus())
+
+async def _inspecting(func, *args):
+    """Run an ExifTool inspection off the event loop, failing as HTTP 500."""
     try:
-        out = subprocess.run(["exiftool", str(tmp)], check=True, capture_output=True, text=True).stdout
-        return {"report": out}
+        return await asyncio.to_thread(func, *args)
     except FileNotFoundError:
         raise HTTPException(status_code=500, detail="Server missing exiftool.")
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"Inspection failed: {e}")
+
+async def _inspect_uploads(uploads: List[UploadFile]) -> list[dict]:
+    """
+    Report per upload, in order: {"name", "report"} or {"name", "error"}.
+    Uploads seen recently (same SHA-256) come from the report cache; the rest
+    are inspected together in one ExifTool call.
+    """
+    items: list[dict] = []
+    temps: list[Path] = []
+    misses: list[tuple[dict, Path, str]] = []
+    try:
+        for up in uploads:
+            item = {"name": up.filename}
+            items.append(item)
+            tmp = UPLOAD_DIR / f"inspect_{uuid.uuid4().hex}{_secure_ext(up.filename)}"
+            hasher = hashlib.sha256()
+            error_detail = await _save_upload(up, tmp, verify=False, hasher=hasher)
+            if error_detail:
+                item["error"] = error_detail
+                continue
+            temps.append(tmp)
+            digest = hasher.hexdigest()
+            report = reports.cached(digest)
+            if report is not None:
+                item["report"] = report
+            else:
+                misses.append((item, tmp, digest))
+        found = await _inspecting(reports.read_reports, [tmp for _, tmp, _ in misses]) if misses else []
+        for (item, _, digest), report in zip(misses, found):
+            reports.remember(digest, report)
+            item["report"] = report
     finally:
-        if tmp.exists():
-            tmp.unlink()
+        for tmp in temps:
+            tmp.unlink(missing_ok=True)
+    return items
+
+@app.post("/inspect")
+async def inspect(upload: UploadFile = File(...)):
+    item = (await _inspect_uploads([upload]))[0]
+    if "error" in item:
+        raise HTTPException(status_code=413, detail=item["error"])
+    return {"report": item["report"]}
+
+@app.post("/inspect-batch")
+async def inspect_batch(uploads: List[UploadFile] = File(...)):
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No files uploaded.")
+    return {"items": await _inspect_uploads(uploads)}
 
 @app.get("/download/{name}")
 def download(name: str):
     path = OUTPUT_DIR / name
-    if not path.is_file():
+    if path.is_file():
+        return RangeFileResponse(path, filename=name, etag_of=lambda st: storage.content_etag(path, st))
+    info = _stored_output(name)
+    if info is None:
         raise HTTPException(status_code=404, detail="File not found (maybe it expired and was deleted).")
-    return FileResponse(path, media_type="application/octet-stream", filename=name)
+    return RangeStorageResponse(storage.get_storage(), f"outputs/{name}", info, filename=name)
+
+@app.get("/download-batch/{uid}")
+def download_batch(uid: str):
+    names = None
+    opened = storage.local_or_stored(_batch_manifest(uid)) if _HEX_ID.fullmatch(uid) else None
+    if opened is not None:
+        with opened[0] as f:
+            names = json.loads(f.read())
+    if not names:
+        raise HTTPException(status_code=404, detail="Batch not found (maybe it expired and was deleted).")
+    zip_name = f"{uid}_cleaned_files.zip"
+    return StreamingResponse(
+        stream_zip((OUTPUT_DIR / name, name) for name in names),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{zip_name}"'},
+    )
 
 @app.get("/inspect-output/{name}")
-def inspect_output(name: str):
+async def inspect_output(name: str):
     path = OUTPUT_DIR / name
-    if not path.is_file():
+    if not path.is_file() and _stored_output(name) is None:
         raise HTTPException(status_code=404, detail="File not found (maybe expired).")
-    try:
-        out = subprocess.run(["exiftool", str(path)], check=True, capture_output=True, text=True).stdout
-        return {"report": out}
-    except FileNotFoundError:
-        raise HTTPException(status_code=500, detail="Server missing exiftool.")
+    # Made on the first ask and kept, not while cleaning: most outputs are never inspected
+    report = await _inspecting(reports.report_for, path)
+    if report is None:
+        raise HTTPException(status_code=404, detail="File not found (maybe expired).")
+    return {"report": report}
@@ -4,19 +4,97 @@ import os
 from datetime import timedelta
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-UPLOAD_DIR = BASE_DIR / "uploads"
-OUTPUT_DIR = BASE_DIR / "outputs"
+# Working files (uploads, outputs, job records, cache, expiry index) live under DATA_DIR
+DATA_DIR = Path(os.getenv("DATA_DIR") or BASE_DIR)
+UPLOAD_DIR = DATA_DIR / "uploads"
+OUTPUT_DIR = DATA_DIR / "outputs"
+JOBS_DIR = DATA_DIR / "jobs"
+# Batch manifests: kept out of OUTPUT_DIR so /download never serves them
+BATCH_DIR = DATA_DIR / "batches"
+CACHE_DIR = DATA_DIR / "cache"
+# After-reports of cleaned outputs (app/utils/reports.py): kept out of OUTPUT_DIR for the same reason
+REPORT_DIR = DATA_DIR / "reports"
+# SQLite index of every file we write and when it must be deleted (app/utils/artifacts.py)
+ARTIFACT_INDEX = DATA_DIR / "artifacts.db"
 
-UPLOAD_DIR.mkdir(exist_ok=True)
-OUTPUT_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+JOBS_DIR.mkdir(parents=True, exist_ok=True)
+BATCH_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+REPORT_DIR.mkdir(parents=True, exist_ok=True)
 
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 500 * 1024 * 1024))
+# Uploads are streamed to disk in pieces of this size (bounds memory per request)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
 RETENTION = timedelta(minutes=2)
+# Files still being worked on (an upload waiting for or going through its cleaner, an output being
+# written, everything belonging to an unfinished job) are held this long instead, then get RETENTION
+# from when the work is done. Only matters if a process dies mid-work: it bounds what is left behind.
+HOLD_TTL = timedelta(seconds=int(os.getenv("HOLD_TTL", 6 * 3600)))
+# Resumable uploads (tus-style /uploads, app/utils/resumable.py): largest file accepted, and how long
+# an unfinished upload is kept after its last chunk
+MAX_RESUMABLE_SIZE = int(os.getenv("MAX_RESUMABLE_SIZE", 20 * 1024 * 1024 * 1024))
+UPLOAD_SESSION_TTL = timedelta(seconds=int(os.getenv("UPLOAD_SESSION_TTL", 24 * 3600)))
 
-# Allowed extensions (v2 includes videos)
-ALLOWED_EXTENSIONS = {
-    ".jpg", ".jpeg", ".png", ".gif", ".tif", ".tiff", ".webp", # <-- .webp ADDED HERE
-    ".docx", ".xlsx", ".pdf",
-    ".mp4", ".mov", ".m4v", ".avi", ".mkv", ".webm"
+# Supported formats (and so the allowed extensions) are declared in app/cleaners/registry.py
+
+# ExifTool worker pool (-stay_open). Set EXIFTOOL_POOL=0 to fork one process per call.
+EXIFTOOL_POOL = os.getenv("EXIFTOOL_POOL", "1") == "1"
+EXIFTOOL_POOL_SIZE = int(os.getenv("EXIFTOOL_POOL_SIZE", 2))
+EXIFTOOL_TIMEOUT = float(os.getenv("EXIFTOOL_TIMEOUT", 120))
+
+# Where cleaners run: "auto" (processes for CPU-bound PDFs, threads for the I/O- and subprocess-bound rest),
+# or force "thread" / "process" for every type.
+CLEANER_EXECUTOR = os.getenv("CLEANER_EXECUTOR", "auto")
+CLEANER_WORKERS = int(os.getenv("CLEANER_WORKERS", os.cpu_count() or 4))
+
+# Admission control in front of the cleaners (app/utils/admission.py):
+# concurrent files per cleaner type, e.g. ADMISSION_LIMITS="video=2,pdf=4,office=4,image=8"
+ADMISSION_LIMITS = {
+    kind.strip(): int(n)
+    for kind, _, n in (item.partition("=") for item in os.getenv("ADMISSION_LIMITS", "video=2,pdf=4,office=4,image=8").split(","))
 }
+# Total size of the files being cleaned at once
+ADMISSION_MAX_BYTES = int(os.getenv("ADMISSION_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+# Files up to FAST_LANE_BYTES are admitted smallest first and may use FAST_LANE_SLOTS extra slots
+FAST_LANE_BYTES = int(os.getenv("FAST_LANE_BYTES", 1024 * 1024))
+FAST_LANE_SLOTS = int(os.getenv("FAST_LANE_SLOTS", 4))
+# New requests get 503 + Retry-After while this many files are waiting, or the oldest has waited this
+# many seconds; the files of a request already let in wait for their slots however long it takes
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 100))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", 30))
+
+# Background jobs (POST /jobs): number of files cleaned at once per server process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+
+# Keep embedded ICC colour profiles when stripping images (dropped by default, like ExifTool -all=)
+KEEP_ICC_PROFILE = os.getenv("KEEP_ICC_PROFILE", "0") == "1"
+
+# POST /clean-batch cleans uploads up to this size in memory: nothing is written to UPLOAD_DIR, only
+# the cleaned output (0 disables). Starlette spools multipart files over 1 MiB to a temp file anyway.
+INMEMORY_MAX_BYTES = int(os.getenv("INMEMORY_MAX_BYTES", 1024 * 1024))
+
+# Cleaned-output cache keyed by upload content; CACHE_MAX_BYTES=0 disables it.
+# Entries are dropped RETENTION after they were cleaned, whatever the budget.
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+# Bump whenever a cleaner's output changes so older cache entries stop matching
+CLEANER_VERSION = "1"
+
+# Inspect reports of uploads are cached by content hash for this many seconds (0 disables);
+# never longer than RETENTION, like everything else we keep about an upload
+INSPECT_CACHE_TTL = min(float(os.getenv("INSPECT_CACHE_TTL", 600)), RETENTION.total_seconds())
+INSPECT_CACHE_ENTRIES = int(os.getenv("INSPECT_CACHE_ENTRIES", 512))
+
+# Where cleaned outputs are shared between nodes (app/utils/storage.py): "local" (STORAGE_DIR,
+# default this directory) or "s3" (any S3-compatible store; needs boto3)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_DIR = os.getenv("STORAGE_DIR", "")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None  # e.g. http://minio:9000
+S3_REGION = os.getenv("S3_REGION") or None
+S3_PART_SIZE = int(os.getenv("S3_PART_SIZE", 16 * 1024 * 1024))
 
+# PDF cleaner: "pikepdf" (qpdf, one rewrite), "pypdf" (pure Python + ExifTool), or "auto" (pikepdf if installed)
+PDF_ENGINE = os.getenv("PDF_ENGINE", "auto")
@@ -0,0 +1,230 @@
+# app/utils/admission.py
+"""
+Admission control in front of the cleaners: decides when a file may start.
+- Per-type concurrency limits (ADMISSION_LIMITS), so ten video batches can't
+  take every ffmpeg/ExifTool slot, CPU core and disk at once.
+- A global budget of input bytes in flight (ADMISSION_MAX_BYTES); a single
+  file larger than the budget still runs, alone.
+- Fast lane: files up to FAST_LANE_BYTES are admitted before everything
+  else, smallest first, and may use FAST_LANE_SLOTS extra slots when their
+  type is full, so a 50 KB JPEG never queues behind large TIFFs or videos.
+  The regular lane is first come, first served.
+- Overload is refused, not absorbed, and a request is judged as a whole:
+  admit_request() lets a new request in unless ADMISSION_MAX_QUEUE files are
+  already waiting or the oldest has waited ADMISSION_MAX_WAIT seconds, and
+  raises Overloaded otherwise (503 with a Retry-After estimated from recent
+  clean times). Once in, its files wait for their slots as long as it takes,
+  so a 150-file batch or ten videos on an idle server are never cut short.
+Background jobs skip admit_request(); their queue is already bounded by
+JOB_WORKERS. Queue depth, wait time and rejections are in /metrics.
+"""
+from __future__ import annotations
+import asyncio
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+
+from app.settings import (
+    ADMISSION_LIMITS, ADMISSION_MAX_BYTES, ADMISSION_MAX_QUEUE, ADMISSION_MAX_WAIT,
+    FAST_LANE_BYTES, FAST_LANE_SLOTS,
+)
+from app.utils.metrics import ADMISSION_BYTES, ADMISSION_QUEUE, ADMISSION_REJECTED, ADMISSION_WAIT
+
+_DEFAULT_LIMIT = 2
+_SEQ = itertools.count()
+
+
+class Overloaded(RuntimeError):
+    """No cleaner slot now or soon; try again after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}); retry in {retry_after}s.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class Ticket:
+    priority: tuple
+    cleaner_type: str = field(compare=False)
+    size: int = field(compare=False)
+    fast: bool = field(compare=False)
+    future: Future = field(compare=False, default_factory=Future)
+    queued_at: float = field(compare=False, default_factory=time.monotonic)
+    slot: str | None = field(compare=False, default=None)  # "type" or "fast" once admitted
+    started_at: float = field(compare=False, default=0.0)
+
+
+class AdmissionController:
+    def __init__(self, limits: dict[str, int] = ADMISSION_LIMITS, max_bytes: int = ADMISSION_MAX_BYTES,
+                 fast_bytes: int = FAST_LANE_BYTES, fast_slots: int = FAST_LANE_SLOTS,
+                 max_queue: int = ADMISSION_MAX_QUEUE, max_wait: float = ADMISSION_MAX_WAIT):
+        self.limits = dict(limits)
+        self.max_bytes, self.fast_bytes, self.fast_slots = max_bytes, fast_bytes, fast_slots
+        self.max_queue, self.max_wait = max_queue, max_wait
+        self._lock = threading.Lock()
+        self._waiting: list[Ticket] = []
+        self._running: dict[str, int] = {}
+        self._fast_running = 0
+        self._bytes = 0
+        self._hold: dict[str, float] = {}  # moving average of seconds a slot is held, per type
+
+    def _limit(self, cleaner_type: str) -> int:
+        return self.limits.get(cleaner_type, _DEFAULT_LIMIT)
+
+    def admit_request(self) -> None:
+        """Let a new request in, or raise Overloaded if the files already waiting are more than we can take on."""
+        with self._lock:
+            if len(self._waiting) >= self.max_queue:
+                reason, label = "queue full", "queue_full"
+            elif self._waiting and time.monotonic() - min(t.queued_at for t in self._waiting) > self.max_wait:
+                reason, label = "waited too long", "wait_timeout"
+            else:
+                return
+            retry_after = max((self._retry_after(t.cleaner_type) for t in self._waiting), default=1)
+        ADMISSION_REJECTED.inc(reason=label)
+        raise Overloaded(reason, retry_after)
+
+    def request(self, cleaner_type: str, size: int) -> Ticket:
+        """Queue a file of an admitted request (or a job); ticket.future resolves once it may start."""
+        fast = size <= self.fast_bytes
+        # Fast lane first and smallest first; the regular lane in arrival order
+        priority = (0, size, next(_SEQ)) if fast else (1, 0, next(_SEQ))
+        ticket = Ticket(priority, cleaner_type, size, fast)
+        with self._lock:
+            self._waiting.append(ticket)
+            granted = self._grant()
+        self._notify(granted)
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        with self._lock:
+            self._free(ticket)
+            granted = self._grant()
+        self._notify(granted)
+
+    def cancel(self, ticket: Ticket) -> None:
+        """Give up on a ticket: leave the queue, or free the slot if it was admitted meanwhile."""
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                self._update_gauges()
+                return
+        if ticket.slot is not None:
+            self.release(ticket)
+
+    def _retry_after(self, cleaner_type: str) -> int:
+        # Roughly how long until the files already waiting for this type have been served
+        waiting = sum(t.cleaner_type == cleaner_type for t in self._waiting)
+        estimate = self._hold.get(cleaner_type, 1.0) * (waiting + 1) / max(1, self._limit(cleaner_type))
+        return min(60, max(1, math.ceil(estimate)))
+
+    def _grant(self) -> list[Ticket]:
+        granted = []
+        regular_blocked = False
+        for ticket in sorted(self._waiting):
+            if not ticket.fast and regular_blocked:
+                continue  # keep the regular lane in order: nobody overtakes a file waiting for bytes
+            slot = self._slot_for(ticket)
+            if slot is None:
+                if not ticket.fast and self._bytes + ticket.size > self.max_bytes:
+                    regular_blocked = True
+                continue
+            self._waiting.remove(ticket)
+            ticket.slot, ticket.started_at = slot, time.monotonic()
+            if slot == "fast":
+                self._fast_running += 1
+            else:
+                self._running[ticket.cleaner_type] = self._running.get(ticket.cleaner_type, 0) + 1
+            self._bytes += ticket.size
+            granted.append(ticket)
+        self._update_gauges()
+        return granted
+
+    def _slot_for(self, ticket: Ticket) -> str | None:
+        if self._bytes and self._bytes + ticket.size > self.max_bytes:
+            return None
+        if self._running.get(ticket.cleaner_type, 0) < self._limit(ticket.cleaner_type):
+            return "type"
+        if ticket.fast and self._fast_running < self.fast_slots:
+            return "fast"
+        return None
+
+    def _free(self, ticket: Ticket) -> None:
+        if ticket.slot == "fast":
+            self._fast_running -= 1
+        elif ticket.slot == "type":
+            self._running[ticket.cleaner_type] -= 1
+        else:
+            return
+        ticket.slot = None
+        self._bytes -= ticket.size
+        held = time.monotonic() - ticket.started_at
+        previous = self._hold.get(ticket.cleaner_type)
+        self._hold[ticket.cleaner_type] = held if previous is None else 0.8 * previous + 0.2 * held
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        fast = sum(t.fast for t in self._waiting)
+        ADMISSION_QUEUE.set(fast, lane="fast")
+        ADMISSION_QUEUE.set(len(self._waiting) - fast, lane="regular")
+        ADMISSION_BYTES.set(self._bytes)
+
+    def _notify(self, granted: list[Ticket]) -> None:
+        # Outside the lock: resolving a future runs its callbacks (event loop wake-ups)
+        for ticket in granted:
+            ADMISSION_WAIT.observe(ticket.started_at - ticket.queued_at, lane="fast" if ticket.fast else "regular")
+            try:
+                ticket.future.set_result(None)
+            except InvalidStateError:
+                self.release(ticket)  # the waiter cancelled the future itself
+
+
+_controller: AdmissionController | None = None
+_controller_lock = threading.Lock()
+
+
+def get_controller() -> AdmissionController:
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
+
+
+def admit_request() -> None:
+    """Call once per request, before its files are cleaned: raises Overloaded when the server is saturated."""
+    get_controller().admit_request()
+
+
+@asynccontextmanager
+async def admitted(cleaner_type: str, size: int):
+    """Hold a cleaner slot for the body of the block, waiting for it as long as it takes."""
+    controller = get_controller()
+    ticket = controller.request(cleaner_type, size)
+    try:
+        # shield: a disconnect must not cancel the ticket's future under the controller
+        await asyncio.shield(asyncio.wrap_future(ticket.future))
+    except BaseException:
+        controller.cancel(ticket)
+        raise
+    try:
+        yield
+    finally:
+        controller.release(ticket)
+
+
+@contextmanager
+def admitted_wait(cleaner_type: str, size: int):
+    """Blocking variant for background jobs."""
+    controller = get_controller()
+    ticket = controller.request(cleaner_type, size)
+    try:
+        ticket.future.result()
+        yield
+    finally:
+        controller.cancel(ticket)
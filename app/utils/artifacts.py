@@ -0,0 +1,102 @@
+# app/utils/artifacts.py
+"""
+Expiry index for every file we write (uploads, outputs, job records, cache entries).
+- One SQLite table (path, deadline) in ARTIFACT_INDEX, shared by all server
+  processes: WAL mode plus a busy timeout lets them read and write side by side.
+- register() records a file as it is created; claim_expired() atomically
+  removes and returns the rows past their deadline (DELETE ... RETURNING), so
+  when several workers sweep at once each file is handed to exactly one.
+- hold() keeps files that are still being worked on (HOLD_TTL, a bound for
+  crashed workers only); release() starts their RETENTION when the work ends,
+  so a slow clean or a long queue never loses its files to the sweep.
+Deleting the files themselves is app/utils/cleanup.py's job.
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from app.settings import ARTIFACT_INDEX, HOLD_TTL, RETENTION
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    deadline REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_deadline ON artifacts (deadline);
+"""
+
+_local = threading.local()
+
+def _conn() -> sqlite3.Connection:
+    # One connection per thread; reopened if ARTIFACT_INDEX changes (tests point it elsewhere)
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != ARTIFACT_INDEX:
+        conn = sqlite3.connect(ARTIFACT_INDEX, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout = 30000")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.executescript(_SCHEMA)
+        _local.conn, _local.path = conn, ARTIFACT_INDEX
+    return conn
+
+def _forget_connections_after_fork() -> None:
+    # SQLite connections must not be shared with a forked child
+    global _local
+    _local = threading.local()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_connections_after_fork)
+
+def register(path: Path, ttl: timedelta = RETENTION, *, deadline: float | None = None) -> None:
+    """Record that `path` must be deleted after `ttl` (or at the absolute `deadline`). Re-registering moves it."""
+    if deadline is None:
+        deadline = time.time() + ttl.total_seconds()
+    _conn().execute("INSERT OR REPLACE INTO artifacts (path, deadline) VALUES (?, ?)",
+                    (str(path), deadline))
+
+def hold(*paths: Path) -> None:
+    """Keep files that are in use (queued, being cleaned or written) until release()."""
+    for path in paths:
+        register(path, HOLD_TTL)
+
+def release(*paths: Path) -> None:
+    """Work on these files is done: they expire RETENTION from now."""
+    for path in paths:
+        register(path)
+
+@contextmanager
+def held(*paths: Path):
+    hold(*paths)
+    try:
+        yield
+    finally:
+        release(*paths)
+
+def register_missing(paths: list[tuple[Path, float]]) -> int:
+    """Add (path, deadline) pairs not yet indexed; existing rows keep their deadline. Returns rows added."""
+    conn = _conn()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO artifacts (path, deadline) VALUES (?, ?)",
+                         [(str(p), d) for p, d in paths])
+        return conn.total_changes - before
+
+def claim_expired(now: float | None = None, limit: int = 500) -> list[Path]:
+    """Remove up to `limit` rows whose deadline has passed and return their paths."""
+    now = time.time() if now is None else now
+    rows = _conn().execute(
+        "DELETE FROM artifacts WHERE path IN "
+        "(SELECT path FROM artifacts WHERE deadline <= ? ORDER BY deadline LIMIT ?) RETURNING path",
+        (now, limit),
+    ).fetchall()
+    return [Path(p) for (p,) in rows]
+
+def next_deadline() -> float | None:
+    (deadline,) = _conn().execute("SELECT MIN(deadline) FROM artifacts").fetchone()
+    return deadline
@@ -0,0 +1,173 @@
+# app/utils/cache.py
+"""
+Content-addressed cache of cleaned outputs, so re-uploads skip the cleaners.
+- Key = SHA-256 of the upload (hashed while it streams in) + CLEANER_VERSION
+  + cleaner options (KEEP_ICC_PROFILE, the PDF engine for PDFs) + extension:
+  a cleaner change never serves stale output.
+- A hit hardlinks the cached file to the new output name (or copies it if the
+  filesystem can't link); ExifTool, ffmpeg and pypdf are not touched.
+- CACHE_MAX_BYTES bounds the cache; least recently used entries go first.
+- An entry lives at most RETENTION from when it was cleaned: it is registered
+  in the artifact index with that deadline, and hits never extend it.
+Each server process keeps its own LRU index, built from CACHE_DIR on first use.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from app.settings import CACHE_DIR, CACHE_MAX_BYTES, CLEANER_VERSION, KEEP_ICC_PROFILE, RETENTION
+from app.cleaners.registry import pdf_engine_name
+from app.utils.artifacts import register
+from app.utils import metrics
+
+_ENTRY_NAME = re.compile(r"([0-9a-f]{64})-(\d+)")
+
+_lock = threading.Lock()
+_entries: OrderedDict[str, tuple[Path, int, int]] | None = None  # key -> (path, size, created); LRU first
+_bytes = 0
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+def enabled() -> bool:
+    return CACHE_MAX_BYTES > 0
+
+def cache_key(digest: str, ext: str) -> str:
+    """Cache key for an upload with SHA-256 `digest`, cleaned as `ext` with the current settings."""
+    options = f"icc={int(KEEP_ICC_PROFILE)}"
+    if ext.lower() == ".pdf":
+        # pikepdf and pypdf write different files from the same upload
+        options += f",pdf={pdf_engine_name()}"
+    material = f"{CLEANER_VERSION}|{options}|{ext.lower()}|{digest}"
+    return hashlib.sha256(material.encode("ascii")).hexdigest()
+
+def _expired(created: int, now: float) -> bool:
+    return now - created >= RETENTION.total_seconds()
+
+def _index() -> OrderedDict:
+    # Caller holds _lock
+    global _entries, _bytes
+    if _entries is None:
+        found = []
+        for p in CACHE_DIR.glob("*"):
+            m = _ENTRY_NAME.fullmatch(p.name)
+            if m:
+                try:
+                    found.append((int(m.group(2)), m.group(1), p, p.stat().st_size))
+                except FileNotFoundError:
+                    pass
+        _entries = OrderedDict((key, (p, size, created)) for created, key, p, size in sorted(found))
+        _bytes = sum(size for _, size, _ in _entries.values())
+    return _entries
+
+def _drop(key: str) -> None:
+    # Caller holds _lock
+    global _bytes
+    path, size, _ = _index().pop(key)
+    _bytes -= size
+    path.unlink(missing_ok=True)
+
+def _link(src: Path, dst: Path) -> None:
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def fetch(key: str, dst: Path) -> bool:
+    """Put the cached output for `key` at dst. False (and dst untouched) on a miss."""
+    if not enabled():
+        return False
+    with _lock:
+        entry = _index().get(key)
+        if entry is not None and _expired(entry[2], time.time()):
+            _drop(key)
+            _stats["expired"] += 1
+            entry = None
+        if entry is None:
+            _stats["misses"] += 1
+            return False
+        _index().move_to_end(key)
+    try:
+        _link(entry[0], dst)
+    except FileNotFoundError:
+        # Removed behind our back (another process's eviction or sweep)
+        with _lock:
+            if key in _index():
+                _drop(key)
+            _stats["misses"] += 1
+        return False
+    with _lock:
+        _stats["hits"] += 1
+    return True
+
+def store(key: str, output: Path) -> None:
+    """Remember a freshly cleaned output under `key`, evicting LRU entries over budget."""
+    global _bytes
+    if not enabled():
+        return
+    try:
+        size = output.stat().st_size
+    except FileNotFoundError:
+        return
+    if size > CACHE_MAX_BYTES:
+        return
+    created = int(time.time())
+    path = CACHE_DIR / f"{key}-{created}"
+    tmp = CACHE_DIR / f".{key}.{uuid.uuid4().hex}.tmp"
+    with _lock:
+        if key in _index():
+            return
+    try:
+        _link(output, tmp)
+        register(path, deadline=created + RETENTION.total_seconds())
+        os.replace(tmp, path)
+    except OSError as e:
+        tmp.unlink(missing_ok=True)
+        print(f"Cache store failed for {output.name}: {e}") # Log error
+        return
+    with _lock:
+        entries = _index()
+        if key in entries:
+            # Another thread stored the same content meanwhile; keep theirs
+            if entries[key][0] != path:
+                path.unlink(missing_ok=True)
+            return
+        entries[key] = (path, size, created)
+        _bytes += size
+        _stats["stores"] += 1
+        while _bytes > CACHE_MAX_BYTES and entries:
+            _drop(next(iter(entries)))
+            _stats["evictions"] += 1
+
+def sweep() -> None:
+    """Forget entries older than RETENTION (the cleanup scheduler deletes the files themselves)."""
+    now = time.time()
+    with _lock:
+        entries = _index()
+        for key in [k for k, (_, _, created) in entries.items() if _expired(created, now)]:
+            _drop(key)
+            _stats["expired"] += 1
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "entries": len(_index()), "bytes": _bytes}
+
+def _metrics_lines() -> list[str]:
+    s = stats()
+    lines = ["# HELP scrubber_cache_events_total Output cache lookups and maintenance by event.",
+             "# TYPE scrubber_cache_events_total counter"]
+    lines += [f'scrubber_cache_events_total{{event="{k}"}} {s[k]}'
+              for k in ("hits", "misses", "stores", "evictions", "expired")]
+    lines += ["# HELP scrubber_cache_entries Entries in the output cache.", "# TYPE scrubber_cache_entries gauge",
+              f"scrubber_cache_entries {s['entries']}",
+              "# HELP scrubber_cache_bytes Bytes held by the output cache.", "# TYPE scrubber_cache_bytes gauge",
+              f"scrubber_cache_bytes {s['bytes']}"]
+    return lines
+
+metrics.add_collector(_metrics_lines)
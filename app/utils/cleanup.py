@@ -1,43 +1,87 @@
 # app/utils/cleanup.py
 """
-Periodic cleanup of old files in UPLOAD_DIR and OUTPUT_DIR.
-We scan on every upload, and also schedule a periodic task.
+Deadline-driven deletion of the files we write (uploads, outputs, job records,
+cache entries).
+- Writers register each file with its expiry in the artifact index
+  (app/utils/artifacts.py), so a sweep only touches rows whose deadline has
+  passed instead of listing and stat-ing whole directories.
+- A background thread sleeps until the next deadline (at most interval_seconds)
+  and deletes what expired. Every server process runs one; the shared index
+  hands each expired file to exactly one of them.
+- On startup the directories are scanned once so files the index doesn't know
+  (left from before a restart or a crashed write) expire at mtime + RETENTION.
+- Outputs published to a shared storage backend are deleted there too.
 """
 
-from datetime import datetime
 from pathlib import Path
-from app.settings import UPLOAD_DIR, OUTPUT_DIR, RETENTION
-import os
+from app.settings import UPLOAD_DIR, OUTPUT_DIR, JOBS_DIR, CACHE_DIR, BATCH_DIR, REPORT_DIR, RETENTION
+from app.utils.artifacts import claim_expired, next_deadline, register_missing
+from app.utils import cache
+from app.utils.storage import digest_path, get_storage, key_for
+from app.utils.metrics import STAGE_SECONDS
 import time
 import threading
 
-def _is_old(path: Path) -> bool:
-    try:
-        mtime = datetime.fromtimestamp(path.stat().st_mtime)
-        return (datetime.now() - mtime) > RETENTION
-    except FileNotFoundError:
-        return False
+_CLAIM_BATCH = 500
+_MIN_SLEEP = 1.0
 
-def cleanup_once() -> None:
-    for root in (UPLOAD_DIR, OUTPUT_DIR):
+def reconcile() -> int:
+    """Index every file in our directories that has no deadline yet. Returns files added."""
+    found = []
+    for root in (UPLOAD_DIR, OUTPUT_DIR, JOBS_DIR, CACHE_DIR, BATCH_DIR, REPORT_DIR):
         for p in root.glob("*"):
             try:
-                if p.is_file() and _is_old(p):
-                    p.unlink(missing_ok=True)
+                if p.is_file():
+                    found.append((p, p.stat().st_mtime + RETENTION.total_seconds()))
+            except FileNotFoundError:
+                pass
+    return register_missing(found)
+
+def cleanup_once() -> int:
+    """Delete every indexed file past its deadline. Returns the number of files handled."""
+    with STAGE_SECONDS.time(stage="cleanup"):
+        return _cleanup_expired()
+
+def _cleanup_expired() -> int:
+    removed = 0
+    storage = get_storage()
+    while True:
+        expired = claim_expired(limit=_CLAIM_BATCH)
+        for p in expired:
+            try:
+                p.unlink(missing_ok=True)
+                if key_for(p):
+                    digest_path(p).unlink(missing_ok=True)
+                    storage.unpublish(p)
             except Exception:
                 # We intentionally swallow cleanup errors to avoid impacting user flow.
                 pass
+        removed += len(expired)
+        if len(expired) < _CLAIM_BATCH:
+            break
+    cache.sweep()
+    return removed
 
 def start_background_cleanup(interval_seconds: int = 120) -> None:
     """
-    Starts a background thread that periodically cleans old files.
+    Starts a background thread that deletes files as their deadlines pass.
     This is lightweight and fine for an MVP. For production,
     use a proper scheduler (e.g., Celery beat, APScheduler, or cron).
     """
     def _loop():
+        try:
+            reconcile()
+        except Exception as e:
+            print(f"Cleanup reconcile failed: {e}") # Log error
         while True:
-            cleanup_once()
-            time.sleep(interval_seconds)
+            deadline = None
+            try:
+                cleanup_once()
+                deadline = next_deadline()
+            except Exception as e:
+                print(f"Cleanup pass failed: {e}") # Log error
+            delay = interval_seconds if deadline is None else deadline - time.time()
+            time.sleep(min(interval_seconds, max(delay, _MIN_SLEEP)))
 
     t = threading.Thread(target=_loop, name="cleanup-thread", daemon=True)
     t.start()
@@ -0,0 +1,134 @@
+# app/utils/executor.py
+"""
+Runs cleaners off the event loop so one large file can't stall the worker.
+- I/O- and subprocess-bound cleaners (image, video, office) go to a thread
+  pool: the native strippers only copy bytes, the rest happens inside
+  ffmpeg/exiftool, and threads share the one bounded ExifTool pool (a
+  process-pool child would start its own) without pickling uploads.
+- The CPU-bound cleaner (pdf, parsing and rewriting in Python) goes to a
+  process pool so it doesn't serialize on the GIL.
+CLEANER_EXECUTOR=auto|thread|process picks the strategy (auto = per type as
+above); CLEANER_WORKERS bounds the size of each pool.
+Process-pool workers capture their metric updates and send them back with
+the result, so /metrics covers stages that ran in a child process.
+submit_clean_bytes() is the in-memory variant (small uploads): bytes in, the
+cleaned bytes as the future's result, on the same pools.
+The cleaner for a file comes from the format registry (by extension), which
+imports its module on first use.
+"""
+from __future__ import annotations
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from app.settings import CLEANER_EXECUTOR, CLEANER_WORKERS
+from app.utils import metrics
+from app.utils.metrics import BYTES_OUT, CLEAN_SECONDS, CLEANS, INFLIGHT
+from app.cleaners import registry
+
+_CPU_BOUND = {"pdf"}
+
+_threads: ThreadPoolExecutor | None = None
+_processes: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+
+def _thread_pool() -> ThreadPoolExecutor:
+    global _threads
+    with _lock:
+        if _threads is None:
+            _threads = ThreadPoolExecutor(max_workers=CLEANER_WORKERS, thread_name_prefix="cleaner")
+        return _threads
+
+def _process_pool() -> ProcessPoolExecutor:
+    global _processes
+    with _lock:
+        if _processes is None:
+            # spawn: children must not inherit the server's threads or ExifTool pipes
+            _processes = ProcessPoolExecutor(max_workers=CLEANER_WORKERS,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return _processes
+
+def _executor_for(cleaner_type: str) -> Executor:
+    if CLEANER_EXECUTOR == "process":
+        return _process_pool()
+    if CLEANER_EXECUTOR == "auto" and cleaner_type in _CPU_BOUND:
+        return _process_pool()
+    return _thread_pool()
+
+def _call_captured(cleaner: Callable, *args) -> tuple[list, object, BaseException | None]:
+    # Runs in a process-pool worker: hand the metric events back along with the outcome
+    events: list = []
+    with metrics.capture(events):
+        try:
+            result = cleaner(*args)
+        except Exception as e:
+            return events, None, e
+    return events, result, None
+
+def _submit(cleaner_type: str, cleaner: Callable, args: tuple, output_size: Callable[[object], int]) -> Future:
+    executor = _executor_for(cleaner_type)
+    captured = isinstance(executor, ProcessPoolExecutor)
+    started = time.perf_counter()
+    INFLIGHT.inc(kind="cleans")
+    inner = executor.submit(_call_captured, cleaner, *args) if captured else executor.submit(cleaner, *args)
+    outer: Future = Future()
+
+    def _finish(f: Future) -> None:
+        INFLIGHT.dec(kind="cleans")
+        CLEAN_SECONDS.observe(time.perf_counter() - started, cleaner=cleaner_type)
+        try:
+            if captured:
+                events, result, error = f.result()
+                metrics.replay(events)
+                if error is not None:
+                    raise error
+            else:
+                result = f.result()
+            size = output_size(result)
+        except BaseException as e:
+            CLEANS.inc(cleaner=cleaner_type, outcome="failed")
+            outer.set_exception(e)
+            return
+        CLEANS.inc(cleaner=cleaner_type, outcome="ok")
+        BYTES_OUT.inc(size)
+        outer.set_result(result)
+
+    inner.add_done_callback(_finish)
+    return outer
+
+def _format(cleaner_type: str, ext: str) -> registry.Format:
+    fmt = registry.format_for(ext)
+    if fmt is None or fmt.kind != cleaner_type:
+        raise ValueError(f"No {cleaner_type!r} cleaner for {ext!r} files")
+    return fmt
+
+def submit_clean(cleaner_type: str, src: Path, dst: Path) -> Future:
+    """Schedule one cleaner call; the returned future raises whatever the cleaner raised."""
+    cleaner = _format(cleaner_type, dst.suffix).load_cleaner()
+    return _submit(cleaner_type, cleaner, (src, dst), lambda _: dst.stat().st_size)
+
+def submit_clean_bytes(cleaner_type: str, data: bytes, ext: str) -> Future:
+    """Schedule an in-memory clean; the returned future's result is the cleaned file."""
+    cleaner = _format(cleaner_type, ext).load_memory_cleaner()
+    if cleaner is None:
+        raise ValueError(f"No in-memory cleaner for {ext!r} files")
+    return _submit(cleaner_type, cleaner, (data, ext), len)
+
+async def run_clean(cleaner_type: str, src: Path, dst: Path) -> None:
+    await asyncio.wrap_future(submit_clean(cleaner_type, src, dst))
+
+async def run_clean_bytes(cleaner_type: str, data: bytes, ext: str) -> bytes:
+    return await asyncio.wrap_future(submit_clean_bytes(cleaner_type, data, ext))
+
+def shutdown_executors() -> None:
+    global _threads, _processes
+    with _lock:
+        threads, processes = _threads, _processes
+        _threads = _processes = None
+    for ex in (threads, processes):
+        if ex is not None:
+            ex.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,264 @@
+# app/utils/exiftool.py
+"""
+Shared pool of long-lived `exiftool -stay_open True -@ -` workers.
+
+Starting Perl + ExifTool costs far more than stripping a small image, so the
+cleaners and inspect endpoints hand their arguments to a resident process:
+- bounded: at most EXIFTOOL_POOL_SIZE workers; callers block until one is free
+- framing: each request is one argument per line, closed by -execute{N}; the
+  reply ends with {readyN} on stdout and "=<status>=post{N}" on stderr
+- health: dead workers are replaced on checkout, long-idle ones are pinged
+  with -ver, and a worker that misses EXIFTOOL_TIMEOUT is killed
+Set EXIFTOOL_POOL=0 to go back to one `exiftool` process per call.
+pipe_exiftool() is the exception: it streams a file through stdin/stdout, which
+a pooled worker can't do (its stdin carries the argument stream).
+"""
+from __future__ import annotations
+import itertools
+import os
+import subprocess
+import threading
+import time
+
+from app.settings import EXIFTOOL_POOL, EXIFTOOL_POOL_SIZE, EXIFTOOL_TIMEOUT
+from app.utils.metrics import STAGE_SECONDS, SUBPROCESS_SPAWNS, SUBPROCESS_FAILURES
+
+_IDLE_PING_SECONDS = 30.0
+_MAX_REQUESTS_PER_WORKER = 1000
+_SEQ = itertools.count(1)
+
+
+class ExifToolError(RuntimeError):
+    """The worker process died or stopped answering."""
+
+
+class _PipeReader:
+    """Drains a pipe on a daemon thread so reads can honour a deadline."""
+
+    def __init__(self, pipe):
+        self._buf = bytearray()
+        self._eof = False
+        self._cond = threading.Condition()
+        threading.Thread(target=self._pump, args=(pipe,), daemon=True).start()
+
+    def _pump(self, pipe) -> None:
+        while True:
+            try:
+                chunk = pipe.read(65536)
+            except (OSError, ValueError):
+                chunk = b""
+            with self._cond:
+                if not chunk:
+                    self._eof = True
+                    self._cond.notify_all()
+                    return
+                self._buf += chunk
+                self._cond.notify_all()
+
+    def read_until(self, marker: bytes, deadline: float) -> bytes:
+        with self._cond:
+            while True:
+                idx = self._buf.find(marker)
+                if idx != -1:
+                    end = idx + len(marker)
+                    # Swallow the line break that follows the marker
+                    if self._buf[end:end + 2] == b"\r\n":
+                        end += 2
+                    elif self._buf[end:end + 1] == b"\n":
+                        end += 1
+                    out = bytes(self._buf[:idx])
+                    del self._buf[:end]
+                    return out
+                if self._eof:
+                    raise ExifToolError("exiftool exited unexpectedly")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("exiftool did not answer in time")
+                self._cond.wait(remaining)
+
+
+class _Worker:
+    def __init__(self):
+        SUBPROCESS_SPAWNS.inc(tool="exiftool")
+        self.proc = subprocess.Popen(
+            ["exiftool", "-stay_open", "True", "-@", "-"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+        self._stdout = _PipeReader(self.proc.stdout)
+        self._stderr = _PipeReader(self.proc.stderr)
+        self.requests = 0
+        self.last_used = time.monotonic()
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def execute(self, args: list[str], timeout: float) -> tuple[int, bytes, bytes]:
+        n = next(_SEQ)
+        lines = [*args, "-echo4", f"=${{status}}=post{n}", f"-execute{n}", ""]
+        try:
+            self.proc.stdin.write("\n".join(lines).encode("utf-8"))
+        except (BrokenPipeError, OSError) as e:
+            raise ExifToolError(f"exiftool worker is gone: {e}") from e
+
+        deadline = time.monotonic() + timeout
+        out = self._stdout.read_until(b"{ready%d}" % n, deadline)
+        err = self._stderr.read_until(b"=post%d" % n, deadline)
+        err, _, status = err.rpartition(b"=")
+        status = status.strip()
+        if status.isdigit():
+            code = int(status)
+        else:
+            # ExifTool < 12.10 does not expand ${status}; infer it from stderr
+            code = 1 if b"Error" in err else 0
+        self.requests += 1
+        self.last_used = time.monotonic()
+        return code, out, err
+
+    def close(self) -> None:
+        try:
+            self.proc.stdin.write(b"-stay_open\nFalse\n")
+            self.proc.stdin.close()
+            self.proc.wait(timeout=2)
+        except Exception:
+            self.kill()
+
+    def kill(self) -> None:
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=2)
+        except Exception:
+            pass
+
+
+class ExifToolPool:
+    def __init__(self, size: int = EXIFTOOL_POOL_SIZE, timeout: float = EXIFTOOL_TIMEOUT):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle: list[_Worker] = []
+        self._lock = threading.Lock()
+
+    def _healthy(self, worker: _Worker) -> bool:
+        if not worker.alive() or worker.requests >= _MAX_REQUESTS_PER_WORKER:
+            return False
+        if time.monotonic() - worker.last_used > _IDLE_PING_SECONDS:
+            try:
+                code, _, _ = worker.execute(["-ver"], timeout=5)
+                return code == 0
+            except (ExifToolError, TimeoutError):
+                return False
+        return True
+
+    def _checkout(self) -> _Worker:
+        while True:
+            with self._lock:
+                worker = self._idle.pop() if self._idle else None
+            if worker is None:
+                return _Worker()
+            if self._healthy(worker):
+                return worker
+            if worker.alive():
+                worker.close()
+            else:
+                worker.kill()
+
+    def run(self, args: list[str], *, check: bool = True,
+            timeout: float | None = None) -> subprocess.CompletedProcess:
+        """Run one ExifTool command on a pooled worker (same contract as subprocess.run)."""
+        for a in args:
+            if "\n" in a or "\r" in a:
+                raise ValueError(f"exiftool argument contains a line break: {a!r}")
+        timeout = timeout or self.timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("no exiftool worker became free in time")
+        try:
+            worker = self._checkout()
+            try:
+                code, out, err = worker.execute(args, timeout)
+            except BaseException:
+                # Crashed, hung or interrupted: never hand this process out again
+                worker.kill()
+                raise
+            with self._lock:
+                self._idle.append(worker)
+        finally:
+            self._slots.release()
+
+        if check and code != 0:
+            raise subprocess.CalledProcessError(code, ["exiftool", *args], out, err)
+        return subprocess.CompletedProcess(["exiftool", *args], code, out, err)
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for w in workers:
+            w.close()
+
+
+_pool: ExifToolPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ExifToolPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExifToolPool()
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def _forget_pool_after_fork() -> None:
+    # A forked child must not talk to the parent's workers
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pool_after_fork)
+
+
+def run_exiftool(args: list[str], *, check: bool = True) -> subprocess.CompletedProcess:
+    """
+    Run `exiftool <args>` and return the CompletedProcess (stdout/stderr as bytes).
+    Raises FileNotFoundError if exiftool is not installed and CalledProcessError
+    on a non-zero status when check=True, just like subprocess.run.
+    """
+    with STAGE_SECONDS.time(stage="exiftool"):
+        try:
+            if not EXIFTOOL_POOL:
+                SUBPROCESS_SPAWNS.inc(tool="exiftool")
+                return subprocess.run(["exiftool", *args], check=check, capture_output=True,
+                                      timeout=EXIFTOOL_TIMEOUT)
+            return get_pool().run(args, check=check)
+        except (subprocess.SubprocessError, ExifToolError, TimeoutError, FileNotFoundError):
+            SUBPROCESS_FAILURES.inc(tool="exiftool")
+            raise
+
+
+def pipe_exiftool(args: list[str], data: bytes) -> bytes:
+    """
+    Run `exiftool <args> -o - -` on a file held in memory: data goes in on stdin,
+    the rewritten file comes back from stdout. Always a one-shot process.
+    Raises like run_exiftool(check=True).
+    """
+    with STAGE_SECONDS.time(stage="exiftool"):
+        SUBPROCESS_SPAWNS.inc(tool="exiftool")
+        try:
+            proc = subprocess.run(["exiftool", *args, "-o", "-", "-"], input=data, check=True,
+                                  capture_output=True, timeout=EXIFTOOL_TIMEOUT)
+        except (subprocess.SubprocessError, FileNotFoundError):
+            SUBPROCESS_FAILURES.inc(tool="exiftool")
+            raise
+    return proc.stdout
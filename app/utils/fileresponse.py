@@ -0,0 +1,279 @@
+# app/utils/fileresponse.py
+"""
+File downloads with HTTP range and conditional request support.
+- Strong ETag from inode, mtime and size: outputs are written once (temp file
+  + rename), and a cache hardlink shares its entry's inode, so equal tags
+  mean equal bytes. Callers can pass their own (/download uses the SHA-256
+  recorded at publish time, see app/utils/storage.py).
+- If-None-Match / If-Modified-Since answer 304; Range serves 206 with one
+  range or multipart/byteranges for several (overlapping ones are merged);
+  If-Range falls back to the full file when the validator no longer matches;
+  unsatisfiable ranges get 416.
+- The body never passes through Python buffers when the server offers the
+  ASGI zero-copy extensions: `http.response.zerocopysend` (sendfile on our
+  open file, any range) or `http.response.pathsend` (whole file). Otherwise the
+  file is read in CHUNK_SIZE pieces with os.pread off the event loop. uvicorn
+  offers neither, so under it every download takes the pread path; an app
+  cannot call os.sendfile itself, as the server owns the socket and its framing.
+- RangeStorageResponse serves an object from the storage backend instead
+  (another node's output): the same headers, bodies from ranged reads.
+"""
+from __future__ import annotations
+import mimetypes
+import os
+import secrets
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Callable
+from urllib.parse import quote
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.utils.signature import type_for_extension
+
+CHUNK_SIZE = 1024 * 1024
+_MAX_RANGES = 16  # more parts than this is not a seek, it's abuse: serve the whole file instead
+
+def content_type_for(name: str) -> str:
+    ftype = type_for_extension(Path(name).suffix.lower())
+    if ftype is not None:
+        return ftype.mime
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    return f'attachment; filename="{filename}"' if quoted == filename else f"attachment; filename*=utf-8''{quoted}"
+
+def etag_for(st: os.stat_result) -> str:
+    return f'"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+def parse_range(header: str, size: int) -> list[tuple[int, int]] | None:
+    """
+    Inclusive (start, end) byte ranges from a Range header, sorted and merged.
+    None means ignore the header (malformed, not bytes, too many parts);
+    an empty list means nothing in it is satisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+    parts = [p.strip() for p in spec.split(",") if p.strip()]
+    if not parts or len(parts) > _MAX_RANGES:
+        return None
+    ranges = []
+    for part in parts:
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if not first.strip():
+                # Suffix range: the last N bytes
+                n = int(last)
+                if n < 0:
+                    return None
+                if n == 0 or size == 0:
+                    continue
+                start, end = max(size - n, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last.strip() else size - 1
+                if start < 0 or (last.strip() and end < start):
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, end))
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _same_etag(header: str, etag: str, weak: bool) -> bool:
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    if weak:
+        # If-None-Match uses the weak comparison
+        tags = [t[2:] if t.startswith("W/") else t for t in tags]
+    return etag in tags
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+class _RangeResponse(Response):
+    """Attachment download with ranges and validators; subclasses say where the bytes come from."""
+
+    def __init__(self, filename: str, media_type: str | None = None) -> None:
+        self.filename = filename
+        self.media_type = media_type or content_type_for(filename)
+        self.background = None
+        self.status_code = 200
+        self.init_headers({})
+        self.headers["content-disposition"] = content_disposition(filename)
+        self.headers["accept-ranges"] = "bytes"
+
+    async def _send_range(self, scope: Scope, send: Send, offset: int, count: int, more_body: bool) -> None:
+        raise NotImplementedError
+
+    async def _send_whole(self, scope: Scope, send: Send, size: int) -> None:
+        await self._send_range(scope, send, 0, size, more_body=False)
+
+    async def _respond(self, scope: Scope, send: Send, size: int, mtime: float, etag: str) -> None:
+        request = Headers(scope=scope)
+        self.headers["etag"] = etag
+        self.headers["last-modified"] = formatdate(mtime, usegmt=True)
+        head = scope["method"].upper() == "HEAD"
+
+        if "if-none-match" in request:
+            fresh = _same_etag(request["if-none-match"], etag, weak=True)
+        else:
+            fresh = "if-modified-since" in request and _not_modified_since(request["if-modified-since"], mtime)
+        if fresh:
+            await self._start(send, 304, {})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        ranges = None
+        if "range" in request and scope["method"].upper() in ("GET", "HEAD"):
+            if_range = request.get("if-range")
+            if if_range is None or self._if_range_matches(if_range, etag, mtime):
+                ranges = parse_range(request["range"], size)
+
+        if ranges is None:
+            await self._start(send, 200, {"content-type": self.media_type, "content-length": str(size)})
+            if head:
+                await send({"type": "http.response.body", "body": b""})
+            else:
+                await self._send_whole(scope, send, size)
+            return
+
+        if not ranges:
+            await self._start(send, 416, {"content-range": f"bytes */{size}", "content-length": "0"})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            await self._start(send, 206, {"content-type": self.media_type,
+                                          "content-range": f"bytes {start}-{end}/{size}",
+                                          "content-length": str(end - start + 1)})
+            if head:
+                await send({"type": "http.response.body", "body": b""})
+            else:
+                await self._send_range(scope, send, start, end - start + 1, more_body=False)
+            return
+
+        boundary = secrets.token_hex(16)
+        heads = [(f"--{boundary}\r\nContent-Type: {self.media_type}\r\n"
+                  f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode("latin-1")
+                 for start, end in ranges]
+        tail = f"\r\n--{boundary}--\r\n".encode("latin-1")
+        length = sum(len(h) for h in heads) + sum(e - s + 1 for s, e in ranges) + 2 * (len(ranges) - 1) + len(tail)
+        await self._start(send, 206, {"content-type": f"multipart/byteranges; boundary={boundary}",
+                                      "content-length": str(length)})
+        if head:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        for i, ((start, end), part_head) in enumerate(zip(ranges, heads)):
+            # Every part after the first starts on a new line (the CRLF before its boundary)
+            await send({"type": "http.response.body", "body": (b"\r\n" if i else b"") + part_head, "more_body": True})
+            await self._send_range(scope, send, start, end - start + 1, more_body=True)
+        await send({"type": "http.response.body", "body": tail})
+
+    @staticmethod
+    def _if_range_matches(if_range: str, etag: str, mtime: float) -> bool:
+        if_range = if_range.strip()
+        if if_range.startswith(('"', "W/")):
+            return if_range == etag  # strong comparison only
+        try:
+            return int(mtime) == parsedate_to_datetime(if_range).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    async def _start(self, send: Send, status: int, extra: dict[str, str]) -> None:
+        headers = {k: v for k, v in self.headers.items() if k not in ("content-length", "content-type")}
+        if status == 304:
+            headers.pop("content-disposition", None)
+        headers.update(extra)
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]})
+
+class RangeFileResponse(_RangeResponse):
+    """
+    Like FileResponse (attachment download of `path`), plus ranges, validators and zero-copy sends.
+    etag_of computes the ETag from the open file's stat (default etag_for).
+    """
+
+    def __init__(self, path: str | os.PathLike[str], filename: str, media_type: str | None = None,
+                 etag_of: Callable[[os.stat_result], str] = etag_for) -> None:
+        super().__init__(filename, media_type)
+        self.path = Path(path)
+        self.etag_of = etag_of
+        self._file = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            file = await anyio.to_thread.run_sync(open, self.path, "rb", 0)
+        except FileNotFoundError:
+            raise RuntimeError(f"File at path {self.path} does not exist.")
+        with file:
+            st = os.fstat(file.fileno())
+            if not stat.S_ISREG(st.st_mode):
+                raise RuntimeError(f"File at path {self.path} is not a file.")
+            self._file = file
+            etag = await anyio.to_thread.run_sync(self.etag_of, st)
+            await self._respond(scope, send, st.st_size, st.st_mtime, etag)
+
+    async def _send_whole(self, scope: Scope, send: Send, size: int) -> None:
+        if "http.response.pathsend" in scope.get("extensions", {}):
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        else:
+            await self._send_range(scope, send, 0, size, more_body=False)
+
+    async def _send_range(self, scope: Scope, send: Send, offset: int, count: int, more_body: bool) -> None:
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            await send({"type": "http.response.zerocopysend", "file": self._file, "offset": offset, "count": count,
+                        "more_body": more_body})
+            return
+        end = offset + count
+        while True:
+            n = min(CHUNK_SIZE, end - offset)
+            chunk = await anyio.to_thread.run_sync(os.pread, self._file.fileno(), n, offset) if n > 0 else b""
+            offset += len(chunk)
+            last = offset >= end or not chunk
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body or not last})
+            if last:
+                return
+
+class RangeStorageResponse(_RangeResponse):
+    """The same for an object in the storage backend (a file another node published): ranged reads, proxied."""
+
+    def __init__(self, storage, key: str, info, filename: str, media_type: str | None = None) -> None:
+        super().__init__(filename, media_type)
+        self.storage, self.key, self.info = storage, key, info
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self._respond(scope, send, self.info.size, self.info.mtime, self.info.etag)
+
+    async def _send_range(self, scope: Scope, send: Send, offset: int, count: int, more_body: bool) -> None:
+        src = await anyio.to_thread.run_sync(self.storage.open, self.key, offset, count)
+        try:
+            while True:
+                chunk = await anyio.to_thread.run_sync(src.read, CHUNK_SIZE) if count > 0 else b""
+                count -= len(chunk)
+                last = count <= 0 or not chunk
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body or not last})
+                if last:
+                    return
+        finally:
+            src.close()
@@ -0,0 +1,184 @@
+# app/utils/metrics.py
+"""
+In-process metrics, rendered in the Prometheus text format at GET /metrics.
+
+- Counter, Gauge and Histogram with fixed label names; an update is a dict
+  lookup plus a locked add (a bisect for histograms), so instrumenting the
+  hot path costs well under a microsecond.
+- Collectors registered with add_collector() run at scrape time only, for
+  values that are expensive to keep live (directory sizes, cache stats).
+- Cleaners in the process pool record into a capture() list instead; the
+  executor ships those events back and replay()s them here, so per-stage
+  timings from child processes are not lost.
+Each server process exposes its own numbers; Prometheus sums the instances.
+"""
+from __future__ import annotations
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_metrics: dict[str, "_Metric"] = {}
+_collectors: list[Callable[[], Iterable[str]]] = []
+_capture: list | None = None  # set in process-pool workers while a cleaner runs
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(pairs: Iterable[tuple[str, str]]) -> str:
+    body = ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs)
+    return "{" + body + "}" if body else ""
+
+def _fmt_value(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+        _metrics[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels[n] for n in self.labelnames)
+
+    def _record(self, op: str, value: float, labels: dict) -> bool:
+        # True if the event was captured for the parent process instead of applied here
+        if _capture is not None:
+            _capture.append((self.name, op, value, labels))
+            return True
+        return False
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if self._record("inc", amount, labels):
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(zip(self.labelnames, k))} {_fmt_value(v)}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        if self._record("set", value, labels):
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=_DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        if self._record("observe", value, labels):
+            return
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            pairs = list(zip(self.labelnames, key))
+            running = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                running += n
+                lines.append(f"{self.name}_bucket{_fmt_labels(pairs + [('le', _fmt_value(bound))])} {running}")
+            lines.append(f"{self.name}_sum{_fmt_labels(pairs)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(pairs)} {running}")
+        return lines
+
+def add_collector(fn: Callable[[], Iterable[str]]) -> None:
+    """fn yields complete exposition lines (HELP/TYPE included); called on every scrape."""
+    _collectors.append(fn)
+
+def render() -> str:
+    lines = []
+    for metric in list(_metrics.values()):
+        lines += metric.render()
+    for fn in list(_collectors):
+        try:
+            lines += list(fn())
+        except Exception as e:
+            print(f"Metrics collector failed: {e}") # Log error
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def capture(events: list):
+    """Record metric updates into `events` instead of applying them (process-pool workers)."""
+    global _capture
+    previous, _capture = _capture, events
+    try:
+        yield events
+    finally:
+        _capture = previous
+
+def replay(events: list) -> None:
+    """Apply events captured in another process."""
+    for name, op, value, labels in events:
+        metric = _metrics.get(name)
+        if metric is not None:
+            getattr(metric, op)(value, **labels)
+
+# --- The metrics the app records ---
+STAGE_SECONDS = Histogram("scrubber_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+CLEAN_SECONDS = Histogram("scrubber_clean_seconds",
+                          "Time per file from hand-off to the cleaner executor to completion (includes queueing).",
+                          ("cleaner",))
+CLEANS = Counter("scrubber_cleans_total", "Files processed by cleaner type and outcome (ok, failed, cached).",
+                 ("cleaner", "outcome"))
+BYTES_IN = Counter("scrubber_upload_bytes_total", "Bytes received in uploads.")
+BYTES_OUT = Counter("scrubber_output_bytes_total", "Bytes of cleaned output produced (cleaned or from cache).")
+SUBPROCESS_SPAWNS = Counter("scrubber_subprocess_spawns_total", "External processes started.", ("tool",))
+SUBPROCESS_FAILURES = Counter("scrubber_subprocess_failures_total",
+                              "External tool calls that failed, timed out or crashed.", ("tool",))
+INFLIGHT = Gauge("scrubber_inflight", "Work currently in progress.", ("kind",))
+ADMISSION_QUEUE = Gauge("scrubber_admission_queue", "Files waiting for a cleaner slot, by lane (fast, regular).",
+                        ("lane",))
+ADMISSION_WAIT = Histogram("scrubber_admission_wait_seconds", "Time files waited for a cleaner slot, by lane.",
+                           ("lane",))
+ADMISSION_REJECTED = Counter("scrubber_admission_rejected_total", "Requests turned away with 503, by reason.",
+                             ("reason",))
+ADMISSION_BYTES = Gauge("scrubber_admission_inflight_bytes", "Bytes of input currently admitted for cleaning.")
+REQUEST_SECONDS = Histogram("scrubber_http_request_seconds", "HTTP request latency by route.", ("route", "method"))
@@ -0,0 +1,126 @@
+# app/utils/reports.py
+"""
+Metadata reports for the inspect endpoints, as ExifTool JSON (-j -G).
+- read_reports() inspects any number of files with a single ExifTool call.
+- A report describes the content only: the System group (our temp file's
+  name, directory, dates, permissions) is left out, so two uploads with the
+  same bytes get the same report and it can be cached by their SHA-256 for
+  INSPECT_CACHE_TTL (in memory, per server process).
+- The after-report of a cleaned output is made the first time someone asks
+  for it (GET /inspect-output, report_for), not while cleaning: most outputs
+  are downloaded and never inspected. It is kept as REPORT_DIR/<name>.json,
+  out of the download namespace, and published, so later asks (on any node)
+  only read a file (or object). A node without the output inspects a copy
+  fetched from storage.
+"""
+from __future__ import annotations
+import json
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from app.settings import INSPECT_CACHE_ENTRIES, INSPECT_CACHE_TTL, REPORT_DIR, UPLOAD_DIR
+from app.utils.artifacts import register
+from app.utils.exiftool import run_exiftool
+from app.utils.storage import get_storage, key_for
+
+_ARGS = ["-j", "-G", "--System:all"]
+_SUFFIX = ".json"
+_COPY_CHUNK = 1024 * 1024
+
+_lock = threading.Lock()
+_cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()  # digest -> (expires, report); oldest first
+
+def read_reports(paths: list[Path]) -> list[dict]:
+    """One report per path, in order. Raises FileNotFoundError without exiftool, ValueError on garbled output."""
+    if not paths:
+        return []
+    names = [str(p) for p in paths]
+    # A file ExifTool can't read still gets a row (with ExifTool:Error), so don't fail the whole call
+    proc = run_exiftool([*_ARGS, *names], check=False)
+    try:
+        rows = json.loads(proc.stdout.decode("utf-8", "replace") or "[]")
+    except ValueError as e:
+        detail = proc.stderr.decode("utf-8", "replace").strip() or str(e)
+        raise ValueError(f"exiftool returned no JSON: {detail}") from e
+    by_source = {row.pop("SourceFile", None): row for row in rows}
+    return [by_source.get(name, {"ExifTool:Error": "No report produced"}) for name in names]
+
+def cached(digest: str) -> dict | None:
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(digest)
+        if hit is None or hit[0] < now:
+            _cache.pop(digest, None)
+            return None
+        return hit[1]
+
+def remember(digest: str, report: dict) -> None:
+    if INSPECT_CACHE_TTL <= 0 or "ExifTool:Error" in report:
+        return
+    with _lock:
+        _cache[digest] = (time.monotonic() + INSPECT_CACHE_TTL, report)
+        _cache.move_to_end(digest)
+        while len(_cache) > INSPECT_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+
+def report_path(output: Path) -> Path:
+    return REPORT_DIR / (Path(output).name + _SUFFIX)
+
+def _save_report(output: Path, report: dict) -> None:
+    path = report_path(output)
+    register(path)
+    path.write_text(json.dumps(report), encoding="utf-8")
+    try:
+        get_storage().publish(path)
+    except Exception as e:
+        print(f"Could not publish report {path.name}: {e}") # Log error
+
+def _inspect_stored(output: Path) -> dict | None:
+    """Report on the published copy of an output this node doesn't have; None if there is none."""
+    key = key_for(output)
+    if key is None:
+        return None
+    tmp = UPLOAD_DIR / f"inspect_{uuid.uuid4().hex}{output.suffix}"
+    try:
+        try:
+            with get_storage().open(key) as src, open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst, _COPY_CHUNK)
+        except FileNotFoundError:
+            return None
+        return read_reports([tmp])[0]
+    finally:
+        tmp.unlink(missing_ok=True)
+
+def report_for(output: Path) -> dict | None:
+    """
+    The after-report of a cleaned output: the saved one if there is one, else
+    inspected now and saved. None if the output is gone. Raises like read_reports.
+    """
+    report = load_report(output)
+    if report is not None:
+        return report
+    if output.is_file():
+        report = read_reports([output])[0]
+    else:
+        report = _inspect_stored(output)
+        if report is None:
+            return None
+    if "ExifTool:Error" not in report:
+        _save_report(output, report)
+    return report
+
+def load_report(output: Path) -> dict | None:
+    """The report saved for a cleaned output (here or by another node), or None if there isn't one."""
+    path = report_path(output)
+    try:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            key = key_for(path)
+            return json.loads(get_storage().read_bytes(key)) if key else None
+    except (FileNotFoundError, ValueError):
+        return None
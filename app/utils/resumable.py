@@ -0,0 +1,242 @@
+# app/utils/resumable.py
+"""
+Resumable uploads for files too large to send in one request, after the tus
+protocol (core, creation and termination).
+- POST /uploads (Upload-Length, Upload-Metadata "filename <base64>") opens a
+  session; its data file in UPLOAD_DIR is sized to the full length, sparse. A
+  session is only opened if the free space covers it on top of whatever the
+  open sessions have yet to write, so nobody can book the disk full with
+  uploads that never arrive.
+- PATCH /uploads/{id} (Upload-Offset) writes the body at that offset with
+  pwrite, straight into the data file. Unlike tus, chunks may come out of order
+  and in parallel: every write appends the range it covered to the session's
+  ".ranges" log (O_APPEND, one short line), so whichever server process gets
+  the next request knows what has arrived, and a dropped chunk keeps the bytes
+  that made it.
+- HEAD /uploads/{id} answers Upload-Offset (bytes contiguous from 0) and, as an
+  extension, Upload-Ranges (everything received), so a client resends gaps only.
+- A complete upload is cleaned by passing its id to /clean-batch or /jobs
+  (form field upload_ids). claim() lets one request at a time have the data
+  file; settle() ends the session once it is cleaned (or a job has it), and
+  unclaim() puts it back when cleaning failed, so the client can simply retry.
+Sessions expire UPLOAD_SESSION_TTL after their last chunk.
+"""
+from __future__ import annotations
+import asyncio
+import errno
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import AsyncIterator, Callable
+
+from app.settings import UPLOAD_CHUNK_SIZE, UPLOAD_DIR, UPLOAD_SESSION_TTL
+from app.utils.artifacts import register
+
+TUS_VERSION = "1.0.0"
+_HASH_CHUNK = 1024 * 1024
+
+
+@dataclass
+class Session:
+    id: str
+    filename: str
+    length: int
+    created: float
+
+    @property
+    def ext(self) -> str:
+        return Path(self.filename).suffix.lower()
+
+    @property
+    def data_path(self) -> Path:
+        return UPLOAD_DIR / f"tus_{self.id}{self.ext}"
+
+
+def _info_path(upload_id: str) -> Path:
+    return UPLOAD_DIR / f"tus_{upload_id}.json"
+
+
+def _ranges_path(upload_id: str) -> Path:
+    return UPLOAD_DIR / f"tus_{upload_id}.ranges"
+
+
+def _touch(session: Session) -> None:
+    # Sliding expiry: an upload in progress stays as long as chunks keep coming
+    for path in (session.data_path, _info_path(session.id), _ranges_path(session.id)):
+        register(path, UPLOAD_SESSION_TTL)
+
+
+def create(filename: str, length: int) -> Session:
+    """Open a session and size its data file. OSError (ENOSPC...) if the space isn't there."""
+    if length > shutil.disk_usage(UPLOAD_DIR).free - _promised():
+        raise OSError(errno.ENOSPC, "Not enough free space for this upload")
+    session = Session(uuid.uuid4().hex, filename, length, time.time())
+    _touch(session)
+    try:
+        fd = os.open(session.data_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.ftruncate(fd, length)  # sparse: blocks are used as chunks arrive
+        finally:
+            os.close(fd)
+        _ranges_path(session.id).touch()
+        # Written last: a session exists once its info file does
+        _info_path(session.id).write_text(json.dumps(asdict(session)), encoding="utf-8")
+    except BaseException:
+        delete(session)
+        raise
+    return session
+
+
+def _promised() -> int:
+    """Bytes the open sessions have yet to write: their sparse files don't take that space yet."""
+    total = 0
+    for info in UPLOAD_DIR.glob("tus_*.json"):
+        session = load(info.stem[len("tus_"):])
+        if session is not None:
+            total += max(session.length - sum(end - start for start, end in received(session)), 0)
+    return total
+
+
+def load(upload_id: str) -> Session | None:
+    try:
+        return Session(**json.loads(_info_path(upload_id).read_text(encoding="utf-8")))
+    except (FileNotFoundError, ValueError, TypeError):
+        return None
+
+
+def received(session: Session) -> list[tuple[int, int]]:
+    """Byte ranges on disk as sorted, merged half-open (start, end) pairs."""
+    ranges = []
+    try:
+        with open(_ranges_path(session.id), encoding="ascii") as f:
+            for line in f:
+                start, _, end = line.partition(" ")
+                try:
+                    ranges.append((int(start), int(end)))
+                except ValueError:
+                    continue  # torn line from a crashed writer; its chunk gets resent
+    except FileNotFoundError:
+        return []
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def offset(ranges: list[tuple[int, int]]) -> int:
+    """tus Upload-Offset: how far the data is contiguous from the start."""
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+def complete(session: Session, ranges: list[tuple[int, int]] | None = None) -> bool:
+    ranges = received(session) if ranges is None else ranges
+    return session.length == 0 or offset(ranges) >= session.length
+
+
+def _record(session: Session, start: int, end: int) -> None:
+    # One short O_APPEND write per chunk: concurrent writers never interleave inside a line
+    fd = os.open(_ranges_path(session.id), os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(fd, f"{start} {end}\n".encode("ascii"))
+    finally:
+        os.close(fd)
+    _touch(session)
+
+
+def _pwrite_all(fd: int, data: bytes | bytearray, pos: int) -> None:
+    view = memoryview(data)
+    while view:
+        n = os.pwrite(fd, view, pos)
+        view, pos = view[n:], pos + n
+
+
+async def receive(session: Session, start: int, stream: AsyncIterator[bytes],
+                  check_head: Callable[[bytes], None] | None = None, head_size: int = 0) -> int:
+    """
+    Write a PATCH body at `start`, in UPLOAD_CHUNK_SIZE pieces off the event loop.
+    Returns the bytes written. ValueError if the body runs past the declared
+    length; whatever was written before an error or a disconnect is kept.
+    check_head(first bytes) runs before anything is written when start == 0
+    and the body brings at least head_size bytes (or the whole file); a shorter
+    first body is not judged here, the check on the finished upload catches it.
+    """
+    fd = await asyncio.to_thread(os.open, session.data_path, os.O_WRONLY)
+    written = 0
+    buf = bytearray()
+    head_size = min(head_size, session.length)
+
+    def _check(buf: bytearray) -> None:
+        if check_head is not None and start == 0 and written == 0 and len(buf) >= head_size:
+            check_head(bytes(buf))
+
+    try:
+        async for chunk in stream:
+            if start + written + len(buf) + len(chunk) > session.length:
+                raise ValueError("Chunk runs past Upload-Length.")
+            buf += chunk
+            if len(buf) >= max(UPLOAD_CHUNK_SIZE, head_size):
+                _check(buf)
+                await asyncio.to_thread(_pwrite_all, fd, buf, start + written)
+                written += len(buf)
+                buf = bytearray()
+        if buf:
+            _check(buf)
+            await asyncio.to_thread(_pwrite_all, fd, buf, start + written)
+            written += len(buf)
+    finally:
+        os.close(fd)
+        if written:
+            await asyncio.to_thread(_record, session, start, start + written)
+    return written
+
+
+def read_head(session: Session, n: int) -> bytes:
+    with open(session.data_path, "rb") as f:
+        return f.read(n)
+
+
+def sha256(session: Session) -> str:
+    h = hashlib.sha256()
+    with open(session.data_path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _claimed_path(upload_id: str) -> Path:
+    return UPLOAD_DIR / f"tus_{upload_id}.claimed"
+
+
+def claim(session: Session) -> Path:
+    """
+    Take a complete session for cleaning and return its data file; nobody else can claim it
+    until unclaim(). FileNotFoundError if another request claimed it first.
+    """
+    os.rename(_info_path(session.id), _claimed_path(session.id))  # the atomic step: only one claimant gets past it
+    register(_claimed_path(session.id), UPLOAD_SESSION_TTL)  # still expires if the claimant dies
+    return session.data_path
+
+
+def settle(session: Session) -> None:
+    """End a claimed session: its data file is now an ordinary upload, the claimant's to expire."""
+    for path in (_claimed_path(session.id), _ranges_path(session.id)):
+        path.unlink(missing_ok=True)
+
+
+def unclaim(session: Session) -> None:
+    """Put a claimed session back (cleaning it failed), to be claimed again before it expires."""
+    os.replace(_claimed_path(session.id), _info_path(session.id))
+    _touch(session)
+
+
+def delete(session: Session) -> None:
+    for path in (_info_path(session.id), _claimed_path(session.id), _ranges_path(session.id), session.data_path):
+        path.unlink(missing_ok=True)
@@ -1,10 +1,57 @@
 # app/utils/signature.py
 """
 Lightweight magic-number / structure checks to prevent extension-spoofed uploads.
+
+detect_type() never needs the whole file: it reads a small header window,
+picks the format with one table lookup on the leading bytes (or the ISO-BMFF
+'ftyp' tag at offset 4) and, for ZIP containers, seeks to the end-of-central-
+directory record and classifies OOXML from the member names alone.
+It accepts bytes, a path, or any seekable binary file object (including mmap).
 """
 from __future__ import annotations
-from zipfile import ZipFile, BadZipFile
+from dataclasses import dataclass
+from io import BytesIO
 from pathlib import Path
+import os
+import struct
+
+HEADER_WINDOW = 64
+# Largest central directory we are willing to read to classify a ZIP
+_MAX_CENTRAL_DIR = 16 * 1024 * 1024
+
+@dataclass(frozen=True)
+class FileType:
+    ext: str    # normalized extension, with dot
+    kind: str   # cleaner family: "image" | "office" | "pdf" | "video"
+    mime: str
+
+    def accepts(self, ext: str) -> bool:
+        """True if a file claiming `ext` may legitimately be this type."""
+        return ext_equivalent(ext, self.ext)
+
+JPEG = FileType(".jpg", "image", "image/jpeg")
+PNG = FileType(".png", "image", "image/png")
+GIF = FileType(".gif", "image", "image/gif")
+TIFF = FileType(".tiff", "image", "image/tiff")
+WEBP = FileType(".webp", "image", "image/webp")
+PDF = FileType(".pdf", "pdf", "application/pdf")
+DOCX = FileType(".docx", "office", "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+XLSX = FileType(".xlsx", "office", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+MP4 = FileType(".mp4", "video", "video/mp4")
+MOV = FileType(".mov", "video", "video/quicktime")
+M4V = FileType(".m4v", "video", "video/x-m4v")
+AVI = FileType(".avi", "video", "video/x-msvideo")
+MKV = FileType(".mkv", "video", "video/x-matroska")
+WEBM = FileType(".webm", "video", "video/webm")
+
+TYPES_BY_EXT = {
+    ".jpg": JPEG, ".jpeg": JPEG, ".png": PNG, ".gif": GIF, ".tif": TIFF, ".tiff": TIFF, ".webp": WEBP,
+    ".pdf": PDF, ".docx": DOCX, ".xlsx": XLSX,
+    ".mp4": MP4, ".mov": MOV, ".m4v": M4V, ".avi": AVI, ".mkv": MKV, ".webm": WEBM,
+}
+
+def type_for_extension(ext: str) -> FileType | None:
+    return TYPES_BY_EXT.get(ext.lower())
 
 def _starts(data: bytes, prefix: bytes) -> bool:
     return data.startswith(prefix)
@@ -25,7 +72,6 @@ def _is_gif(data: bytes) -> bool:
 def _is_tiff(data: bytes) -> bool:
     return _starts(data, b"MM\x00*") or _starts(data, b"II*\x00")
 
-# --- NEW WEBP CHECK ---
 def _is_webp(data: bytes) -> bool:
     return len(data) >= 12 and _has(data, 0, b'RIFF') and _has(data, 8, b'WEBP')
 
@@ -34,21 +80,57 @@ def _is_pdf(data: bytes) -> bool:
     return _starts(data, b"%PDF-")
 
 # --- Office (OOXML = ZIP) ---
-def _is_docx(data: bytes) -> bool:
-    try:
-        from io import BytesIO
-        with ZipFile(BytesIO(data)) as z:
-            return any(n.startswith("word/") for n in z.namelist())
-    except BadZipFile:
-        return False
-
-def _is_xlsx(data: bytes) -> bool:
-    try:
-        from io import BytesIO
-        with ZipFile(BytesIO(data)) as z:
-            return any(n.startswith("xl/") for n in z.namelist())
-    except BadZipFile:
-        return False
+def is_zip_container(head: bytes) -> bool:
+    return _starts(head, b"PK\x03\x04")
+
+# Top-level folder of an OOXML package -> type (DOCX wins if both appear)
+_OOXML_ROOTS = {"word": DOCX, "xl": XLSX}
+
+def _zip_member_names(fh) -> list[str] | None:
+    """Read member names from the central directory only (EOCD, then ZIP64 if needed)."""
+    fh.seek(0, os.SEEK_END)
+    size = fh.tell()
+    tail_len = min(size, 22 + 65535)  # EOCD + longest possible comment
+    fh.seek(size - tail_len)
+    tail = fh.read(tail_len)
+    eocd = tail.rfind(b"PK\x05\x06")
+    if eocd < 0 or len(tail) - eocd < 22:
+        return None
+    entries, cd_size, cd_offset = struct.unpack("<6xHII", tail[eocd + 4:eocd + 20])
+    if 0xFFFFFFFF in (cd_size, cd_offset) or entries == 0xFFFF:
+        # ZIP64: the locator sits right before the EOCD
+        loc = tail[eocd - 20:eocd] if eocd >= 20 else b""
+        if not loc.startswith(b"PK\x06\x07"):
+            return None
+        (z64_offset,) = struct.unpack("<Q", loc[8:16])
+        fh.seek(z64_offset)
+        rec = fh.read(56)
+        if not rec.startswith(b"PK\x06\x06"):
+            return None
+        entries, cd_size, cd_offset = struct.unpack("<QQQ", rec[32:56])
+    if cd_size > _MAX_CENTRAL_DIR or cd_offset + cd_size > size:
+        return None
+
+    fh.seek(cd_offset)
+    cd = fh.read(cd_size)
+    names, pos = [], 0
+    while pos + 46 <= len(cd) and cd[pos:pos + 4] == b"PK\x01\x02":
+        flags = struct.unpack("<H", cd[pos + 8:pos + 10])[0]
+        name_len, extra_len, comment_len = struct.unpack("<HHH", cd[pos + 28:pos + 34])
+        raw = cd[pos + 46:pos + 46 + name_len]
+        names.append(raw.decode("utf-8" if flags & 0x800 else "cp437", "replace"))
+        pos += 46 + name_len + extra_len + comment_len
+    return names
+
+def _classify_zip(head: bytes, fh) -> FileType | None:
+    names = _zip_member_names(fh)
+    if not names:
+        return None
+    roots = {n.split("/", 1)[0] for n in names if "/" in n}
+    for root, ftype in _OOXML_ROOTS.items():
+        if root in roots:
+            return ftype
+    return None
 
 # --- Video ---
 def _is_iso_bmff(data: bytes) -> bool:
@@ -60,25 +142,68 @@ def _is_avi(data: bytes) -> bool:
 def _is_matroska(data: bytes) -> bool:
     return _starts(data, b"\x1A\x45\xDF\xA3")
 
-_EQUIV = {
-    "mp4": {"mp4", "mov", "m4v"},
-    "mkv": {"mkv", "webm"},
+_BRANDS = {b"qt  ": MOV, b"M4V ": M4V, b"M4VH": M4V, b"M4VP": M4V}
+
+def _classify_ftyp(head: bytes, fh) -> FileType | None:
+    return _BRANDS.get(head[8:12], MP4) if _is_iso_bmff(head) else None
+
+def _classify_riff(head: bytes, fh) -> FileType | None:
+    if _is_webp(head): return WEBP
+    if _is_avi(head): return AVI
+    return None
+
+def _classify_ebml(head: bytes, fh) -> FileType | None:
+    if not _is_matroska(head):
+        return None
+    # DocType element (0x4282) sits in the EBML header, well inside the window
+    return WEBM if b"\x42\x82\x84webm" in head else MKV
+
+def _exact(check, ftype):
+    return lambda head, fh: ftype if check(head) else None
+
+# First two bytes -> classifier. ISO-BMFF is keyed on the 'ftyp' tag at offset 4 instead.
+_MAGIC = {
+    b"\xFF\xD8": _exact(_is_jpeg, JPEG),
+    b"\x89P": _exact(_is_png, PNG),
+    b"GI": _exact(_is_gif, GIF),
+    b"MM": _exact(_is_tiff, TIFF),
+    b"II": _exact(_is_tiff, TIFF),
+    b"RI": _classify_riff,
+    b"%P": _exact(_is_pdf, PDF),
+    b"PK": _classify_zip,
+    b"\x1A\x45": _classify_ebml,
 }
 
+def detect_type(source) -> FileType | None:
+    """
+    Identify a file from its content. `source` may be bytes, a path, or a
+    seekable binary file object / mmap (its position is not preserved).
+    """
+    if isinstance(source, (str, Path)):
+        try:
+            with open(source, "rb") as fh:
+                return detect_type(fh)
+        except OSError:
+            return None
+    fh = BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    fh.seek(0)
+    head = fh.read(HEADER_WINDOW)
+    classify = _MAGIC.get(head[:2])
+    if classify is None and _has(head, 4, b"ftyp"):
+        classify = _classify_ftyp
+    return classify(head, fh) if classify else None
+
 def detect_extension(data: bytes) -> str | None:
     """Return a normalized extension (with dot), or None if unsupported."""
-    if _is_jpeg(data): return ".jpg"
-    if _is_png(data):  return ".png"
-    if _is_gif(data):  return ".gif"
-    if _is_tiff(data): return ".tiff"
-    if _is_webp(data): return ".webp" # <-- WEBP ADDED HERE
-    if _is_pdf(data):  return ".pdf"
-    if _is_docx(data): return ".docx"
-    if _is_xlsx(data): return ".xlsx"
-    if _is_iso_bmff(data): return ".mp4"
-    if _is_avi(data):     return ".avi"
-    if _is_matroska(data):return ".mkv"
-    return None
+    ftype = detect_type(data)
+    return ftype.ext if ftype else None
+
+_EQUIV = {
+    "mp4": {"mp4", "mov", "m4v"},
+    "mkv": {"mkv", "webm"},
+    "jpg": {"jpg", "jpeg"},
+    "tiff": {"tiff", "tif"},
+}
 
 def ext_equivalent(a: str, b: str) -> bool:
     """True if extensions are the same or within an equivalence family."""
@@ -0,0 +1,347 @@
+# app/utils/storage.py
+"""
+Where cleaned outputs are kept, so any node can serve any download.
+- Cleaners, ExifTool and ffmpeg need real files, so every node works on its
+  own copies in UPLOAD_DIR / OUTPUT_DIR. A finished output is published to
+  the storage backend under "outputs/<name>", its report (once made) under
+  "reports/<name>.json", a batch's manifest under "batches/<uid>.json"; a
+  node that doesn't have a file reads it back from there, whole or by range.
+  Uploads stay on the node that received them: that node cleans them, and
+  nobody else ever reads them.
+- LocalStorage (STORAGE_BACKEND=local, the default): a directory tree. With
+  STORAGE_DIR unset it is DATA_DIR itself, so keys land exactly on
+  OUTPUT_DIR / REPORT_DIR / BATCH_DIR and publishing costs nothing. Point
+  STORAGE_DIR at a shared mount (NFS, SMB) to share it between nodes.
+- S3Storage (STORAGE_BACKEND=s3): any S3-compatible object store (AWS, MinIO,
+  Ceph...). Publishing is a multipart upload streamed from disk in
+  S3_PART_SIZE parts; reads are ranged GETs streamed in chunks. boto3 is only
+  imported when this backend is selected.
+- Publishing to a shared backend also records the output's SHA-256 (with the
+  size and mtime it was taken at) under "<root>/digests/<key>.sha256", out of
+  reach of /download. LocalStorage hashes while it copies and records it on
+  both sides (mtime preserved); S3Storage hashes before the upload and sends
+  it as object metadata. Every node then answers with the same ETag and
+  Last-Modified for the same bytes, so a download resumed on another node
+  still matches its If-Range. With nothing to share (the default root) no
+  digest is taken and the ETag comes from size and mtime.
+- Expiry stays with the artifact index of the node that wrote the file:
+  cleanup deletes the published copy along with the local one (unpublish).
+  On S3 a lifecycle rule on the outputs/, reports/ and batches/ prefixes is the
+  backstop for objects whose node is gone.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from app.utils.fileresponse import etag_for
+from app.settings import (
+    BATCH_DIR, DATA_DIR, OUTPUT_DIR, REPORT_DIR, STORAGE_BACKEND, STORAGE_DIR,
+    S3_BUCKET, S3_ENDPOINT_URL, S3_PART_SIZE, S3_PREFIX, S3_REGION,
+)
+
+_PREFIXES = {"outputs": OUTPUT_DIR, "reports": REPORT_DIR, "batches": BATCH_DIR}
+_DIGEST_DIR = "digests"
+_DIGEST_SUFFIX = ".sha256"
+_HASH_CHUNK = 1024 * 1024
+
+
+@dataclass
+class ObjectInfo:
+    size: int
+    mtime: float
+    etag: str  # strong, quoted
+
+
+def key_for(path: Path) -> str | None:
+    """Storage key of one of our working files, or None for anything else."""
+    path = Path(path)
+    for prefix, folder in _PREFIXES.items():
+        if path.parent == folder:
+            return f"{prefix}/{path.name}"
+    return None
+
+
+def digest_path(path: Path) -> Path:
+    """Where the SHA-256 of <root>/<prefix>/<name> is kept: <root>/digests/<prefix>/<name>.sha256."""
+    path = Path(path)
+    return path.parent.parent / _DIGEST_DIR / path.parent.name / (path.name + _DIGEST_SUFFIX)
+
+
+def _record_digest(path: Path, sha256: str, st: os.stat_result) -> None:
+    record = {"sha256": sha256, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    target = digest_path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.part")
+    tmp.write_text(json.dumps(record), encoding="utf-8")
+    os.replace(tmp, target)
+
+
+def _write_digest(path: Path) -> None:
+    st = os.stat(path)
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            h.update(chunk)
+    _record_digest(path, h.hexdigest(), st)
+
+
+def _digest(path: Path, st: os.stat_result) -> str | None:
+    """The recorded SHA-256 of path, if it was taken of the bytes that are there now."""
+    try:
+        record = json.loads(digest_path(path).read_text(encoding="utf-8"))
+        if record["size"] == st.st_size and record["mtime_ns"] == st.st_mtime_ns:
+            return record["sha256"]
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def content_etag(path: Path, st: os.stat_result) -> str:
+    """Strong ETag of a working file: its SHA-256 once published (the same on every node), else etag_for(st)."""
+    digest = _digest(path, st)
+    return f'"{digest}"' if digest else etag_for(st)
+
+
+def _check_key(key: str) -> tuple[str, str]:
+    prefix, _, name = key.partition("/")
+    if prefix not in _PREFIXES or not name or "/" in name or "\\" in name or name in (".", ".."):
+        raise ValueError(f"Invalid storage key: {key!r}")
+    return prefix, name
+
+
+class Storage:
+    """Backend interface. Keys look like "outputs/<name>"."""
+
+    def publish(self, path: Path) -> None:
+        """Make a local working file (in OUTPUT_DIR, REPORT_DIR or BATCH_DIR) visible to every node."""
+        raise NotImplementedError
+
+    def unpublish(self, path: Path) -> None:
+        """Delete the published copy of a working file (the local one is the caller's business)."""
+        raise NotImplementedError
+
+    def stat(self, key: str) -> ObjectInfo | None:
+        raise NotImplementedError
+
+    def open(self, key: str, offset: int = 0, length: int | None = None) -> BinaryIO:
+        """Readable stream of the object (from offset, at most length bytes). FileNotFoundError if absent."""
+        raise NotImplementedError
+
+    def read_bytes(self, key: str) -> bytes:
+        with self.open(key) as f:
+            return f.read()
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: Path = DATA_DIR):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        prefix, name = _check_key(key)
+        return self.root / prefix / name
+
+    def _target(self, path: Path) -> Path | None:
+        key = key_for(path)
+        if key is None:
+            return None
+        target = self._path(key)
+        # With the default root the key already is the working file
+        return None if target == Path(path) else target
+
+    def publish(self, path: Path) -> None:
+        target = self._target(path)
+        if target is None:
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.part")
+        h = hashlib.sha256()
+        try:
+            # Hashed on the way through: one read of the file does both
+            with open(path, "rb") as src, open(tmp, "wb") as dst:
+                st = os.fstat(src.fileno())
+                while chunk := src.read(_HASH_CHUNK):
+                    h.update(chunk)
+                    dst.write(chunk)
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            # Digests before the file: each is only believed while its file's size and mtime match it
+            _record_digest(path, h.hexdigest(), st)
+            _record_digest(target, h.hexdigest(), st)
+            os.replace(tmp, target)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def unpublish(self, path: Path) -> None:
+        target = self._target(path)
+        if target is not None:
+            target.unlink(missing_ok=True)
+            digest_path(target).unlink(missing_ok=True)
+
+    def stat(self, key: str) -> ObjectInfo | None:
+        path = self._path(key)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return ObjectInfo(st.st_size, st.st_mtime, content_etag(path, st))
+
+    def open(self, key: str, offset: int = 0, length: int | None = None) -> BinaryIO:
+        f = open(self._path(key), "rb")
+        f.seek(offset)
+        return f if length is None else _Limited(f, length)
+
+
+class _Limited:
+    """Read at most `remaining` bytes from a file object."""
+
+    def __init__(self, f: BinaryIO, remaining: int):
+        self._f, self._remaining = f, remaining
+
+    def read(self, n: int = -1) -> bytes:
+        n = self._remaining if n < 0 else min(n, self._remaining)
+        data = self._f.read(n) if n > 0 else b""
+        self._remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class S3Storage(Storage):
+    def __init__(self, bucket: str = S3_BUCKET, prefix: str = S3_PREFIX, endpoint_url: str | None = S3_ENDPOINT_URL,
+                 region: str | None = S3_REGION, part_size: int = S3_PART_SIZE, client=None):
+        if not bucket:
+            raise ValueError("STORAGE_BACKEND=s3 needs S3_BUCKET")
+        self.bucket, self.prefix, self.part_size = bucket, prefix, part_size
+        self._client = client
+        self._endpoint_url, self._region = endpoint_url, region
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import boto3  # only needed for this backend
+                self._client = boto3.client("s3", endpoint_url=self._endpoint_url, region_name=self._region)
+            return self._client
+
+    def _name(self, key: str) -> str:
+        _check_key(key)
+        return self.prefix + key
+
+    def publish(self, path: Path) -> None:
+        key = key_for(path)
+        if key is None:
+            return
+        from boto3.s3.transfer import TransferConfig
+        # Metadata goes with the first request, so the digest has to come before the upload
+        _write_digest(path)
+        # Multipart above one part, read from disk part by part: memory stays at a few parts
+        config = TransferConfig(multipart_threshold=self.part_size, multipart_chunksize=self.part_size,
+                                max_concurrency=4)
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            # Served with the same ETag and Last-Modified as the file on this node
+            metadata = {"mtime": repr(st.st_mtime)}
+            digest = _digest(path, st)
+            if digest:
+                metadata["sha256"] = digest
+            self.client.upload_fileobj(f, self.bucket, self._name(key), Config=config,
+                                       ExtraArgs={"Metadata": metadata})
+
+    def unpublish(self, path: Path) -> None:
+        key = key_for(path)
+        if key is not None:
+            self.client.delete_object(Bucket=self.bucket, Key=self._name(key))
+
+    def _missing(self, error) -> bool:
+        code = str(error.response.get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def stat(self, key: str) -> ObjectInfo | None:
+        from botocore.exceptions import ClientError
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._name(key))
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+        meta = head.get("Metadata", {})
+        etag = f'"{meta["sha256"]}"' if meta.get("sha256") else head["ETag"]
+        try:
+            mtime = float(meta["mtime"])
+        except (KeyError, ValueError):
+            mtime = head["LastModified"].timestamp()
+        return ObjectInfo(head["ContentLength"], mtime, etag)
+
+    def open(self, key: str, offset: int = 0, length: int | None = None) -> BinaryIO:
+        from botocore.exceptions import ClientError
+        args = {"Bucket": self.bucket, "Key": self._name(key)}
+        if offset or length is not None:
+            end = "" if length is None else str(offset + length - 1)
+            args["Range"] = f"bytes={offset}-{end}"
+        try:
+            return self.client.get_object(**args)["Body"]
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(key) from e
+            raise
+
+
+_storage: Storage | None = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == "s3":
+                _storage = S3Storage()
+            elif STORAGE_BACKEND == "local":
+                _storage = LocalStorage(Path(STORAGE_DIR) if STORAGE_DIR else DATA_DIR)
+            else:
+                raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r} (expected local or s3)")
+        return _storage
+
+
+def publish(paths: list[Path]) -> None:
+    """Publish working files. Failures are logged, never raised: this node still serves them."""
+    storage = get_storage()
+    for path in paths:
+        try:
+            storage.publish(path)
+        except Exception as e:
+            print(f"Could not publish {Path(path).name}: {e}") # Log error
+
+
+def local_or_stored(path: Path) -> tuple[BinaryIO, int, float] | None:
+    """Open a working file, or its published copy if this node doesn't have it: (stream, size, mtime)."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        pass
+    else:
+        st = os.fstat(f.fileno())
+        return f, st.st_size, st.st_mtime
+    key = key_for(path)
+    storage = get_storage()
+    info = storage.stat(key) if key else None
+    if info is None:
+        return None
+    try:
+        return storage.open(key), info.size, info.mtime
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,147 @@
+r"""
+Benchmark suite: every cleaner (and file type detection) on generated corpora per size class.
+
+Usage (from project root):
+
+  python benchmarks/bench_cleaners.py                          # small + medium, compare to baseline
+  python benchmarks/bench_cleaners.py --sizes small medium large --save-baseline
+  python benchmarks/bench_cleaners.py --formats jpg pdf -n 10 --time-tolerance 0.5
+
+For each case (cleaner, format, size class) a fresh interpreter cleans the
+same input --rounds times and reports the median wall time, throughput,
+peak RSS and how many subprocesses were started per run (ExifTool, ffmpeg).
+Results are compared with benchmarks/baseline.json when it exists; a case
+that got slower, bigger or spawns more processes than the tolerances allow
+is flagged and the exit status is 1. --save-baseline records this run as
+the new baseline (baselines are machine-specific, so make your own).
+Inputs come from benchmarks/corpus.py; mp4 cases are skipped without ffmpeg.
+"""
+from __future__ import annotations
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import argparse
+import json
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+from benchmarks.corpus import make
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# format -> cleaner it exercises (detect_type, behind detect_extension, runs on every format too)
+_CLEANER_FOR = {"jpg": "clean_image", "png": "clean_image", "docx": "clean_office",
+                "xlsx": "clean_office", "pdf": "clean_pdf", "mp4": "clean_video"}
+
+def _load_function(name: str):
+    if name == "detect_type":
+        from app.utils.signature import detect_type
+        return detect_type
+    module = {"clean_image": "images", "clean_office": "office", "clean_pdf": "pdfs", "clean_video": "videos"}[name]
+    return getattr(__import__(f"app.cleaners.{module}", fromlist=[name]), name)
+
+def _run_case(name: str, src: Path, rounds: int) -> None:
+    """Child mode: time `rounds` runs of one function on src; report JSON on stdout."""
+    spawned = 0
+    popen_init = subprocess.Popen.__init__
+
+    def counting_init(self, *args, **kwargs):
+        nonlocal spawned
+        spawned += 1
+        popen_init(self, *args, **kwargs)
+
+    subprocess.Popen.__init__ = counting_init
+    fn = _load_function(name)
+    times = []
+    with tempfile.TemporaryDirectory() as td:
+        for i in range(rounds):
+            dst = Path(td) / f"out_{i}{src.suffix}"
+            start = time.perf_counter()
+            # detect_type reads the header window (and a ZIP's central directory) from the path
+            fn(src) if name == "detect_type" else fn(src, dst)
+            times.append(time.perf_counter() - start)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        maxrss *= 1024  # Linux reports KiB
+    print(json.dumps({"seconds": statistics.median(times), "maxrss": maxrss, "subprocesses": spawned / rounds}))
+
+def _measure(name: str, src: Path, rounds: int) -> dict:
+    proc = subprocess.run([sys.executable, __file__, "--child", name, str(src), str(rounds)],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed")
+    return json.loads(proc.stdout.splitlines()[-1])
+
+def _regressions(result: dict, base: dict, time_tol: float, rss_tol: float) -> list[str]:
+    problems = []
+    # Sub-5 ms cases are mostly noise; only flag them past an absolute margin too
+    if result["seconds"] > base["seconds"] * (1 + time_tol) and result["seconds"] - base["seconds"] > 0.005:
+        problems.append(f"time {base['seconds'] * 1000:.1f} -> {result['seconds'] * 1000:.1f} ms")
+    if result["maxrss"] > base["maxrss"] * (1 + rss_tol):
+        problems.append(f"RSS {base['maxrss'] / 1e6:.0f} -> {result['maxrss'] / 1e6:.0f} MB")
+    if result["subprocesses"] > base["subprocesses"]:
+        problems.append(f"subprocesses {base['subprocesses']:g} -> {result['subprocesses']:g}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", default=list(_CLEANER_FOR), choices=list(_CLEANER_FOR))
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=["small", "medium", "large"])
+    parser.add_argument("-n", "--rounds", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run's results as the baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--rss-tolerance", type=float, default=0.25, help="Allowed peak RSS growth")
+    parser.add_argument("--child", nargs=3, metavar=("FUNCTION", "SRC", "ROUNDS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        name, src, rounds = args.child
+        _run_case(name, Path(src), int(rounds))
+        return
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results, flagged = {}, 0
+    print(f"{'case':<32} {'in MB':>7} {'ms':>9} {'MB/s':>8} {'RSS MB':>7} {'procs':>5}  vs. baseline")
+    with tempfile.TemporaryDirectory() as td:
+        td = Path(td)
+        for fmt in args.formats:
+            if fmt == "mp4" and not shutil.which("ffmpeg"):
+                print(f"{'*/mp4/*':<32} skipped: ffmpeg not found")
+                continue
+            for size in args.sizes:
+                src = make(fmt, size, td)
+                mb = src.stat().st_size / 1e6
+                for name in (_CLEANER_FOR[fmt], "detect_type"):
+                    case = f"{name}/{fmt}/{size}"
+                    try:
+                        r = _measure(name, src, args.rounds)
+                    except RuntimeError as e:
+                        print(f"{case:<32} failed: {e}")
+                        flagged += 1
+                        continue
+                    results[case] = r
+                    note = "new"
+                    if case in baseline:
+                        problems = _regressions(r, baseline[case], args.time_tolerance, args.rss_tolerance)
+                        flagged += bool(problems)
+                        note = "REGRESSION: " + "; ".join(problems) if problems else "ok"
+                    print(f"{case:<32} {mb:>7.1f} {r['seconds'] * 1000:>9.1f} {mb / r['seconds']:>8.1f} "
+                          f"{r['maxrss'] / 1e6:>7.0f} {r['subprocesses']:>5g}  {note}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}")
+    elif flagged:
+        print(f"{flagged} case(s) regressed or failed")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
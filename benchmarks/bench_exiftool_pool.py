@@ -0,0 +1,86 @@
+r"""
+Benchmark: pooled `exiftool -stay_open` workers vs. one exiftool process per file.
+
+Usage (from project root):
+
+  python benchmarks/bench_exiftool_pool.py            # 200 small JPEGs, 4 threads
+  python benchmarks/bench_exiftool_pool.py -n 500 -t 8
+
+Each round creates fresh copies of a tiny JPEG carrying an Artist tag and strips
+them with `-all=`, which is the call every image cleaner makes.
+"""
+from __future__ import annotations
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import argparse
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from app.utils.exiftool import ExifToolPool
+
+_STRIP = ["-all=", "-overwrite_original_in_place"]
+
+def _make_corpus(folder: Path, n: int) -> list[Path]:
+    seed = folder / "seed.jpg"
+    Image.new("RGB", (64, 64), color=(10, 120, 200)).save(seed)
+    subprocess.run(["exiftool", "-Artist=Bench", "-overwrite_original_in_place", str(seed)],
+                   check=True, capture_output=True)
+    files = []
+    for i in range(n):
+        p = folder / f"img_{i}.jpg"
+        shutil.copyfile(seed, p)
+        files.append(p)
+    return files
+
+def _fork_per_file(path: Path) -> None:
+    subprocess.run(["exiftool", *_STRIP, str(path)], check=True, capture_output=True)
+
+def _timed(label: str, fn, files: list[Path], threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        list(ex.map(fn, files))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {len(files):>5} files  {elapsed:8.2f}s  {len(files) / elapsed:8.1f} files/s"
+          f"  {elapsed / len(files) * 1000:7.1f} ms/file")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--files", type=int, default=200)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        fork_dir = Path(td) / "fork"
+        pool_dir = Path(td) / "pool"
+        fork_dir.mkdir()
+        pool_dir.mkdir()
+        fork_files = _make_corpus(fork_dir, args.files)
+        pool_files = _make_corpus(pool_dir, args.files)
+
+        forked = _timed("fork per file", _fork_per_file, fork_files, args.threads)
+
+        pool = ExifToolPool(size=args.pool_size)
+        try:
+            # Warm the workers so we measure steady state, as the server sees it
+            for _ in range(args.pool_size):
+                pool.run(["-ver"])
+            pooled = _timed(f"stay_open pool ({args.pool_size})",
+                            lambda p: pool.run([*_STRIP, str(p)]), pool_files, args.threads)
+        finally:
+            pool.close()
+
+    print(f"speed-up: {forked / pooled:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+r"""
+Benchmark: PDF engines (pikepdf vs. pypdf + ExifTool) on a synthetic "scanned" corpus.
+
+Usage (from project root):
+
+  python benchmarks/bench_pdf.py                      # 10, 100 and 1000 pages
+  python benchmarks/bench_pdf.py --pages 50 500 --engines pikepdf
+
+Each corpus PDF has one JPEG "scan" per page plus document info, XMP,
+a JavaScript name tree and an annotation per page, so every engine has
+something to remove. Every run happens in a fresh interpreter, so the peak
+RSS column is that engine's alone. Without exiftool the pypdf row measures
+the pypdf pass only.
+"""
+from __future__ import annotations
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import argparse
+import json
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+from benchmarks.corpus import make_pdf
+
+def _run_engine(engine: str, src: Path, dst: Path) -> None:
+    """Child mode: clean once, report wall time and peak RSS as JSON on stdout."""
+    from app.cleaners import pdfs
+    clean = pdfs.pdf_engine(engine)
+    if engine == "pypdf" and not shutil.which("exiftool"):
+        clean = pdfs._pypdf_sanitize
+    start = time.perf_counter()
+    clean(src, dst)
+    elapsed = time.perf_counter() - start
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        maxrss *= 1024  # Linux reports KiB
+    print(json.dumps({"seconds": elapsed, "maxrss": maxrss, "out_bytes": dst.stat().st_size}))
+
+def _measure(engine: str, src: Path, dst: Path) -> dict:
+    out = subprocess.run([sys.executable, __file__, "--child", engine, str(src), str(dst)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--engines", nargs="+", default=["pikepdf", "pypdf"])
+    parser.add_argument("--child", nargs=3, metavar=("ENGINE", "SRC", "DST"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        engine, src, dst = args.child
+        _run_engine(engine, Path(src), Path(dst))
+        return
+
+    if "pypdf" in args.engines and not shutil.which("exiftool"):
+        print("exiftool not found; the pypdf row skips its ExifTool pass")
+    print(f"{'pages':>6} {'in MB':>7} {'engine':<8} {'seconds':>8} {'peak RSS MB':>12} {'out MB':>7}")
+    with tempfile.TemporaryDirectory() as td:
+        td = Path(td)
+        for pages in args.pages:
+            src = td / f"scan_{pages}.pdf"
+            make_pdf(src, pages)
+            size = src.stat().st_size / 1e6
+            for engine in args.engines:
+                r = _measure(engine, src, td / f"scan_{pages}_{engine}.pdf")
+                print(f"{pages:>6} {size:>7.1f} {engine:<8} {r['seconds']:>8.2f} "
+                      f"{r['maxrss'] / 1e6:>12.1f} {r['out_bytes'] / 1e6:>7.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+r"""
+Synthetic benchmark inputs, generated locally (nothing is downloaded or checked in).
+
+Every file carries the kind of metadata its cleaner removes (EXIF/ICC/comments,
+text chunks, docProps/comments parts, PDF info/XMP/annotations, container tags)
+and is filled with noise so it compresses like real content.
+SIZE_CLASSES maps small/medium/large to per-format dimensions.
+"""
+from __future__ import annotations
+import os
+import shutil
+import subprocess
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from PIL import Image, PngImagePlugin
+
+# Per format: what "small", "medium" and "large" mean
+SIZE_CLASSES = {
+    "jpg": {"small": (640, 480), "medium": (2000, 1500), "large": (4000, 3000)},        # pixels
+    "png": {"small": (320, 240), "medium": (1024, 768), "large": (2000, 1500)},         # pixels
+    "docx": {"small": 1, "medium": 20, "large": 200},                                    # embedded photos
+    "xlsx": {"small": 100, "medium": 10_000, "large": 100_000},                          # rows
+    "pdf": {"small": 1, "medium": 50, "large": 500},                                     # scanned pages
+    "mp4": {"small": 2, "medium": 20, "large": 120},                                     # seconds of video
+}
+
+def _noise_image(size: tuple[int, int], mode: str = "RGB") -> Image.Image:
+    bands = len(mode)
+    return Image.frombytes(mode, size, os.urandom(size[0] * size[1] * bands))
+
+def make_jpeg(path: Path, size: tuple[int, int]) -> None:
+    exif = Image.Exif()
+    exif[0x013B] = "Bench Artist"
+    exif[0x010F] = "Bench Camera"
+    _noise_image(size).save(path, quality=90, exif=exif.tobytes(), icc_profile=b"\0" * 3144, comment=b"bench")
+
+def make_png(path: Path, size: tuple[int, int]) -> None:
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Author", "Bench Author")
+    info.add_itxt("Comment", "bench " * 100, zip=True)
+    _noise_image(size).save(path, pnginfo=info)
+
+_CT = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Default Extension="jpeg" ContentType="image/jpeg"/>
+<Override PartName="/{main}" ContentType="{main_type}"/>
+<Override PartName="/docProps/core.xml" ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>
+<Override PartName="/docProps/app.xml" ContentType="application/vnd.openxmlformats-officedocument.extended-properties+xml"/>
+</Types>"""
+
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="{main}"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" Target="docProps/core.xml"/>
+<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/extended-properties" Target="docProps/app.xml"/>
+</Relationships>"""
+
+_CORE = ('<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+         'xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:creator>Bench Author</dc:creator></cp:coreProperties>')
+_APP = '<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/2006/extended-properties"><Company>Bench</Company></Properties>'
+
+def _ooxml(path: Path, main: str, main_type: str, parts: dict[str, bytes | str]) -> None:
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _CT.format(main=main, main_type=main_type))
+        z.writestr("_rels/.rels", _ROOT_RELS.format(main=main))
+        z.writestr("docProps/core.xml", _CORE)
+        z.writestr("docProps/app.xml", _APP)
+        for name, data in parts.items():
+            # Media is already compressed; Office stores it rather than deflating it again
+            z.writestr(name, data, compress_type=zipfile.ZIP_STORED if "/media/" in name else None)
+
+def make_docx(path: Path, photos: int) -> None:
+    buf = BytesIO()
+    _noise_image((800, 600)).save(buf, format="JPEG", quality=85)
+    body = "".join(f"<w:p><w:r><w:t>Paragraph {i} of the benchmark document.</w:t></w:r></w:p>" for i in range(photos * 50))
+    parts = {
+        "word/document.xml": f'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>{body}</w:body></w:document>',
+        "word/comments.xml": "<w:comments>Bench reviewer</w:comments>",
+    }
+    # Photos are stored, as Word does for JPEGs
+    for i in range(photos):
+        parts[f"word/media/image{i + 1}.jpeg"] = buf.getvalue()
+    _ooxml(path, "word/document.xml",
+           "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml", parts)
+
+def make_xlsx(path: Path, rows: int) -> None:
+    data = "".join(f'<row r="{r}"><c r="A{r}"><v>{r}</v></c><c r="B{r}"><v>{r * 3.14159}</v></c></row>'
+                   for r in range(1, rows + 1))
+    parts = {
+        "xl/workbook.xml": '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheets><sheet name="S" sheetId="1"/></sheets></workbook>',
+        "xl/worksheets/sheet1.xml": f'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>{data}</sheetData></worksheet>',
+        "xl/comments1.xml": "<comments>Bench reviewer</comments>",
+    }
+    _ooxml(path, "xl/workbook.xml",
+           "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml", parts)
+
+def make_pdf(path: Path, pages: int) -> None:
+    """One JPEG "scan" per page plus info, XMP, a JavaScript name tree and an annotation per page."""
+    import pikepdf
+
+    buf = BytesIO()
+    # Noise compresses badly, like a real scan; the same image object is not shared between pages
+    _noise_image((600, 800), "L").save(buf, format="JPEG", quality=70)
+    scan = buf.getvalue()
+    with pikepdf.new() as pdf:
+        for i in range(pages):
+            image = pikepdf.Stream(pdf, scan, Type=pikepdf.Name.XObject, Subtype=pikepdf.Name.Image,
+                                   Width=600, Height=800, ColorSpace=pikepdf.Name.DeviceGray,
+                                   BitsPerComponent=8, Filter=pikepdf.Name.DCTDecode)
+            page = pdf.add_blank_page(page_size=(612, 792))
+            page.Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image))
+            page.Contents = pikepdf.Stream(pdf, b"q 612 0 0 792 0 0 cm /Im0 Do Q")
+            page.Annots = pdf.make_indirect(pikepdf.Array([pikepdf.Dictionary(
+                Type=pikepdf.Name.Annot, Subtype=pikepdf.Name.Text,
+                Rect=[0, 0, 10, 10], Contents=pikepdf.String(f"reviewer note {i}"))]))
+        pdf.docinfo["/Author"] = "Bench Author"
+        with pdf.open_metadata(set_pikepdf_as_editor=False) as meta:
+            meta["dc:creator"] = ["Bench Author"]
+        pdf.Root.Names = pikepdf.Dictionary(JavaScript=pikepdf.Dictionary())
+        pdf.save(path)
+
+def make_mp4(path: Path, seconds: int) -> None:
+    """ffmpeg test source (noise-heavy so it doesn't compress to nothing) with title/location tags."""
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError("ffmpeg not found")
+    subprocess.run([
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=duration={seconds}:size=1280x720:rate=30,noise=alls=20:allf=t",
+        "-f", "lavfi", "-i", f"sine=duration={seconds}",
+        "-c:v", "mpeg4", "-q:v", "5", "-c:a", "aac",
+        "-metadata", "title=Bench", "-metadata", "location=+12.3456-098.7654/",
+        str(path),
+    ], check=True)
+
+MAKERS = {"jpg": make_jpeg, "png": make_png, "docx": make_docx, "xlsx": make_xlsx, "pdf": make_pdf, "mp4": make_mp4}
+
+def make(fmt: str, size_class: str, folder: Path) -> Path:
+    path = folder / f"{size_class}.{fmt}"
+    MAKERS[fmt](path, SIZE_CLASSES[fmt][size_class])
+    return path
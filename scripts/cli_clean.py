@@ -6,19 +6,15 @@ Usage examples (from project root, with your venv activated):
   python scripts/cli_clean.py path/to/file.pdf
   python scripts/cli_clean.py C:\\Users\\you\\Desktop\\pic.jpg
   python scripts/cli_clean.py path/to/folder  (processes all supported files inside, recursively)
+  python scripts/cli_clean.py path/to/folder --jobs 8  (clean 8 files at a time)
 
 Outputs are written next to the originals as *_clean.ext
+
+Folder runs keep a manifest (.cli_clean_manifest.jsonl in the folder, or --manifest PATH)
+of every file cleaned, keyed on its size and mtime. Run the same command again after an
+interruption and files already done are skipped.
 """
 from __future__ import annotations
-import sys, pathlib
-sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))  # add project root to import path
-
-import argparse
-import sys
-from pathlib import Path
-import shutil
-import subprocess
-import argparse
 import sys
 from pathlib import Path
 
@@ -28,44 +24,52 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 # ---------------------------------------------------------------------------
 
-import shutil
-import subprocess
+import argparse
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-# Reuse our existing cleaners
-from app.settings import ALLOWED_EXTENSIONS
-from app.cleaners.images import clean_image
-from app.cleaners.office import clean_office
-from app.cleaners.pdfs import clean_pdf
+# Reuse our existing cleaners (same formats and routing as the server)
+from app.cleaners import registry
 
-SUPPORTED = {".jpg", ".jpeg", ".png", ".gif", ".tif", ".tiff", ".docx", ".xlsx", ".pdf"}
+MANIFEST_NAME = ".cli_clean_manifest.jsonl"
+_HASH_CHUNK = 1024 * 1024
 
-def check_exiftool() -> None:
-    """Ensure exiftool is installed and on PATH."""
-    try:
-        subprocess.run(["exiftool", "-ver"], check=True, capture_output=True, text=True)
-    except Exception:
-        print("❌ exiftool is not available on your system. Please install it and try again.")
+def check_tools() -> None:
+    """Look for exiftool/ffmpeg once and say which formats will be skipped without them."""
+    registry.probe()
+    for name, missing in registry.unavailable().items():
+        print(f"⚠️ {name} files will be skipped: {', '.join(missing)} not found on PATH")
+    if "exiftool" not in registry.available_tools():
+        print("   Install exiftool to clean every format:")
         print("   Windows: https://exiftool.org/  (then reopen your terminal)")
         print("   macOS (Homebrew): brew install exiftool")
-        sys.exit(1)
+
+def supported() -> frozenset[str]:
+    return registry.allowed_extensions()
 
 def choose_cleaner(ext: str):
-    ext = ext.lower()
-    if ext in {".jpg", ".jpeg", ".png", ".gif", ".tif", ".tiff"}:
-        return clean_image
-    if ext in {".docx", ".xlsx"}:
-        return clean_office
-    if ext == ".pdf":
-        return clean_pdf
-    return None
+    fmt = registry.format_for(ext)
+    return fmt.load_cleaner() if fmt else None
+
+def _output_for(path: Path) -> Path:
+    return path.with_name(f"{path.stem}_clean{path.suffix.lower()}")
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
 
 def clean_one(path: Path) -> Path | None:
     ext = path.suffix.lower()
-    if ext not in SUPPORTED:
+    if ext not in supported():
         print(f"• Skipping unsupported file: {path.name}")
         return None
 
-    dst = path.with_name(f"{path.stem}_clean{ext}")
+    dst = _output_for(path)
     cleaner = choose_cleaner(ext)
     try:
         cleaner(path, dst)
@@ -80,17 +84,174 @@ def clean_one(path: Path) -> Path | None:
             pass
         return None
 
+def _clean_task(path: Path, want_digest: bool = False) -> tuple[Path, str | None, str | None]:
+    """Worker side of a folder run: returns (path, sha256 of the source if asked for, error or None)."""
+    dst = _output_for(path)
+    try:
+        digest = _sha256(path) if want_digest else None
+        choose_cleaner(path.suffix.lower())(path, dst)
+        return path, digest, None
+    except Exception as e:
+        dst.unlink(missing_ok=True)
+        return path, None, str(e) or type(e).__name__
+
 def iter_files(target: Path):
     if target.is_file():
         yield target
     else:
+        allowed = supported()
         for p in target.rglob("*"):
-            if p.is_file() and p.suffix.lower() in SUPPORTED:
+            # *_clean files are our own outputs from an earlier run
+            if p.is_file() and p.suffix.lower() in allowed and not p.stem.endswith("_clean"):
                 yield p
 
+class Manifest:
+    """
+    Append-only JSONL record of cleaned files; the last line for a path wins.
+    A file is done if its size and mtime are unchanged, or failing that if its
+    SHA-256 is (e.g. after a copy that reset mtimes), and its output still exists.
+    Hashing only pays off for files seen before, so a first clean records no
+    SHA-256; a file cleaned again gets one (see wants_digest).
+    """
+
+    def __init__(self, path: Path, root: Path):
+        self.path = path
+        self.root = root
+        self.entries: dict[str, dict] = {}
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                try:
+                    rec = json.loads(line)
+                    self.entries[rec["src"]] = rec
+                except (ValueError, KeyError):
+                    continue  # torn last line from an interrupted run
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def _key(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def is_done(self, path: Path) -> bool:
+        rec = self.entries.get(self._key(path))
+        if rec is None or not _output_for(path).exists():
+            return False
+        st = path.stat()
+        if rec["size"] != st.st_size:
+            return False
+        if rec["mtime_ns"] == st.st_mtime_ns:
+            return True
+        if rec.get("sha256") and rec["sha256"] == _sha256(path):
+            self.record(path, rec["sha256"])  # remember the new mtime
+            return True
+        return False
+
+    def wants_digest(self, path: Path) -> bool:
+        """Whether to hash path when cleaning it: only if the manifest has met it before."""
+        return self._key(path) in self.entries
+
+    def record(self, path: Path, digest: str | None) -> None:
+        st = path.stat()
+        rec = {"src": self._key(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+               "sha256": digest, "dst": _output_for(path).name, "cleaned_at": time.time()}
+        self.entries[rec["src"]] = rec
+        self._fh.write(json.dumps(rec) + "\n")
+        self._fh.flush()  # every finished file survives an interruption
+
+    def close(self) -> None:
+        self._fh.close()
+
+class Progress:
+    """One live status line: files and bytes done, throughput and ETA."""
+
+    def __init__(self, total_files: int, total_bytes: int):
+        self.total_files, self.total_bytes = total_files, total_bytes
+        self.files = self.bytes = 0
+        self.start = time.monotonic()
+        self._tty = sys.stderr.isatty()
+        self._last = 0.0
+
+    def advance(self, size: int) -> None:
+        self.files += 1
+        self.bytes += size
+        now = time.monotonic()
+        # Redraw in place on a terminal; otherwise a line every few seconds is plenty
+        if self._tty or now - self._last >= 5 or self.files == self.total_files:
+            self._last = now
+            end = "" if self._tty else "\n"
+            print(f"\r{self.line()}\033[K" if self._tty else self.line(), end=end, file=sys.stderr, flush=True)
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        rate = self.bytes / elapsed
+        remaining = self.total_bytes - self.bytes
+        eta = _fmt_seconds(remaining / rate) if rate > 0 else "--:--"
+        return (f"[{self.files}/{self.total_files}] {self.files / elapsed:.1f} files/s, "
+                f"{rate / 1e6:.1f} MB/s, ETA {eta}")
+
+    def clear(self) -> None:
+        if self._tty:
+            print("\r\033[K", end="", file=sys.stderr, flush=True)
+
+def _fmt_seconds(seconds: float) -> str:
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02d}:{s:02d}"
+
+def clean_folder(root: Path, jobs: int, manifest_path: Path | None) -> int:
+    """Clean every supported file under root. Returns the number of failures."""
+    manifest = Manifest(manifest_path or root / MANIFEST_NAME, root)
+    files = list(iter_files(root))
+    if not files:
+        print(f"ℹ️ Nothing to clean. Supported: {'/'.join(sorted(e.lstrip('.') for e in supported()))}")
+        manifest.close()
+        return 0
+    todo = [p for p in files if not manifest.is_done(p)]
+    skipped = len(files) - len(todo)
+    if skipped:
+        print(f"• Skipping {skipped} file(s) already cleaned (see {manifest.path.name})")
+    if not todo:
+        manifest.close()
+        return 0
+
+    sizes = {p: p.stat().st_size for p in todo}
+    progress = Progress(len(todo), sum(sizes.values()))
+    failures: list[tuple[Path, str]] = []
+
+    def _done(path: Path, digest: str | None, error: str | None) -> None:
+        progress.clear()
+        if error is None:
+            manifest.record(path, digest)
+            print(f"✅ Cleaned: {path.relative_to(root)} → {_output_for(path).name}")
+        else:
+            failures.append((path, error))
+            print(f"❌ Failed to clean {path.relative_to(root)}: {error}")
+        progress.advance(sizes[path])
+
+    try:
+        if jobs <= 1:
+            for p in todo:
+                _done(*_clean_task(p, manifest.wants_digest(p)))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                for fut in as_completed([pool.submit(_clean_task, p, manifest.wants_digest(p)) for p in todo]):
+                    _done(*fut.result())
+    finally:
+        progress.clear()
+        manifest.close()
+
+    elapsed = time.monotonic() - progress.start
+    print(f"\nDone in {_fmt_seconds(elapsed)}: {progress.files - len(failures)} cleaned, "
+          f"{len(failures)} failed, {skipped} skipped ({progress.bytes / max(elapsed, 1e-9) / 1e6:.1f} MB/s)")
+    if failures:
+        print("Failures:")
+        for path, error in failures:
+            print(f"  {path.relative_to(root)}: {error}")
+    return len(failures)
+
 def main():
-    parser = argparse.ArgumentParser(description="Remove metadata from images and documents (no server needed).")
+    parser = argparse.ArgumentParser(description="Remove metadata from images, documents and videos (no server needed).")
     parser.add_argument("path", help="File or folder to clean")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Clean this many files at once (folder runs)")
+    parser.add_argument("--manifest", type=Path, help=f"Manifest file for folder runs (default: FOLDER/{MANIFEST_NAME})")
     args = parser.parse_args()
 
     root = Path(args.path).expanduser().resolve()
@@ -98,16 +259,13 @@ def main():
         print(f"❌ Not found: {root}")
         sys.exit(1)
 
-    check_exiftool()
+    check_tools()
 
-    any_done = False
-    for f in iter_files(root):
-        res = clean_one(f)
-        if res:
-            any_done = True
+    if root.is_dir():
+        sys.exit(1 if clean_folder(root, args.jobs, args.manifest) else 0)
 
-    if not any_done:
-        print("ℹ️ Nothing cleaned. Did you pass a supported file (jpg/png/gif/tiff/docx/xlsx/pdf)?")
+    if not clean_one(root):
+        print("ℹ️ Nothing cleaned. Did you pass a supported file (jpg/png/gif/tiff/webp/docx/xlsx/pdf/video)?")
 
 if __name__ == "__main__":
     main()
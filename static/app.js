@@ -53,6 +53,16 @@ const inferKind = (file) => {
     return 'other';
 };
 
+const escapeHtml = (text) => text.replace(/[&<>"']/g, c => `&#${c.charCodeAt(0)};`);
+
+// Reports are ExifTool JSON objects ({"EXIF:Artist": "...", ...}); shown one "Group:Tag: value" per line
+const fmtValue = (v) => (typeof v === 'object' ? JSON.stringify(v) : String(v));
+const fmtReport = (report) => {
+    if (typeof report === 'string') return report;
+    const lines = Object.entries(report).map(([tag, v]) => `${tag}: ${fmtValue(v)}`);
+    return lines.length ? lines.join('\n') : 'No metadata found.';
+};
+
 const iconFor = (kind) => (kind === 'image' ? '🖼️' : kind === 'video' ? '🎬' : '📁');
 
 const revokeURLs = (items) => {
@@ -132,11 +142,22 @@ const clearUI = () => {
     btnInspect.textContent = 'Inspect Original';
 };
 
+// Per-file outcome from the cleaning stream: a download link as soon as the file is done
+const fileState = (s) => {
+    if (!s.state) return '';
+    if (s.state.status === 'pending') return '<span class="state">…</span>';
+    if (s.state.status === 'failed') {
+        return `<span class="state failed" title="${escapeHtml(s.state.error.message)}">✖ ${escapeHtml(s.state.error.code)}</span>`;
+    }
+    return `<a class="state done" href="${s.state.download}" download="${escapeHtml(s.state.cleaned_name)}">⬇ ${fmtBytes(s.state.bytes_out)}</a>`;
+};
+
 const renderFileList = () => {
     fileListEl.innerHTML = selection.map((s, i) => `
         <li class="file-chip" data-idx="${i}">
             ${s.thumb || `<span class="thumb">${iconFor(s.kind)}</span>`}
             <span class="meta" title="${s.file.name}">${s.file.name} • ${fmtBytes(s.file.size)}</span>
+            ${fileState(s)}
             <button class="remove" title="Remove" aria-label="Remove ${s.file.name}">&times;</button>
         </li>`
     ).join('');
@@ -148,20 +169,23 @@ const updateInspectView = async (switchToTab = 'before') => {
 
     if (beforeReports.size === 0) {
         statusEl.textContent = 'Fetching original reports...';
-        await Promise.all(selection.map(async s => {
-            const formData = new FormData();
-            formData.append('upload', s.file);
-            try {
-                const res = await fetch('/inspect', { method: 'POST', body: formData });
-                const json = await res.json();
-                beforeReports.set(s.file.name, json.report || '');
-            } catch (e) {
-                beforeReports.set(s.file.name, `<Inspect failed: ${e.message}>`);
-            }
-        }));
+        // The whole selection in one request (and one ExifTool run on the server)
+        const formData = new FormData();
+        selection.forEach(s => formData.append('uploads', s.file));
+        try {
+            const res = await fetch('/inspect-batch', { method: 'POST', body: formData });
+            const json = await res.json();
+            if (!res.ok) throw new Error(json.detail || res.statusText);
+            json.items.forEach((item, i) => {
+                beforeReports.set(selection[i].file.name, item.report || `<Inspect failed: ${item.error}>`);
+            });
+        } catch (e) {
+            selection.forEach(s => beforeReports.set(s.file.name, `<Inspect failed: ${e.message}>`));
+        }
         statusEl.textContent = '';
     }
-    inspectBefore.textContent = beforeReports.get(selectedFile) || 'Report not available.';
+    const beforeReport = beforeReports.get(selectedFile);
+    inspectBefore.textContent = beforeReport ? fmtReport(beforeReport) : 'Report not available.';
     
     const cleanedName = cleanedMap.get(selectedFile);
     const afterTab = document.querySelector('.tab[data-tab="after"]');
@@ -173,17 +197,16 @@ const updateInspectView = async (switchToTab = 'before') => {
             try {
                 const res = await fetch(`/inspect-output/${encodeURIComponent(cleanedName)}`);
                 const json = await res.json();
-                afterReports.set(cleanedName, json.report || 'Failed to load report.');
+                afterReports.set(cleanedName, json.report || '<Failed to load report.>');
             } catch (e) {
                 afterReports.set(cleanedName, `<Inspect failed: ${e.message}>`);
             }
             statusEl.textContent = '';
         }
         
-        const beforeText = inspectBefore.textContent;
-        const afterText = afterReports.get(cleanedName) || '';
-        inspectAfter.textContent = afterText;
-        generateDiff(beforeText, afterText);
+        const afterReport = afterReports.get(cleanedName) || {};
+        inspectAfter.textContent = fmtReport(afterReport);
+        generateDiff(beforeReport || {}, afterReport);
         
         afterTab.disabled = false;
         diffTab.disabled = false;
@@ -204,18 +227,131 @@ const updateInspectView = async (switchToTab = 'before') => {
 };
 
 const generateDiff = (before, after) => {
-    const beforeLines = new Set(before.split('\n'));
-    const afterLines = new Set(after.split('\n'));
+    if (typeof before === 'string' || typeof after === 'string') {
+        inspectDiff.textContent = 'Diff not available.';
+        return;
+    }
+    // Compare tag by tag: removed tags, and tags whose value changed (old and new)
     let diffHtml = '';
-    beforeLines.forEach(line => {
-        if (line.trim() && !afterLines.has(line)) {
+    Object.entries(before).forEach(([tag, v]) => {
+        const line = escapeHtml(`${tag}: ${fmtValue(v)}`);
+        if (!(tag in after)) {
             diffHtml += `<span class="diff-line-removed">- ${line}</span>\n`;
+        } else if (fmtValue(after[tag]) !== fmtValue(v)) {
+            diffHtml += `<span class="diff-line-removed">- ${line}</span>\n`;
+            diffHtml += `<span class="diff-line-added">+ ${escapeHtml(`${tag}: ${fmtValue(after[tag])}`)}</span>\n`;
         }
     });
     if (!diffHtml) diffHtml = 'No metadata was removed.';
     inspectDiff.innerHTML = diffHtml;
 };
 
+// ---------- Resumable Uploads (large files) ----------
+// Files this big go up in chunks through /uploads (tus-style): several at once, retried
+// on errors, and resumed from what the server already has after a reload or a failed clean
+const RESUMABLE_THRESHOLD = 64 * 1024 * 1024;
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const PARALLEL_CHUNKS = 3;
+const MAX_CHUNK_ATTEMPTS = 6;
+const TUS_HEADERS = { 'Tus-Resumable': '1.0.0' };
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+const toBase64 = (text) => btoa(String.fromCharCode(...new TextEncoder().encode(text)));
+
+// Upload-Ranges "0-99,200-299" (inclusive) -> [[0, 100], [200, 300]]
+const parseRanges = (header) => (header || '').split(',').filter(Boolean).map(r => {
+    const [start, end] = r.split('-').map(Number);
+    return [start, end + 1];
+});
+
+const errorDetail = async (res) => {
+    const err = await res.json().catch(() => ({}));
+    return err.detail || res.statusText;
+};
+
+async function createUpload(file) {
+    const res = await fetch('/uploads', {
+        method: 'POST',
+        headers: { ...TUS_HEADERS, 'Upload-Length': String(file.size), 'Upload-Metadata': `filename ${toBase64(file.name)}` },
+    });
+    if (!res.ok) throw new Error(await errorDetail(res));
+    return res.headers.get('Location');
+}
+
+async function receivedRanges(url) {
+    const res = await fetch(url, { method: 'HEAD', headers: TUS_HEADERS });
+    return res.ok ? parseRanges(res.headers.get('Upload-Ranges')) : null; // null: expired or already used
+}
+
+const missingChunks = (size, ranges) => {
+    const chunks = [];
+    for (let start = 0; start < size; start += CHUNK_SIZE) {
+        const end = Math.min(start + CHUNK_SIZE, size);
+        if (!ranges.some(([a, b]) => a <= start && end <= b)) chunks.push([start, end]);
+    }
+    return chunks;
+};
+
+async function sendChunk(url, file, [start, end]) {
+    for (let attempt = 1; ; attempt++) {
+        let res = null;
+        try {
+            res = await fetch(url, {
+                method: 'PATCH',
+                body: file.slice(start, end),
+                headers: { ...TUS_HEADERS, 'Upload-Offset': String(start), 'Content-Type': 'application/offset+octet-stream' },
+            });
+        } catch {
+            // Network blip: retry below
+        }
+        if (res && res.ok) return;
+        if (res && res.status < 500) throw new Error(await errorDetail(res));
+        if (attempt >= MAX_CHUNK_ATTEMPTS) throw new Error(`Upload of ${file.name} interrupted; click Clean again to resume.`);
+        await sleep(Math.min(30000, 1000 * 2 ** attempt));
+    }
+}
+
+async function uploadResumable(file, onProgress) {
+    const key = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let url = localStorage.getItem(key);
+    let ranges = url ? await receivedRanges(url) : null;
+    if (!ranges) {
+        url = await createUpload(file);
+        localStorage.setItem(key, url);
+        ranges = [];
+    }
+    const todo = missingChunks(file.size, ranges);
+    let done = file.size - todo.reduce((n, [start, end]) => n + end - start, 0);
+    onProgress(done);
+    const worker = async () => {
+        while (todo.length) {
+            const chunk = todo.shift();
+            await sendChunk(url, file, chunk);
+            done += chunk[1] - chunk[0];
+            onProgress(done);
+        }
+    };
+    await Promise.all(Array.from({ length: PARALLEL_CHUNKS }, worker));
+    return { id: url.split('/').pop(), key };
+}
+
+// ---------- Streamed Cleaning Results ----------
+// /clean-batch/stream answers one JSON object per line: a "file" event per file as it
+// finishes, then "done" with the totals (and the ZIP link for several files)
+async function readEvents(response, onEvent) {
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(Boolean).forEach(line => onEvent(JSON.parse(line)));
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+}
+
 // ---------- File Selection & Handling ----------
 const handleFiles = (files) => {
     clearUI();
@@ -306,27 +442,70 @@ btnClean.addEventListener('click', async () => {
     btnClean.disabled = true;
 
     const formData = new FormData();
-    selection.forEach(s => formData.append('uploads', s.file));
+    const resumed = [];
+    const resumedItems = [];
+    const formItems = [];
     
     try {
-        const response = await fetch('/clean-batch', { method: 'POST', body: formData });
+        // Small files ride in the form; large ones are uploaded first and referenced by id
+        for (const s of selection) {
+            s.state = null;
+            if (s.file.size < RESUMABLE_THRESHOLD) {
+                formData.append('uploads', s.file);
+                formItems.push(s);
+                continue;
+            }
+            const { id, key } = await uploadResumable(s.file, (n) => {
+                statusEl.textContent = `Uploading ${s.file.name}: ${fmtBytes(n)} of ${fmtBytes(s.file.size)}...`;
+            });
+            formData.append('upload_ids', id);
+            resumed.push(key);
+            resumedItems.push(s);
+        }
+        // The server numbers files upload_ids first, then uploads
+        const order = [...resumedItems, ...formItems];
+        order.forEach(s => { s.state = { status: 'pending' }; });
+        renderFileList();
+        statusEl.textContent = `Cleaning ${selection.length} file(s)...`;
+
+        // A resumed upload is only used up once it is cleaned; until then the server keeps it
+        // and the next click cleans it again without uploading it again
+        const response = await fetch('/clean-batch/stream', { method: 'POST', body: formData });
         if (!response.ok) {
             const err = await response.json();
             throw new Error(err.detail || `Server error: ${response.statusText}`);
         }
-        
-        const result = await response.json();
-        result.items.forEach(item => cleanedMap.set(item.orig, item.cleaned_name));
 
-        // **FIX**: Correctly show single vs. batch download links
-        if (selection.length > 1) {
-            zipLink.href = result.zip_download;
-            zipLink.download = result.zip_download.split('/').pop();
+        let summary = null;
+        let finished = 0;
+        await readEvents(response, (event) => {
+            if (event.event === 'done') {
+                summary = event;
+                return;
+            }
+            const item = order[event.index];
+            if (item) item.state = event;
+            if (event.status !== 'failed') {
+                cleanedMap.set(event.orig, event.cleaned_name);
+                if (event.index < resumed.length) localStorage.removeItem(resumed[event.index]);
+            }
+            finished++;
+            statusEl.textContent = `Cleaned ${finished} of ${order.length} file(s)...`;
+            renderFileList();
+        });
+        if (!summary) throw new Error('Connection lost before the batch finished.');
+        if (!summary.count) throw new Error('All uploaded files were invalid or failed to process.');
+
+        // One file: its own link; several: the ZIP of everything that was cleaned
+        if (summary.zip_download) {
+            zipLink.href = summary.zip_download;
+            zipLink.download = summary.zip_filename;
             singleResult.classList.add('hidden');
             batchResult.classList.remove('hidden');
         } else {
-            downloadLink.href = result.download;
-            downloadLink.download = result.suggested_filename;
+            const cleanedItem = order.find(s => s.state && s.state.download);
+            downloadLink.href = cleanedItem.state.download;
+            downloadLink.download = cleanedItem.state.cleaned_name;
             singleResult.classList.remove('hidden');
             batchResult.classList.add('hidden');
         }
@@ -338,7 +517,7 @@ btnClean.addEventListener('click', async () => {
         hasCleaned = true; // **FIX**: Set clean status
         btnInspect.textContent = 'Inspect Results'; // **FIX**: Update button text
 
-        statusEl.textContent = 'Cleaning complete!';
+        statusEl.textContent = summary.failed ? `Cleaning complete (${summary.failed} failed).` : 'Cleaning complete!';
 
     } catch (error) {
         statusEl.textContent = `Error: ${error.message}`;
@@ -0,0 +1,15 @@
+"""
+Point DATA_DIR at a throwaway directory before any test imports app.settings,
+so uploads, outputs, job records, the cache and artifacts.db never land in
+the working tree. The directory itself does not exist yet: settings has to
+create it, as it would for DATA_DIR=/tmp/benchdata.
+"""
+import os
+import shutil
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="scrubber-tests-")
+os.environ["DATA_DIR"] = os.path.join(_DATA_DIR, "data")
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
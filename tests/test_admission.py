@@ -0,0 +1,86 @@
+"""
+Admission controller: per-type limits, shortest-first fast lane, byte budget,
+and 503 + Retry-After for new requests once the queue is full; a request let
+in gets all its files cleaned, however many.
+"""
+from io import BytesIO
+from fastapi.testclient import TestClient
+from PIL import Image
+import pytest
+from app.utils import admission
+from app.utils.admission import AdmissionController, Overloaded
+import app.server as server
+
+def _controller(**kw) -> AdmissionController:
+    opts = dict(limits={"image": 1, "video": 1}, max_bytes=10_000, fast_bytes=100, fast_slots=0, max_queue=10)
+    opts.update(kw)
+    return AdmissionController(**opts)
+
+def test_fast_lane_goes_first_smallest_first():
+    c = _controller()
+    big = c.request("image", 1000)
+    assert big.future.done()
+    waiting = [c.request("image", size) for size in (500, 50, 10)]
+    assert not any(t.future.done() for t in waiting)
+    order = []
+    running = big
+    for _ in waiting:
+        c.release(running)
+        running = next(t for t in waiting if t.future.done() and t.size not in order)
+        order.append(running.size)
+    assert order == [10, 50, 500]
+
+def test_types_are_limited_separately_and_fast_slots_bypass():
+    c = _controller(fast_slots=1)
+    assert c.request("video", 5000).future.done()
+    assert c.request("image", 2000).future.done()
+    assert not c.request("image", 3000).future.done()
+    assert c.request("image", 20).future.done()  # fast slot
+    assert not c.request("image", 30).future.done()
+
+def test_byte_budget():
+    c = _controller(limits={"image": 5}, max_bytes=1000)
+    first = c.request("image", 600)
+    second = c.request("image", 600)
+    assert first.future.done() and not second.future.done()
+    assert c.request("image", 50).future.done()
+    c.release(first)
+    assert second.future.done()
+    # Alone, a file over the whole budget still runs
+    c2 = _controller(max_bytes=1000)
+    assert c2.request("image", 5000).future.done()
+
+def test_new_requests_are_refused_when_saturated():
+    c = _controller(max_queue=1, max_wait=60)
+    c.admit_request()
+    c.request("video", 5000)
+    c.admit_request()  # running, nothing waiting
+    c.request("video", 5000)
+    with pytest.raises(Overloaded) as e:
+        c.admit_request()
+    assert e.value.retry_after >= 1
+
+    c = _controller(max_queue=10, max_wait=0)
+    c.request("video", 5000)
+    c.request("video", 5000)
+    with pytest.raises(Overloaded):
+        c.admit_request()  # the waiting file has been waiting too long
+
+def test_batch_larger_than_the_queue_is_cleaned(monkeypatch):
+    monkeypatch.setattr(admission, "_controller", _controller(max_queue=2, max_wait=0, fast_slots=0,
+                                                              limits={"image": 1}))
+    files = []
+    for i in range(6):
+        buf = BytesIO()
+        Image.new("L", (4, 4), i * 40).save(buf, format="PNG")
+        files.append(("uploads", (f"{i}.png", buf.getvalue(), "image/png")))
+    res = TestClient(server.app).post("/clean-batch", files=files)
+    assert res.status_code == 200 and res.json()["count"] == 6
+
+def test_server_returns_503_with_retry_after(monkeypatch):
+    monkeypatch.setattr(admission, "_controller", _controller(max_queue=0, limits={"image": 0}))
+    buf = BytesIO()
+    Image.new("RGB", (4, 4)).save(buf, format="PNG")
+    res = TestClient(server.app).post("/clean-batch", files=[("uploads", ("a.png", buf.getvalue(), "image/png"))])
+    assert res.status_code == 503
+    assert int(res.headers["retry-after"]) >= 1
@@ -0,0 +1,81 @@
+"""
+Cleaned-output cache: hits link the stored output without cleaning, the byte
+budget evicts least recently used entries, and nothing outlives RETENTION.
+"""
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+import os
+from fastapi.testclient import TestClient
+from PIL import Image
+import app.utils.cache as cache
+
+def _fresh_cache(monkeypatch, root: Path, max_bytes: int = 1 << 20) -> Path:
+    monkeypatch.setattr(cache, "CACHE_DIR", root)
+    monkeypatch.setattr(cache, "CACHE_MAX_BYTES", max_bytes)
+    monkeypatch.setattr(cache, "_entries", None)
+    monkeypatch.setattr(cache, "_stats", dict.fromkeys(cache._stats, 0))
+    return root
+
+def _output(path: Path, size: int) -> Path:
+    path.write_bytes(os.urandom(size))
+    return path
+
+def test_hit_links_stored_output(tmp_path: Path, monkeypatch):
+    _fresh_cache(monkeypatch, tmp_path / "cache").mkdir()
+    key = cache.cache_key("ab" * 32, ".png")
+    assert not cache.fetch(key, tmp_path / "first.png")
+    out = _output(tmp_path / "first.png", 100)
+    cache.store(key, out)
+
+    assert cache.fetch(key, tmp_path / "again.png")
+    assert (tmp_path / "again.png").read_bytes() == out.read_bytes()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    # Same content under different settings/extension is a different entry
+    assert cache.cache_key("ab" * 32, ".jpg") != key
+
+def test_pdf_engine_is_part_of_the_key(monkeypatch):
+    from app.cleaners import registry
+    keys = set()
+    for engine in ("pikepdf", "pypdf"):
+        monkeypatch.setattr(registry, "PDF_ENGINE", engine)
+        keys.add(cache.cache_key("ab" * 32, ".pdf"))
+    assert len(keys) == 2
+
+def test_lru_eviction_respects_budget(tmp_path: Path, monkeypatch):
+    _fresh_cache(monkeypatch, tmp_path / "cache", max_bytes=250).mkdir()
+    keys = [cache.cache_key(f"{i:064x}", ".png") for i in range(3)]
+    cache.store(keys[0], _output(tmp_path / "0.png", 100))
+    cache.store(keys[1], _output(tmp_path / "1.png", 100))
+    assert cache.fetch(keys[0], tmp_path / "touch.png")  # 0 is now most recently used
+    cache.store(keys[2], _output(tmp_path / "2.png", 100))
+
+    assert cache.fetch(keys[0], tmp_path / "a.png")
+    assert not cache.fetch(keys[1], tmp_path / "b.png")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= 250
+
+def test_entries_expire_with_retention(tmp_path: Path, monkeypatch):
+    root = _fresh_cache(monkeypatch, tmp_path / "cache")
+    root.mkdir()
+    key = cache.cache_key("cd" * 32, ".png")
+    cache.store(key, _output(tmp_path / "x.png", 10))
+    monkeypatch.setattr(cache, "RETENTION", timedelta(seconds=0))
+    assert not cache.fetch(key, tmp_path / "y.png")
+    cache.sweep()
+    assert not any(root.iterdir())
+
+def test_repeat_upload_is_served_from_cache(tmp_path: Path, monkeypatch):
+    import app.server as server
+    _fresh_cache(monkeypatch, tmp_path)
+    buf = BytesIO()
+    Image.frombytes("RGB", (8, 8), os.urandom(8 * 8 * 3)).save(buf, format="PNG")
+    client = TestClient(server.app)
+    files = [("uploads", ("dup.png", buf.getvalue(), "image/png"))]
+
+    first = client.post("/clean-batch", files=files).json()
+    second = client.post("/clean-batch", files=files).json()
+    assert first["items"][0]["cached"] is False
+    assert second["items"][0]["cached"] is True
+    assert client.get(second["download"]).content == client.get(first["download"]).content
@@ -0,0 +1,61 @@
+"""
+Expiry index: files are deleted when their registered deadline passes, the
+sweep never looks at unregistered files, and startup reconciliation indexes
+whatever is already on disk.
+"""
+from pathlib import Path
+import os
+import time
+import app.utils.artifacts as artifacts
+import app.utils.cleanup as cleanup
+
+def _use_index(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(artifacts, "ARTIFACT_INDEX", tmp_path / "artifacts.db")
+
+def test_only_expired_entries_are_deleted(tmp_path: Path, monkeypatch):
+    _use_index(monkeypatch, tmp_path)
+    old, fresh, unknown = (tmp_path / n for n in ("old.jpg", "fresh.jpg", "unknown.jpg"))
+    for p in (old, fresh, unknown):
+        p.write_bytes(b"x")
+    artifacts.register(old, deadline=time.time() - 1)
+    artifacts.register(fresh)
+
+    assert cleanup.cleanup_once() == 1
+    assert not old.exists()
+    assert fresh.exists() and unknown.exists()
+    assert artifacts.next_deadline() > time.time()
+
+def test_expired_rows_are_claimed_once(tmp_path: Path, monkeypatch):
+    _use_index(monkeypatch, tmp_path)
+    artifacts.register(tmp_path / "a", deadline=1.0)
+    assert artifacts.claim_expired() == [tmp_path / "a"]
+    assert artifacts.claim_expired() == []
+
+def test_reconcile_indexes_existing_files(tmp_path: Path, monkeypatch):
+    _use_index(monkeypatch, tmp_path)
+    for name in ("UPLOAD_DIR", "OUTPUT_DIR", "JOBS_DIR", "CACHE_DIR", "BATCH_DIR", "REPORT_DIR"):
+        d = tmp_path / name
+        d.mkdir()
+        monkeypatch.setattr(cleanup, name, d)
+    stale = tmp_path / "UPLOAD_DIR" / "stale.png"
+    stale.write_bytes(b"x")
+    os.utime(stale, (0, 0))
+    kept = tmp_path / "OUTPUT_DIR" / "kept.png"
+    kept.write_bytes(b"x")
+    artifacts.register(kept)
+
+    assert cleanup.reconcile() == 1
+    cleanup.cleanup_once()
+    assert not stale.exists() and kept.exists()
+
+def test_held_files_outlive_retention_until_released(tmp_path: Path, monkeypatch):
+    _use_index(monkeypatch, tmp_path)
+    busy = tmp_path / "busy.mp4"
+    busy.write_bytes(b"x")
+    later = time.time() + artifacts.RETENTION.total_seconds() + 60
+    with artifacts.held(busy):
+        # A clean running past RETENTION keeps its file
+        assert busy not in artifacts.claim_expired(now=later)
+    # Released: RETENTION counts from now
+    assert artifacts.claim_expired(now=time.time() + 1) == []
+    assert artifacts.claim_expired(now=later) == [busy]
@@ -0,0 +1,82 @@
+"""
+Folder runs of scripts/cli_clean.py: the manifest lets a rerun skip what is
+already done, re-cleans files that changed, and shrugs off a torn line.
+The cleaner is a stand-in, so no external tools are needed.
+"""
+from pathlib import Path
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+_SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "cli_clean.py"
+_spec = importlib.util.spec_from_file_location("cli_clean", _SCRIPT)
+cli = importlib.util.module_from_spec(_spec)
+sys.modules["cli_clean"] = cli
+_spec.loader.exec_module(cli)
+
+@pytest.fixture
+def cleaned(monkeypatch):
+    """Names of the files the stand-in cleaner was called on, in order."""
+    calls = []
+
+    def fake_clean(src: Path, dst: Path) -> None:
+        calls.append(src.name)
+        if src.name == "stop.png":
+            raise KeyboardInterrupt  # the user gives up halfway
+        dst.write_bytes(src.read_bytes())
+
+    monkeypatch.setattr(cli, "choose_cleaner", lambda ext: fake_clean)
+    return calls
+
+def _folder(tmp_path: Path, *names: str) -> Path:
+    for name in names:
+        (tmp_path / name).write_bytes(name.encode())
+    return tmp_path
+
+def test_rerun_after_interruption_skips_finished_files(tmp_path: Path, cleaned):
+    root = _folder(tmp_path, "a.png", "b.png", "stop.png")
+    with pytest.raises(KeyboardInterrupt):
+        cli.clean_folder(root, 1, None)
+    done = cleaned[:-1]
+    assert cleaned[-1] == "stop.png" and all((root / f"{n[:-4]}_clean.png").exists() for n in done)
+
+    (root / "stop.png").rename(root / "c.png")
+    cleaned.clear()
+    assert cli.clean_folder(root, 1, None) == 0
+    assert sorted(cleaned) == sorted({"a.png", "b.png", "c.png"} - set(done))
+
+def test_changed_file_is_cleaned_again(tmp_path: Path, cleaned, monkeypatch):
+    root = _folder(tmp_path, "a.png")
+    cli.clean_folder(root, 1, None)
+    hashed = []
+    real_sha256 = cli._sha256
+    monkeypatch.setattr(cli, "_sha256", lambda p: hashed.append(p.name) or real_sha256(p))
+
+    # Same size, new mtime and content: cleaned again, hashed now that it has been seen before
+    (root / "a.png").write_bytes(b"A.png")
+    st = (root / "a.png").stat()
+    os.utime(root / "a.png", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    cli.clean_folder(root, 1, None)
+    assert cleaned == ["a.png", "a.png"]
+    assert (root / "a_clean.png").read_bytes() == b"A.png"
+
+    # Only touched: the hash matches, so it is skipped
+    os.utime(root / "a.png", ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10**9))
+    cli.clean_folder(root, 1, None)
+    assert cleaned == ["a.png", "a.png"]
+    assert hashed == ["a.png", "a.png"]  # once while re-cleaning, once to recognise the touch
+
+def test_corrupt_manifest_line_is_ignored(tmp_path: Path, cleaned):
+    root = _folder(tmp_path, "a.png", "b.png")
+    cli.clean_folder(root, 1, None)
+    manifest = root / cli.MANIFEST_NAME
+    lines = manifest.read_text(encoding="utf-8").splitlines()
+    torn = json.loads(lines[1])["src"]
+    manifest.write_text(lines[0] + "\n" + lines[1][:10] + "\n", encoding="utf-8")  # torn second record
+
+    cleaned.clear()
+    assert cli.clean_folder(root, 1, None) == 0
+    assert cleaned == [torn]
@@ -0,0 +1,80 @@
+"""
+/download/{name}: byte ranges, multipart ranges, ETag and conditional GETs.
+"""
+import os
+import uuid
+from fastapi.testclient import TestClient
+import pytest
+import app.server as server
+
+client = TestClient(server.app)
+
+@pytest.fixture
+def output():
+    name = f"{uuid.uuid4().hex}_clip_clean.mp4"
+    path = server.OUTPUT_DIR / name
+    path.write_bytes(bytes(range(256)) * 40)  # 10240 bytes
+    yield name, path.read_bytes()
+    path.unlink(missing_ok=True)
+
+def test_full_download_has_validators(output):
+    name, data = output
+    res = client.get(f"/download/{name}")
+    assert res.status_code == 200 and res.content == data
+    assert res.headers["content-type"] == "video/mp4"
+    assert res.headers["accept-ranges"] == "bytes"
+    etag = res.headers["etag"]
+    assert not etag.startswith("W/")
+    assert client.get(f"/download/{name}", headers={"If-None-Match": etag}).status_code == 304
+
+def test_single_and_suffix_ranges(output):
+    name, data = output
+    res = client.get(f"/download/{name}", headers={"Range": "bytes=100-199"})
+    assert res.status_code == 206
+    assert res.headers["content-range"] == f"bytes 100-199/{len(data)}"
+    assert res.content == data[100:200]
+    res = client.get(f"/download/{name}", headers={"Range": "bytes=-10"})
+    assert res.content == data[-10:]
+    res = client.get(f"/download/{name}", headers={"Range": f"bytes={len(data)}-"})
+    assert res.status_code == 416
+    assert res.headers["content-range"] == f"bytes */{len(data)}"
+
+def test_multipart_ranges(output):
+    name, data = output
+    res = client.get(f"/download/{name}", headers={"Range": "bytes=0-9, 500-509, 5-12"})
+    assert res.status_code == 206
+    boundary = res.headers["content-type"].split("boundary=")[1]
+    assert int(res.headers["content-length"]) == len(res.content)
+    parts = res.content.split(f"--{boundary}".encode())[1:-1]
+    assert len(parts) == 2  # 0-9 and 5-12 merged
+    assert parts[0].endswith(b"\r\n\r\n" + data[0:13] + b"\r\n")
+    assert b"Content-Range: bytes 500-509/" in parts[1]
+    assert parts[1].endswith(b"\r\n\r\n" + data[500:510] + b"\r\n")
+
+def test_if_range_mismatch_sends_whole_file(output):
+    name, data = output
+    etag = client.get(f"/download/{name}").headers["etag"]
+    res = client.get(f"/download/{name}", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert res.status_code == 206
+    os.utime(server.OUTPUT_DIR / name, ns=(0, 10**18))
+    res = client.get(f"/download/{name}", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert res.status_code == 200 and res.content == data
+
+def test_zero_copy_send_reaches_the_server(output):
+    import asyncio
+    name, data = output
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": f"/download/{name}", "raw_path": f"/download/{name}".encode(), "query_string": b"",
+             "root_path": "", "headers": [(b"host", b"test")], "client": ("test", 1), "server": ("test", 80),
+             "extensions": {"http.response.pathsend": {}}}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(server.app(scope, receive, send))
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.pathsend"]
+    assert sent[1]["path"] == str(server.OUTPUT_DIR / name)
@@ -0,0 +1,36 @@
+"""
+Executor routing: with CLEANER_EXECUTOR=auto only PDFs go to the process
+pool (images share the server's ExifTool pool from a thread), and concurrent
+submissions each get their own file back. No exiftool needed: PNGs take the
+native path.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+import app.utils.executor as executor
+
+def test_auto_routes_only_pdf_to_processes(monkeypatch):
+    monkeypatch.setattr(executor, "CLEANER_EXECUTOR", "auto")
+    try:
+        for kind in ("image", "video", "office"):
+            assert isinstance(executor._executor_for(kind), ThreadPoolExecutor)
+        assert isinstance(executor._executor_for("pdf"), ProcessPoolExecutor)
+        monkeypatch.setattr(executor, "CLEANER_EXECUTOR", "thread")
+        assert isinstance(executor._executor_for("pdf"), ThreadPoolExecutor)
+    finally:
+        executor.shutdown_executors()
+
+def test_concurrent_cleans_keep_their_own_results():
+    colors = [(i * 40, 255 - i * 40, 7) for i in range(6)]
+    pngs = []
+    for color in colors:
+        buf = BytesIO()
+        Image.new("RGB", (8, 8), color).save(buf, format="PNG")
+        pngs.append(buf.getvalue())
+    try:
+        futures = [executor.submit_clean_bytes("image", data, ".png") for data in pngs]
+        for color, future in zip(colors, futures):
+            with Image.open(BytesIO(future.result(timeout=30))) as im:
+                assert im.getpixel((0, 0)) == color
+    finally:
+        executor.shutdown_executors()
@@ -0,0 +1,80 @@
+"""
+These tests assume exiftool is installed on the system.
+They exercise the shared -stay_open pool directly: framing, recovery after a
+worker dies, and the bound on concurrent processes.
+"""
+from pathlib import Path
+import subprocess
+import threading
+from PIL import Image
+from app.utils.exiftool import ExifToolPool
+
+def test_pool_runs_commands_back_to_back(tmp_path: Path):
+    img = tmp_path / "a.jpg"
+    Image.new("RGB", (8, 8)).save(img)
+    pool = ExifToolPool(size=1, timeout=30)
+    try:
+        ver = pool.run(["-ver"]).stdout.strip()
+        assert ver
+        # Each reply must belong to its own request
+        for _ in range(3):
+            out = pool.run([str(img)]).stdout
+            assert b"File Size" in out
+            assert b"{ready" not in out
+    finally:
+        pool.close()
+
+def test_pool_replaces_dead_worker():
+    pool = ExifToolPool(size=1, timeout=30)
+    try:
+        pool.run(["-ver"])
+        pool._idle[0].proc.kill()
+        pool._idle[0].proc.wait()
+        assert pool.run(["-ver"]).returncode == 0
+    finally:
+        pool.close()
+
+def test_pool_reports_errors_like_subprocess(tmp_path: Path):
+    pool = ExifToolPool(size=1, timeout=30)
+    try:
+        try:
+            pool.run([str(tmp_path / "missing.jpg")])
+        except subprocess.CalledProcessError as e:
+            assert e.returncode != 0
+        else:
+            raise AssertionError("expected CalledProcessError")
+    finally:
+        pool.close()
+
+def test_pool_is_bounded():
+    pool = ExifToolPool(size=2, timeout=30)
+    pids = set()
+    lock = threading.Lock()
+    real_checkout = pool._checkout
+
+    def tracking_checkout():
+        w = real_checkout()
+        with lock:
+            pids.add(w.proc.pid)
+        return w
+
+    pool._checkout = tracking_checkout
+    errors = []
+
+    def run():
+        try:
+            pool.run(["-ver"])
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]  # e.g. no exiftool: the bound below would hold vacuously
+        assert 1 <= len(pids) <= 2
+    finally:
+        pool.close()
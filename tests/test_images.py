@@ -33,3 +33,96 @@ def test_jpeg_clean_tmp(tmp_path: Path):
 
     # Should have no metadata now
     assert _has_metadata(dst) is False
+
+def _jpeg_with_metadata(path: Path, **save_kwargs) -> None:
+    im = Image.new("RGB", (64, 48))
+    im.putdata([((x * 7) % 256, (y * 5) % 256, (x * y) % 256) for y in range(48) for x in range(64)])
+    exif = Image.Exif()
+    exif[0x013B] = "Alice"  # Artist
+    im.save(path, exif=exif.tobytes(), comment=b"secret note",
+            icc_profile=b"\0" * 128, **save_kwargs)
+
+def test_native_jpeg_strip_keeps_pixels(tmp_path: Path):
+    from app.cleaners.jpeg import clean_jpeg
+    for progressive in (False, True):
+        src = tmp_path / f"p{progressive}.jpg"
+        dst = tmp_path / f"p{progressive}_clean.jpg"
+        _jpeg_with_metadata(src, progressive=progressive)
+        with open(src, "ab") as f:
+            f.write(b"trailing data after EOI")
+
+        clean_jpeg(src, dst)
+
+        data = dst.read_bytes()
+        assert b"Alice" not in data and b"secret note" not in data
+        assert data.endswith(b"\xff\xd9")
+        with Image.open(src) as a, Image.open(dst) as b:
+            assert "icc_profile" not in b.info and "comment" not in b.info
+            assert not b.getexif()
+            assert a.tobytes() == b.tobytes()
+
+def test_native_jpeg_strip_can_keep_icc(tmp_path: Path):
+    from app.cleaners.jpeg import strip_jpeg
+    src = tmp_path / "icc.jpg"
+    dst = tmp_path / "icc_clean.jpg"
+    _jpeg_with_metadata(src)
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        strip_jpeg(fin, fout, keep_icc=True)
+    with Image.open(dst) as im:
+        assert im.info.get("icc_profile") == b"\0" * 128
+        assert not im.getexif()
+
+def test_native_jpeg_strip_rejects_garbage(tmp_path: Path):
+    from app.cleaners.jpeg import clean_jpeg, JpegFormatError
+    src = tmp_path / "bad.jpg"
+    src.write_bytes(b"\xff\xd8\xff\xe0\x00")
+    try:
+        clean_jpeg(src, tmp_path / "bad_clean.jpg")
+    except JpegFormatError:
+        pass
+    else:
+        raise AssertionError("expected JpegFormatError")
+
+def test_native_png_strip_copies_image_data(tmp_path: Path):
+    from PIL import PngImagePlugin
+    from app.cleaners.png import clean_png
+    src = tmp_path / "shot.png"
+    dst = tmp_path / "shot_clean.png"
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Author", "Dave")
+    info.add_itxt("Comment", "private", zip=True)
+    im = Image.new("RGBA", (40, 30), color=(1, 2, 3, 128))
+    exif = Image.Exif()
+    exif[0x013B] = "Dave"
+    im.save(src, pnginfo=info, exif=exif.tobytes(), dpi=(72, 72))
+    with open(src, "ab") as f:
+        f.write(b"trailing")
+
+    clean_png(src, dst)
+
+    data = dst.read_bytes()
+    assert b"Dave" not in data and b"private" not in data
+    assert data.endswith(b"IEND\xaeB`\x82")
+    # IDAT is copied, not re-deflated
+    def idat(b: bytes) -> bytes:
+        return b[b.index(b"IDAT") - 4:b.index(b"IEND")]
+    assert idat(data) == idat(src.read_bytes())
+    with Image.open(dst) as out:
+        assert not out.text and "exif" not in out.info
+        assert out.tobytes() == im.tobytes()
+
+def test_native_webp_strip_keeps_pixels(tmp_path: Path):
+    src, dst = tmp_path / "a.webp", tmp_path / "a_clean.webp"
+    im = Image.new("RGBA", (40, 30), (10, 200, 30, 128))
+    exif = Image.Exif()
+    exif[0x013B] = "Alice"  # Artist
+    im.save(src, exif=exif.tobytes(), xmp=b"<x:xmpmeta>secret</x:xmpmeta>", icc_profile=b"\0" * 128, lossless=True)
+
+    clean_image(src, dst)
+
+    data = dst.read_bytes()
+    assert b"Alice" not in data and b"xmpmeta" not in data and b"ICCP" not in data
+    assert data[20] & 0x2C == 0  # VP8X: ICC, EXIF and XMP flags cleared
+    assert int.from_bytes(data[4:8], "little") + 8 == len(data)
+    with Image.open(src) as a, Image.open(dst) as b:
+        assert list(a.getdata()) == list(b.getdata())
@@ -0,0 +1,55 @@
+"""
+JSON inspection: one ExifTool call per batch, repeat uploads served from the
+report cache, and the after-report made on the first ask, then kept.
+"""
+from io import BytesIO
+from fastapi.testclient import TestClient
+from PIL import Image
+import app.server as server
+from app.utils import reports
+
+client = TestClient(server.app)
+
+def _png(color: int) -> bytes:
+    buf = BytesIO()
+    Image.new("L", (8, 8), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+def _count_calls(monkeypatch) -> list:
+    calls = []
+    real = reports.read_reports
+
+    def counting(paths):
+        calls.append(len(paths))
+        return real(paths)
+
+    monkeypatch.setattr(reports, "read_reports", counting)
+    return calls
+
+def test_inspect_batch_one_call_then_cached(monkeypatch):
+    calls = _count_calls(monkeypatch)
+    files = [("uploads", ("a.png", _png(1), "image/png")), ("uploads", ("b.png", _png(2), "image/png"))]
+    res = client.post("/inspect-batch", files=files)
+    assert res.status_code == 200
+    items = res.json()["items"]
+    assert [i["name"] for i in items] == ["a.png", "b.png"]
+    assert all(isinstance(i["report"], dict) and "SourceFile" not in i["report"] for i in items)
+    assert calls == [2]
+
+    res = client.post("/inspect", files={"upload": ("again.png", _png(2), "image/png")})
+    assert res.json()["report"] == items[1]["report"]
+    assert calls == [2]
+    assert not list(server.UPLOAD_DIR.glob("inspect_*"))
+
+def test_after_report_made_on_first_ask(monkeypatch):
+    calls = _count_calls(monkeypatch)
+    res = client.post("/clean-batch", files=[("uploads", ("c.png", _png(3), "image/png"))])
+    name = res.json()["items"][0]["cleaned_name"]
+    assert calls == []  # cleaning doesn't wait for ExifTool
+    for _ in range(2):
+        res = client.get(f"/inspect-output/{name}")
+        assert res.status_code == 200 and isinstance(res.json()["report"], dict)
+    assert calls == [1]
+    path = reports.report_path(server.OUTPUT_DIR / name)
+    assert path.is_file() and path.parent != server.OUTPUT_DIR
+    assert client.get(f"/download/{path.name}").status_code == 404
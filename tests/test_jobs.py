@@ -0,0 +1,116 @@
+"""
+Job records must survive a restart: an unfinished job left behind by a dead
+server process is adopted and driven to a terminal state by resume_jobs().
+A job running past RETENTION keeps its record, queued uploads and outputs
+until it ends. Cleaning is faked, so no exiftool is needed.
+"""
+from concurrent.futures import Future
+from pathlib import Path
+import json
+import threading
+import time
+import app.jobs as jobs
+import app.utils.artifacts as artifacts
+
+def _use_tmp(monkeypatch, tmp_path: Path) -> None:
+    for name in ("JOBS_DIR", "UPLOAD_DIR", "OUTPUT_DIR"):
+        monkeypatch.setattr(jobs, name, tmp_path)
+    monkeypatch.setattr(jobs, "_OWNERS_DIR", tmp_path / "owners")
+    monkeypatch.setattr(artifacts, "ARTIFACT_INDEX", tmp_path / "artifacts.db")
+    monkeypatch.setattr(jobs, "_pool", None)
+
+def _fake_clean(gate: threading.Event):
+    def submit(cleaner, src: Path, dst: Path) -> Future:
+        gate.wait(10)
+        data = src.read_bytes()
+        if data == b"bad":
+            raise ValueError("corrupt file")
+        dst.write_bytes(data)
+        done = Future()
+        done.set_result(None)
+        return done
+    return submit
+
+def _entries(tmp_path: Path, *contents: bytes) -> list[tuple]:
+    entries = []
+    for i, data in enumerate(contents):
+        src = tmp_path / f"up{i}.jpg"
+        src.write_bytes(data)
+        entries.append((f"f{i}.jpg", "image", src, tmp_path / f"f{i}_clean.jpg", None))
+    return entries
+
+def _wait_for(check, timeout: float = 10) -> None:
+    end = time.time() + timeout
+    while not check():
+        assert time.time() < end, "timed out"
+        time.sleep(0.02)
+
+def _deadline(path: Path) -> float:
+    return artifacts._conn().execute("SELECT deadline FROM artifacts WHERE path = ?", (str(path),)).fetchone()[0]
+
+def test_orphaned_job_is_resumed(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_DIR", tmp_path)
+    monkeypatch.setattr(jobs, "_OWNERS_DIR", tmp_path / "owners")
+    monkeypatch.setattr(jobs, "UPLOAD_DIR", tmp_path)
+    record = {
+        "id": "a" * 32, "created": time.time(), "state": "running", "owner": "gone",
+        "files": [{"orig": "x.jpg", "cleaner": "image", "src": "missing.jpg", "dst": "x_clean.jpg",
+                   "state": "running", "queued": time.time(), "started": time.time(),
+                   "finished": None, "error": None}],
+    }
+    (tmp_path / f"{record['id']}.json").write_text(json.dumps(record))
+
+    assert jobs.resume_jobs() == 1
+    for _ in range(50):
+        job = jobs.get_job(record["id"])
+        if job["state"] == "failed":
+            break
+        time.sleep(0.05)
+    view = jobs.public_view(job)
+    assert view["state"] == "failed"
+    assert "expired" in view["files"][0]["error"]
+    # The adopted record on disk now names this process as owner
+    assert json.loads((tmp_path / f"{record['id']}.json").read_text())["owner"] == jobs._OWNER
+
+def test_long_job_keeps_its_files_until_it_ends(tmp_path: Path, monkeypatch):
+    _use_tmp(monkeypatch, tmp_path)
+    monkeypatch.setattr(jobs, "JOB_WORKERS", 1)
+    gate = threading.Event()
+    monkeypatch.setattr(jobs, "submit_clean", _fake_clean(gate))
+    entries = _entries(tmp_path, b"first", b"second")
+    job = jobs.submit_job(entries)
+    record = tmp_path / f"{job['id']}.json"
+    retention = artifacts.RETENTION.total_seconds()
+    try:
+        _wait_for(lambda: jobs.get_job(job["id"])["files"][0]["state"] == "running")
+        # The first clean runs "past RETENTION": the record, the queued upload and the output
+        # being written must all still be there when it ends
+        later = time.time() + retention + 60
+        for path in (record, entries[1][2], entries[0][3]):
+            assert _deadline(path) > later
+    finally:
+        gate.set()
+    _wait_for(lambda: jobs.get_job(job["id"])["state"] == "done")
+    assert job["id"] not in jobs._jobs  # finished jobs are served from their record
+    for path in (record, entries[0][3], entries[1][3]):
+        assert _deadline(path) <= time.time() + retention
+    jobs.shutdown_jobs()
+
+def test_job_states_when_files_fail(tmp_path: Path, monkeypatch):
+    _use_tmp(monkeypatch, tmp_path)
+    gate = threading.Event()
+    gate.set()
+    monkeypatch.setattr(jobs, "submit_clean", _fake_clean(gate))
+    mixed = jobs.submit_job(_entries(tmp_path, b"good", b"bad"))
+    _wait_for(lambda: jobs.get_job(mixed["id"])["state"] in jobs._TERMINAL)
+    view = jobs.public_view(jobs.get_job(mixed["id"]))
+    assert view["state"] == "done"
+    assert [f["state"] for f in view["files"]] == ["done", "failed"]
+    assert view["files"][0]["download"] == "/download/f0_clean.jpg"
+    assert view["files"][1]["error"] == "corrupt file"
+    assert not (tmp_path / "f1_clean.jpg").exists()
+
+    failed = jobs.submit_job(_entries(tmp_path, b"bad"))
+    _wait_for(lambda: jobs.get_job(failed["id"])["state"] in jobs._TERMINAL)
+    assert jobs.get_job(failed["id"])["state"] == "failed"
+    jobs.shutdown_jobs()
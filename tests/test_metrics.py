@@ -0,0 +1,58 @@
+"""
+Metrics registry: text exposition, capture/replay across processes, and
+/metrics after a real clean (PNG, which the native stripper handles).
+"""
+from io import BytesIO
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.utils import metrics
+import app.server as server
+
+@pytest.fixture(autouse=True)
+def _forget_test_metrics():
+    # Metrics register themselves globally; don't leave ours in every later /metrics scrape
+    yield
+    for name in [n for n in metrics._metrics if n.startswith("test_")]:
+        metrics._metrics.pop(name)
+
+def test_histogram_and_counter_render():
+    h = metrics.Histogram("test_latency_seconds", "Test histogram.", ("stage",), buckets=(0.1, 1))
+    c = metrics.Counter("test_things_total", "Test counter.", ("kind",))
+    h.observe(0.05, stage="a")
+    h.observe(5, stage="a")
+    c.inc(kind='x"y')
+    text = metrics.render()
+    assert "# TYPE test_latency_seconds histogram" in text
+    assert 'test_latency_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{stage="a"} 2' in text
+    assert 'test_things_total{kind="x\\"y"} 1' in text
+
+def test_capture_and_replay():
+    c = metrics.Counter("test_replayed_total", "Test counter.")
+    g = metrics.Gauge("test_replayed_level", "Test gauge.")
+    events = []
+    with metrics.capture(events):
+        c.inc(3)
+        g.set(7)
+    text = metrics.render()
+    assert "test_replayed_total 3" not in text and "test_replayed_level 7" not in text
+    metrics.replay(events)
+    text = metrics.render()
+    assert "test_replayed_total 3" in text and "test_replayed_level 7" in text
+
+def test_metrics_endpoint_after_clean():
+    buf = BytesIO()
+    Image.new("RGB", (8, 8)).save(buf, format="PNG")
+    client = TestClient(server.app)
+    assert client.post("/clean-batch", files=[("uploads", ("a.png", buf.getvalue(), "image/png"))]).status_code == 200
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = res.text
+    assert 'scrubber_stage_seconds_count{stage="upload"}' in text
+    assert "scrubber_cleans_total{cleaner=\"image\"" in text
+    assert 'scrubber_http_request_seconds_count{route="/clean-batch",method="POST"}' in text
+    assert 'scrubber_dir_files{dir="outputs"}' in text
+    assert "scrubber_cache_entries" in text
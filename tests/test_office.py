@@ -43,3 +43,80 @@ def test_docx_clean(tmp_path: Path):
     except Exception:
         # If invalid OOXML, ignore for MVP; see note above.
         pass
+
+_CT = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/comments.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.comments+xml"/>
+<Override PartName="/docProps/core.xml" ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>
+</Types>"""
+
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" Target="docProps/core.xml"/>
+<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/thumbnail" Target="docProps/thumbnail.jpeg"/>
+</Relationships>"""
+
+_DOC_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/comments" Target="comments.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" Target="media/image1.png"/>
+</Relationships>"""
+
+def _make_docx(path: Path) -> None:
+    import zipfile
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _CT)
+        z.writestr("_rels/.rels", _ROOT_RELS)
+        z.writestr("docProps/core.xml", "<cp:coreProperties><dc:creator>Bob</dc:creator></cp:coreProperties>")
+        z.writestr("docProps/thumbnail.jpeg", b"\xff\xd8 first page of Bob's draft")
+        z.writestr("word/document.xml", "<w:document>" + "hello " * 2000 + "</w:document>")
+        z.writestr("word/_rels/document.xml.rels", _DOC_RELS)
+        z.writestr("word/comments.xml", "<w:comments>Bob was here</w:comments>")
+        z.writestr("word/media/image1.png", b"\x89PNG fake image bytes" * 50, compress_type=zipfile.ZIP_STORED)
+
+def test_docx_rewrite_drops_parts_and_copies_rest_raw(tmp_path: Path):
+    import zipfile
+    src = tmp_path / "b.docx"
+    dst = tmp_path / "b_clean.docx"
+    _make_docx(src)
+
+    clean_office(src, dst)
+
+    with zipfile.ZipFile(src) as zs, zipfile.ZipFile(dst) as zd:
+        assert zd.testzip() is None
+        names = set(zd.namelist())
+        assert not any(n.startswith("docProps/") for n in names) and "word/comments.xml" not in names
+        assert {"word/document.xml", "word/media/image1.png"} <= names
+        # Kept members carry the original compressed bytes
+        for name in ("word/document.xml", "word/media/image1.png"):
+            a, b = zs.getinfo(name), zd.getinfo(name)
+            assert (a.CRC, a.compress_size, a.compress_type) == (b.CRC, b.compress_size, b.compress_type)
+        ct = zd.read("[Content_Types].xml").decode()
+        assert "/word/comments.xml" not in ct and "/docProps/core.xml" not in ct
+        assert "/word/document.xml" in ct
+        assert "docProps/" not in zd.read("_rels/.rels").decode()
+        doc_rels = zd.read("word/_rels/document.xml.rels").decode()
+        assert "comments.xml" not in doc_rels and "media/image1.png" in doc_rels
+        assert b"Bob" not in dst.read_bytes()
+
+def test_zip64_records_are_written_when_needed(tmp_path: Path, monkeypatch):
+    import zipfile
+    from app.cleaners import office
+    # Treat every size, offset and count as too large for the classic fields
+    monkeypatch.setattr(office, "_ZIP64_LIMIT", 0)
+    monkeypatch.setattr(office, "_ZIP64_COUNT_LIMIT", 0)
+    src = tmp_path / "c.docx"
+    dst = tmp_path / "c_clean.docx"
+    _make_docx(src)
+
+    clean_office(src, dst)
+
+    with zipfile.ZipFile(src) as zs, zipfile.ZipFile(dst) as zd:
+        assert zd.testzip() is None
+        assert zd.read("word/document.xml") == zs.read("word/document.xml")
+        assert zd.getinfo("word/media/image1.png").header_offset > 0
+        assert b"PK\x06\x06" in dst.read_bytes()  # ZIP64 end of central directory
@@ -39,3 +39,31 @@ def test_pdf_clean(tmp_path: Path):
     # Also ensure no JavaScript remains
     with pikepdf.open(dst) as pdf:
         assert "/Names" not in pdf.root or "/JavaScript" not in pdf.root["/Names"]
+
+def test_pikepdf_engine_rewrites_without_metadata(tmp_path: Path):
+    from app.cleaners.pdfs import pdf_engine
+    src = tmp_path / "b.pdf"
+    dst = tmp_path / "b_clean.pdf"
+    with pikepdf.new() as pdf:
+        for _ in range(3):
+            pdf.add_blank_page()
+        pdf.docinfo["/Author"] = "Carol Secret"
+        with pdf.open_metadata(set_pikepdf_as_editor=False) as meta:
+            meta["dc:creator"] = ["Carol Secret"]
+        pdf.Root["/Names"] = pikepdf.Dictionary({"/JavaScript": pikepdf.Dictionary()})
+        pdf.pages[0].obj["/Annots"] = pdf.make_indirect(pikepdf.Array([
+            pikepdf.Dictionary({"/Type": pikepdf.Name.Annot, "/Subtype": pikepdf.Name.Text,
+                                "/Rect": [0, 0, 10, 10], "/Contents": pikepdf.String("note")})
+        ]))
+        pdf.save(src)
+
+    pdf_engine("pikepdf")(src, dst)
+    with pikepdf.open(dst) as pdf:
+        # The rewrite is complete: no trace of the old objects, not even as unreferenced leftovers
+        for obj in pdf.objects:
+            data = obj.read_bytes() if isinstance(obj, pikepdf.Stream) else repr(obj).encode()
+            assert b"Carol Secret" not in data
+        assert len(pdf.pages) == 3
+        assert "/Info" not in pdf.trailer and "/Metadata" not in pdf.Root
+        assert "/JavaScript" not in pdf.Root["/Names"]
+        assert all("/Annots" not in page.obj for page in pdf.pages)
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+from pathlib import Path
+from app.cleaners import registry
+from app.utils.signature import type_for_extension
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def test_registry_matches_signature_table():
+    for fmt in registry.FORMATS:
+        for ext in fmt.extensions:
+            assert type_for_extension(ext) == fmt.signature
+    assert registry.format_for(".JPEG").name == "jpeg"
+    assert registry.format_for(".exe") is None
+
+def test_cleaner_modules_load_on_first_use():
+    code = ("import sys, app.server; "
+            "print(any(m.startswith(('app.cleaners.pdfs', 'app.cleaners.office', 'pypdf')) for m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+    assert callable(registry.format_for(".docx").load_cleaner())
+
+def test_missing_tool_switches_formats_off(monkeypatch):
+    monkeypatch.setattr(registry.shutil, "which", lambda tool: None if tool == "ffmpeg" else f"/usr/bin/{tool}")
+    try:
+        registry.probe()
+        assert registry.format_for(".mkv") is None and ".mkv" not in registry.allowed_extensions()
+        assert registry.format_for(".mp4") is not None  # native, ffmpeg only as a fallback
+        assert registry.unavailable()["mkv"] == ("ffmpeg",)
+    finally:
+        monkeypatch.undo()
+        registry.probe()
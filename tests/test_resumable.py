@@ -0,0 +1,136 @@
+import asyncio
+import base64
+import shutil
+import threading
+import time
+import uuid
+from io import BytesIO
+from fastapi.testclient import TestClient
+from PIL import Image
+import app.server as server
+from app.utils import resumable
+
+client = TestClient(server.app)
+
+def _png(size: int = 256) -> bytes:
+    buf = BytesIO()
+    Image.frombytes("RGB", (size, size), bytes(range(256)) * (size * size * 3 // 256)).save(buf, format="PNG")
+    return buf.getvalue()
+
+def _create(name: str, length: int) -> str:
+    meta = "filename " + base64.b64encode(name.encode()).decode()
+    res = client.post("/uploads", headers={"Tus-Resumable": "1.0.0", "Upload-Length": str(length),
+                                           "Upload-Metadata": meta})
+    assert res.status_code == 201
+    return res.headers["location"]
+
+def _patch(url: str, offset: int, body: bytes):
+    return client.patch(url, content=body, headers={"Tus-Resumable": "1.0.0", "Upload-Offset": str(offset),
+                                                    "Content-Type": "application/offset+octet-stream"})
+
+def test_open_uploads_cannot_book_more_than_the_free_space(monkeypatch):
+    free = resumable._promised() + 1000
+    monkeypatch.setattr(resumable.shutil, "disk_usage", lambda path: shutil._ntuple_diskusage(free, 0, free))
+    url = _create("a.png", 600)
+    meta = "filename " + base64.b64encode(b"b.png").decode()
+    headers = {"Tus-Resumable": "1.0.0", "Upload-Length": "600", "Upload-Metadata": meta}
+    assert client.post("/uploads", headers=headers).status_code == 507  # the first upload still needs its 600
+    assert _patch(url, 0, _png()[:300]).status_code == 204
+    assert client.post("/uploads", headers=headers).status_code == 201
+
+def test_chunks_out_of_order_then_clean():
+    data = _png()
+    url = _create("big.png", len(data))
+    third = len(data) // 3
+    assert _patch(url, 2 * third, data[2 * third:]).headers["upload-offset"] == "0"
+    assert _patch(url, 0, data[:third]).headers["upload-offset"] == str(third)
+
+    res = client.head(url)
+    assert res.headers["upload-offset"] == str(third)
+    assert res.headers["upload-ranges"] == f"0-{third - 1},{2 * third}-{len(data) - 1}"
+    upload_id = url.rsplit("/", 1)[1]
+    assert client.post("/clean-batch", data={"upload_ids": upload_id}).status_code == 409
+
+    assert _patch(url, third, data[third:2 * third]).headers["upload-offset"] == str(len(data))
+    res = client.post("/clean-batch", data={"upload_ids": upload_id})
+    assert res.status_code == 200
+    assert res.json()["items"][0]["orig"] == "big.png"
+    assert client.get(res.json()["download"]).content.startswith(b"\x89PNG")
+    # Claimed once: the session is gone
+    assert client.head(url).status_code == 404
+    assert client.post("/clean-batch", data={"upload_ids": upload_id}).status_code == 404
+
+def test_upload_stays_claimable_until_it_is_cleaned(monkeypatch):
+    data = _png()
+    url = _create("big.png", len(data))
+    _patch(url, 0, data)
+    upload_id = url.rsplit("/", 1)[1]
+    # One unknown id: nothing is claimed
+    res = client.post("/clean-batch", data={"upload_ids": [upload_id, "f" * 32]})
+    assert res.status_code == 404 and client.head(url).status_code == 200
+
+    real_clean = server._clean_cached
+    async def broken(*args):
+        raise RuntimeError("cleaner crashed")
+    monkeypatch.setattr(server, "_clean_cached", broken)
+    assert client.post("/clean-batch", data={"upload_ids": upload_id}).status_code == 400
+    assert client.head(url).status_code == 200  # put back: the client retries without uploading again
+
+    monkeypatch.setattr(server, "_clean_cached", real_clean)
+    assert client.post("/clean-batch", data={"upload_ids": upload_id}).status_code == 200
+    assert client.head(url).status_code == 404
+
+def test_batch_stream_starts_before_resumed_uploads_are_hashed(monkeypatch):
+    data = _png()
+    url = _create("big.png", len(data))
+    _patch(url, 0, data)
+    gate = threading.Event()
+    real_sha256 = resumable.sha256
+    monkeypatch.setattr(resumable, "sha256", lambda session: gate.wait(10) and real_sha256(session))
+    monkeypatch.setattr(server.cache, "enabled", lambda: True)
+
+    async def start():
+        queue = asyncio.Queue()
+        started = time.perf_counter()
+        tasks = await server._start_batch([], [url.rsplit("/", 1)[1]], uuid.uuid4().hex, queue)
+        returned = time.perf_counter() - started
+        gate.set()
+        await asyncio.gather(*tasks)
+        return returned, queue.get_nowait()
+
+    returned, event = asyncio.run(start())
+    assert returned < 5  # the response can start while the upload is still being hashed
+    assert event["status"] in ("ok", "cached") and event["orig"] == "big.png"
+
+def test_file_event_never_raises(tmp_path):
+    entry = ("gone.png", "image", tmp_path / "gone.png", tmp_path / "gone_clean.png", None)
+    event = asyncio.run(server._file_event(entry, time.perf_counter()))
+    assert event["status"] == "failed" and event["error"]["code"] == "clean_failed"
+
+def test_spoofed_first_chunk_ends_the_upload():
+    data = _png()
+    url = _create("movie.mp4", len(data))
+    res = _patch(url, 0, data[:1024])
+    assert res.status_code == 400 and "spoofing" in res.json()["detail"]
+    assert client.head(url).status_code == 404
+
+def test_small_first_chunk_is_judged_with_the_whole_upload():
+    data = _png()
+    url = _create("small.png", len(data))
+    assert _patch(url, 0, data[:8]).status_code == 204  # too little to tell what it is yet
+    assert _patch(url, 8, data[8:]).status_code == 204
+    res = client.post("/clean-batch", data={"upload_ids": url.rsplit("/", 1)[1]})
+    assert res.status_code == 200 and res.json()["items"][0]["orig"] == "small.png"
+
+    url = _create("movie.mp4", len(data))
+    assert _patch(url, 0, data[:8]).status_code == 204
+    assert _patch(url, 8, data[8:]).status_code == 204
+    assert client.post("/clean-batch", data={"upload_ids": url.rsplit("/", 1)[1]}).status_code == 400
+    assert client.head(url).status_code == 404
+
+def test_chunk_past_declared_length_is_refused():
+    url = _create("a.png", 10)
+    assert _patch(url, 4, b"0123456789").status_code == 400
+    assert client.post("/uploads", headers={"Upload-Length": "10",
+                                            "Upload-Metadata": "filename " + base64.b64encode(b"a.exe").decode()}
+                       ).status_code == 400
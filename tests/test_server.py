@@ -0,0 +1,154 @@
+"""
+API-level checks for upload handling: rejections, in-memory and batch
+cleans, inline responses and how long working files are kept. These do not
+need exiftool: what gets cleaned here is PNG or JPEG, which the native
+walkers handle.
+"""
+import json
+from io import BytesIO
+from pathlib import Path
+import time
+import zipfile
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+import app.server as server
+from app.cleaners import registry
+import app.utils.artifacts as artifacts
+
+client = TestClient(server.app)
+
+def _jpeg_bytes() -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (16, 16)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+def _leftovers(before: set[Path]) -> set[Path]:
+    return set(server.UPLOAD_DIR.glob("*")) - before
+
+def test_spoofed_extension_is_rejected_and_removed():
+    before = set(server.UPLOAD_DIR.glob("*"))
+    res = client.post("/clean-batch", files=[("uploads", ("a.png", _jpeg_bytes(), "image/png"))])
+    assert res.status_code == 400
+    assert "spoofing" in res.json()["detail"]
+    assert not _leftovers(before)
+
+def test_oversized_upload_stops_streaming(monkeypatch):
+    monkeypatch.setattr(server, "MAX_FILE_SIZE", 1024)
+    monkeypatch.setattr(server, "UPLOAD_CHUNK_SIZE", 256)
+    before = set(server.UPLOAD_DIR.glob("*"))
+    res = client.post("/clean-batch", files=[("uploads", ("a.jpg", _jpeg_bytes() + b"\0" * 4096, "image/jpeg"))])
+    assert res.status_code == 400
+    assert not _leftovers(before)
+
+def test_zip_signature_checked_from_disk():
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("xl/workbook.xml", "<workbook/>")
+    before = set(server.UPLOAD_DIR.glob("*"))
+    res = client.post("/clean-batch", files=[("uploads", ("a.docx", buf.getvalue(), "application/zip"))])
+    assert res.status_code == 400
+    assert "looks like .xlsx" in res.json()["detail"]
+    assert not _leftovers(before)
+
+def test_batch_zip_is_streamed_from_outputs():
+    pngs = []
+    for color in ("red", "blue"):
+        buf = BytesIO()
+        Image.new("RGB", (16, 16), color).save(buf, format="PNG")
+        pngs.append(buf.getvalue())
+    res = client.post("/clean-batch", files=[("uploads", (f"{i}.png", data, "image/png")) for i, data in enumerate(pngs)])
+    assert res.status_code == 200
+    body = res.json()
+    assert not (server.OUTPUT_DIR / body["zip_filename"]).exists()  # no copy on disk
+    uid = body["zip_download"].rsplit("/", 1)[1]
+    assert server._batch_manifest(uid).is_file()
+    assert client.get(f"/download/{server._batch_manifest(uid).name}").status_code == 404  # not an output
+
+    res = client.get(body["zip_download"])
+    assert res.status_code == 200
+    assert body["zip_filename"] in res.headers["content-disposition"]
+    with zipfile.ZipFile(BytesIO(res.content)) as z:
+        assert z.namelist() == [item["cleaned_name"] for item in body["items"]]
+        # PNG is already compressed, so it is stored rather than deflated again
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in z.infolist())
+        assert z.testzip() is None
+
+def test_small_upload_is_cleaned_in_memory():
+    buf = BytesIO()
+    Image.new("RGB", (16, 16), "green").save(buf, format="PNG")
+    before = set(server.UPLOAD_DIR.glob("*"))
+    res = client.post("/clean-batch", files=[("uploads", ("small.png", buf.getvalue(), "image/png"))])
+    assert res.status_code == 200
+    assert not _leftovers(before)  # never written to UPLOAD_DIR
+    output = server.OUTPUT_DIR / res.json()["suggested_filename"]
+    assert output.read_bytes().startswith(b"\x89PNG\r\n\x1a\n")
+
+def test_only_native_formats_are_cleaned_in_memory():
+    def fits(name: str) -> bool:
+        return server._fits_in_memory(UploadFile(BytesIO(b"x"), size=1, filename=name))
+    assert fits("a.png") and fits("a.jpg") and fits("a.docx")
+    assert not fits("a.gif") and not fits("a.tiff")  # ExifTool only: pooled, from a file
+    assert fits("a.pdf") == (registry.format_for(".pdf").tools == ())
+
+def test_inline_clean_returns_the_file():
+    img = Image.new("RGB", (16, 16))
+    exif = img.getexif()
+    exif[0x010F] = "SecretCam"  # Make
+    buf = BytesIO()
+    img.save(buf, format="JPEG", exif=exif)
+    before = set(server.UPLOAD_DIR.glob("*")) | set(server.OUTPUT_DIR.glob("*"))
+    res = client.post("/clean-batch?inline=true", files=[("uploads", ("photo.jpg", buf.getvalue(), "image/jpeg"))])
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "image/jpeg"
+    assert 'filename="photo_clean.jpg"' in res.headers["content-disposition"]
+    assert res.content.startswith(b"\xff\xd8") and b"SecretCam" not in res.content
+    assert set(server.UPLOAD_DIR.glob("*")) | set(server.OUTPUT_DIR.glob("*")) == before
+
+def test_inline_clean_takes_one_small_file(monkeypatch):
+    monkeypatch.setattr(server, "INMEMORY_MAX_BYTES", 16)
+    res = client.post("/clean-batch?inline=true", files=[("uploads", ("a.jpg", _jpeg_bytes(), "image/jpeg"))])
+    assert res.status_code == 400
+
+def test_batch_stream_reports_each_file():
+    def png(color):
+        buf = BytesIO()
+        Image.new("RGB", (16, 16), color).save(buf, format="PNG")
+        return buf.getvalue()
+    files = [("uploads", ("a.png", png("red"), "image/png")),
+             ("uploads", ("b.png", png("blue"), "image/png")),
+             ("uploads", ("c.png", b"not a png", "image/png"))]
+    r = client.post("/clean-batch/stream", files=files)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in r.text.splitlines()]
+    files_done = {e["index"]: e for e in events if e["event"] == "file"}
+    assert {files_done[0]["status"], files_done[1]["status"]} <= {"ok", "cached"}
+    assert files_done[2]["status"] == "failed" and files_done[2]["error"]["code"] == "signature"
+    assert client.get(files_done[0]["download"]).content.startswith(b"\x89PNG")
+    done = events[-1]
+    assert done["event"] == "done" and done["count"] == 2 and done["failed"] == 1
+    assert zipfile.is_zipfile(BytesIO(client.get(done["zip_download"]).content))
+
+def _deadline(path: Path) -> float | None:
+    row = artifacts._conn().execute("SELECT deadline FROM artifacts WHERE path = ?", (str(path),)).fetchone()
+    return row[0] if row else None
+
+def test_files_are_held_while_cleaning(monkeypatch):
+    seen = {}
+
+    async def slow_clean(cleaner_type, src, dst):
+        # However long this takes, the sweep must not take the upload (or the output) from under it
+        seen["src"], seen["dst"] = _deadline(src), _deadline(dst)
+        dst.write_bytes(src.read_bytes())
+
+    monkeypatch.setattr(server, "run_clean", slow_clean)
+    monkeypatch.setattr(server, "INMEMORY_MAX_BYTES", 0)
+    monkeypatch.setattr(server.cache, "CACHE_MAX_BYTES", 0)
+    res = client.post("/clean-batch", files=[("uploads", ("held.jpg", _jpeg_bytes(), "image/jpeg"))])
+    assert res.status_code == 200
+    retention = artifacts.RETENTION.total_seconds()
+    assert seen["src"] > time.time() + retention and seen["dst"] > time.time() + retention
+    # Done: the output expires RETENTION after it was written
+    output = server.OUTPUT_DIR / res.json()["suggested_filename"]
+    assert time.time() < _deadline(output) <= time.time() + retention
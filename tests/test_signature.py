@@ -0,0 +1,41 @@
+from pathlib import Path
+from io import BytesIO
+import mmap
+import zipfile
+from PIL import Image
+from app.utils.signature import detect_type, detect_extension, ext_equivalent, DOCX, XLSX, MOV, WEBM
+
+def _zip(path: Path, *names: str) -> None:
+    with zipfile.ZipFile(path, "w") as z:
+        for n in names:
+            z.writestr(n, "<x/>")
+        z.comment = b"a trailing archive comment"
+
+def test_magic_formats_from_header_only():
+    buf = BytesIO()
+    Image.new("RGB", (4, 4)).save(buf, format="PNG")
+    assert detect_extension(buf.getvalue()[:64]) == ".png"
+    assert detect_extension(b"%PDF-1.7\n") == ".pdf"
+    assert detect_extension(b"RIFF\0\0\0\0WEBPVP8 ") == ".webp"
+    assert detect_extension(b"RIFF\0\0\0\0AVI LIST") == ".avi"
+    assert detect_type(b"\0\0\0\x14ftypqt  \0\0\0\0") is MOV
+    assert detect_type(b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\x82\x84webm") is WEBM
+    assert detect_extension(b"not a known format") is None
+
+def test_ooxml_classified_from_central_directory(tmp_path: Path):
+    docx, xlsx, other = tmp_path / "a.docx", tmp_path / "b.xlsx", tmp_path / "c.zip"
+    _zip(docx, "[Content_Types].xml", "word/document.xml")
+    _zip(xlsx, "[Content_Types].xml", "xl/workbook.xml")
+    _zip(other, "readme.txt")
+    assert detect_type(docx) is DOCX
+    assert detect_type(other) is None
+    with open(xlsx, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        assert detect_type(m) is XLSX
+    # A truncated ZIP (e.g. the first upload chunk of a big file) is not guessed at
+    assert detect_type(docx.read_bytes()[:40]) is None
+
+def test_extension_families():
+    assert ext_equivalent(".jpeg", ".jpg")
+    assert ext_equivalent(".tif", ".tiff")
+    assert ext_equivalent(".mov", ".mp4")
+    assert not ext_equivalent(".png", ".jpg")
@@ -0,0 +1,91 @@
+"""
+Shared storage: a node that lacks an output serves it from the backend
+(downloads, ranges, batch ZIPs, reports). LocalStorage on a separate root
+stands in for a shared mount; S3Storage runs against moto when installed.
+"""
+from io import BytesIO
+import hashlib
+import os
+import uuid
+import zipfile
+from fastapi.testclient import TestClient
+from PIL import Image
+import pytest
+import app.server as server
+from app.utils import storage
+from app.utils.storage import LocalStorage, S3Storage
+
+client = TestClient(server.app)
+
+def _png(color: int) -> bytes:
+    buf = BytesIO()
+    Image.new("L", (16, 16), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+def test_outputs_served_from_shared_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_storage", LocalStorage(tmp_path))
+    files = [("uploads", (f"s{i}.png", _png(100 + i), "image/png")) for i in range(2)]
+    res = client.post("/clean-batch", files=files)
+    assert res.status_code == 200
+    body = res.json()
+    names = [item["cleaned_name"] for item in body["items"]]
+    data = {n: (server.OUTPUT_DIR / n).read_bytes() for n in names}
+    here = client.get(f"/download/{names[0]}").headers
+
+    # Another node: none of the working files are here
+    uid = body["zip_download"].rsplit("/", 1)[1]
+    for n in names:
+        (server.OUTPUT_DIR / n).unlink()
+    server._batch_manifest(uid).unlink()
+
+    res = client.get(f"/download/{names[0]}", headers={"Range": "bytes=0-7", "If-Range": here["etag"]})
+    assert res.status_code == 206 and res.content == data[names[0]][:8]  # same validators on every node
+    assert (res.headers["etag"], res.headers["last-modified"]) == (here["etag"], here["last-modified"])
+    assert client.get(f"/download/{names[1]}").content == data[names[1]]
+    with zipfile.ZipFile(BytesIO(client.get(body["zip_download"]).content)) as z:
+        assert {n: z.read(n) for n in z.namelist()} == data
+    assert isinstance(client.get(f"/inspect-output/{names[0]}").json()["report"], dict)
+    assert client.get("/download/a%5Cb").status_code == 404  # not a valid storage key
+
+    assert not list(server.OUTPUT_DIR.glob("*.sha256"))
+    assert client.get(f"/download/{names[1]}.sha256").status_code == 404  # digests are not downloads
+    storage.get_storage().unpublish(server.OUTPUT_DIR / names[0])
+    assert client.get(f"/download/{names[0]}").status_code == 404
+
+def test_default_root_publishes_without_hashing(monkeypatch):
+    monkeypatch.setattr(storage, "_storage", LocalStorage(server.OUTPUT_DIR.parent))
+    monkeypatch.setattr(storage, "_write_digest", lambda path: pytest.fail("hashed an unshared output"))
+    res = client.post("/clean-batch", files=[("uploads", ("d.png", _png(42), "image/png"))])
+    name = res.json()["items"][0]["cleaned_name"]
+    path = server.OUTPUT_DIR / name
+    assert not storage.digest_path(path).exists()
+    assert client.get(f"/download/{name}").headers["etag"] == storage.etag_for(path.stat())
+
+def test_s3_backend_multipart_and_ranges(monkeypatch):
+    boto3 = pytest.importorskip("boto3")
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    with moto.mock_aws():
+        client_ = boto3.client("s3", region_name="us-east-1")
+        client_.create_bucket(Bucket="scrubber")
+        s3 = S3Storage(bucket="scrubber", prefix="node/", part_size=5 * 1024 * 1024, client=client_)
+        path = server.OUTPUT_DIR / f"{uuid.uuid4().hex}_big_clean.mp4"
+        payload = os.urandom(11 * 1024 * 1024)  # three parts
+        path.write_bytes(payload)
+        try:
+            s3.publish(path)
+            key = f"outputs/{path.name}"
+            info = s3.stat(key)
+            assert info.size == len(payload)
+            assert info.etag == storage.content_etag(path, path.stat()) == f'"{hashlib.sha256(payload).hexdigest()}"'
+            assert info.mtime == path.stat().st_mtime
+            with s3.open(key, 1000, 500) as body:
+                assert body.read() == payload[1000:1500]
+            s3.unpublish(path)
+            assert s3.stat(key) is None
+            with pytest.raises(FileNotFoundError):
+                s3.open(key)
+        finally:
+            path.unlink(missing_ok=True)
+            storage.digest_path(path).unlink(missing_ok=True)
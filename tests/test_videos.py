@@ -0,0 +1,114 @@
+"""
+Native MP4/MOV and AVI walkers on hand-built files: metadata boxes/chunks go,
+times are zeroed, and chunk offsets still point at the same media bytes after
+the layout shifts. No ffmpeg needed.
+"""
+from pathlib import Path
+import struct
+import pytest
+from app.cleaners.isobmff import clean_isobmff, IsoBmffFormatError
+from app.cleaners.riff import clean_avi, RiffFormatError
+
+def _box(btype: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", len(payload) + 8, btype) + payload
+
+def _full(version: int, body: bytes) -> bytes:
+    return bytes([version, 0, 0, 0]) + body
+
+def _build_mp4(path: Path, fragmented: bool = False) -> tuple[bytes, bytes]:
+    chunks = (b"A" * 64, b"B" * 64)
+    ftyp = _box(b"ftyp", b"isom\0\0\0\x01isomavc1")
+    free = _box(b"free", b"\0" * 16)
+    mdat_at = len(ftyp) + len(free)
+    mdat = _box(b"mdat", b"".join(chunks))
+    offsets = (mdat_at + 8, mdat_at + 8 + len(chunks[0]))
+
+    stco = _box(b"stco", _full(0, struct.pack(">III", 2, *offsets)))
+    dref = _box(b"dref", _full(0, struct.pack(">I", 1) + _box(b"url ", _full(0, b"")[:3] + b"\x01")))
+    trak = _box(b"trak", b"".join([
+        _box(b"tkhd", _full(0, struct.pack(">II", 0x11111111, 0x22222222) + b"\0" * 72)),
+        _box(b"udta", _box(b"\xa9xyz", b"+12.3456-098.7654/")),
+        _box(b"mdia", b"".join([
+            _box(b"mdhd", _full(1, struct.pack(">QQ", 0x3333333333, 0x4444444444) + b"\0" * 12)),
+            _box(b"minf", _box(b"dinf", dref) + _box(b"stbl", stco)),
+        ])),
+    ]))
+    moov = _box(b"moov", b"".join([
+        _box(b"mvhd", _full(0, struct.pack(">II", 0x55555555, 0x66666666) + b"\0" * 88)),
+        trak,
+        _box(b"udta", _box(b"\xa9day", b"2024-05-01")),
+        _box(b"meta", _full(0, _box(b"keys", b"com.apple.quicktime.location.ISO6709"))),
+    ] + ([_box(b"mvex", b"")] if fragmented else [])))
+    xmp = _box(b"uuid", b"\xbe\x7a\xcf\xcb" + b"\0" * 12 + b"<x:xmpmeta>secret</x:xmpmeta>")
+    path.write_bytes(ftyp + free + mdat + moov + xmp)
+    return chunks
+
+def _find(data: bytes, btype: bytes) -> int:
+    at = data.find(btype)
+    assert at >= 4, btype
+    return at + 4  # payload start
+
+def test_mp4_metadata_removed_and_offsets_fixed(tmp_path: Path):
+    src, dst = tmp_path / "a.mp4", tmp_path / "a_clean.mp4"
+    chunks = _build_mp4(src)
+    clean_isobmff(src, dst)
+    out = dst.read_bytes()
+
+    for secret in (b"+12.3456", b"2024-05-01", b"com.apple", b"xmpmeta", b"udta", b"free"):
+        assert secret not in out
+    for btype, width in ((b"mvhd", 4), (b"tkhd", 4), (b"mdhd", 8)):
+        at = _find(out, btype)
+        assert out[at + 4:at + 4 + 2 * width] == bytes(2 * width)
+    at = _find(out, b"stco")
+    count, *offsets = struct.unpack(">III", out[at + 4:at + 16])
+    assert count == 2
+    assert [out[o:o + 64] for o in offsets] == list(chunks)
+
+def test_fragmented_mp4_is_left_to_ffmpeg(tmp_path: Path):
+    src = tmp_path / "frag.mp4"
+    _build_mp4(src, fragmented=True)
+    with pytest.raises(IsoBmffFormatError):
+        clean_isobmff(src, tmp_path / "frag_clean.mp4")
+
+def _chunk(cid: bytes, payload: bytes) -> bytes:
+    return struct.pack("<4sI", cid, len(payload)) + payload + b"\0" * (len(payload) & 1)
+
+def _build_avi(path: Path, opendml: bool = False) -> tuple[bytes, bytes]:
+    frames = (b"A" * 63, b"B" * 64)
+    strl = _chunk(b"LIST", b"strl" + b"".join([
+        _chunk(b"strh", b"vids" + b"\0" * 52),
+        _chunk(b"strf", b"\0" * 40),
+        _chunk(b"strd", b"CASIO maker notes"),
+        _chunk(b"strn", b"Alice's camera"),
+    ] + ([_chunk(b"indx", b"\0" * 24)] if opendml else [])))
+    hdrl = _chunk(b"LIST", b"hdrl" + _chunk(b"avih", b"\0" * 56) + strl + _chunk(b"IDIT", b"MON JAN 01 10:00:00 2024\n"))
+    info = _chunk(b"LIST", b"INFO" + _chunk(b"ISFT", b"SecretCam 1.0") + _chunk(b"INAM", b"Holiday"))
+    junk = _chunk(b"JUNK", b"leftover secret")
+    movi_at = 12 + len(hdrl) + len(info) + len(junk)
+    movi = _chunk(b"LIST", b"movi" + b"".join(_chunk(b"00dc", f) for f in frames))
+    # Absolute offsets (from the file start), as some muxers write them
+    offsets = (movi_at + 12, movi_at + 12 + 8 + 64)
+    idx1 = _chunk(b"idx1", b"".join(struct.pack("<4sIII", b"00dc", 0x10, o, len(f)) for o, f in zip(offsets, frames)))
+    body = b"AVI " + hdrl + info + junk + movi + idx1
+    path.write_bytes(b"RIFF" + struct.pack("<I", len(body)) + body)
+    return frames
+
+def test_avi_metadata_removed_and_index_fixed(tmp_path: Path):
+    src, dst = tmp_path / "a.avi", tmp_path / "a_clean.avi"
+    frames = _build_avi(src)
+    clean_avi(src, dst)
+    out = dst.read_bytes()
+
+    for secret in (b"CASIO", b"Alice", b"2024", b"SecretCam", b"Holiday", b"leftover", b"INFO"):
+        assert secret not in out
+    assert struct.unpack("<I", out[4:8])[0] + 8 == len(out)
+    at = _find(out, b"idx1") + 4  # past the RIFF size field
+    for i, frame in enumerate(frames):
+        ckid, _, offset, size = struct.unpack("<4sIII", out[at + i * 16:at + i * 16 + 16])
+        assert out[offset:offset + 4] == ckid and out[offset + 8:offset + 8 + size] == frame
+
+def test_opendml_avi_is_left_to_ffmpeg(tmp_path: Path):
+    src = tmp_path / "big.avi"
+    _build_avi(src, opendml=True)
+    with pytest.raises(RiffFormatError):
+        clean_avi(src, tmp_path / "big_clean.avi")